@@ -1,35 +1,72 @@
+import argparse
+import hashlib
+import json
 import pandas as pd
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
 import string
 import os
-import nltk
+import time
+import numpy as np
+import genre_store
+import nltk_resources
+from genre_store import GenreStoreWriter
+from keyword_index import (extend_keyword_index, index_from_token_corpus, load_keyword_index, save_keyword_index,
+                           index_path as keyword_index_path)
+from semantic_search import build_semantic_index, index_path, save_semantic_index
+from sentiment_analysis import add_sentiment_column, sentiment_pool
+from similar_books import build_similarity_model, model_path, precompute_neighbours, save_similarity_model
+from token_corpus import TokenCorpusBuilder, load_token_corpus, save_token_corpus
+from topic_modeling import load_topic_model, save_topic_model, train_topic_model
+
+master_csv = os.path.join(genre_store.base_path, 'Data', 'books_and_reviews.csv')
+source_columns = ['title', 'categories', 'review_summary', 'review_score', 'publisher']
+# Columns of the genre CSVs this file writes (the source columns plus the stored sentiment)
+genre_columns = source_columns + [genre_store.SENTIMENT_COLUMN]
+
+# The stop word list used to be rebuilt on every call to preprocess_text; it is now built once.
+# NLTK itself is only imported when the first text is preprocessed, and its data comes from the local NLTK
+# data folder rather than being downloaded at import (see nltk_resources.py).
+_stop_words = None
+_word_tokenize = None
+_punctuation_table = str.maketrans('', '', string.punctuation)
+
+
+def get_stop_words():
+    global _stop_words
+    if _stop_words is None:
+        nltk_resources.require('stopwords')
+        from nltk.corpus import stopwords
+        _stop_words = set(stopwords.words('english'))
+    return _stop_words
+
+
+def get_word_tokenize():
+    global _word_tokenize
+    if _word_tokenize is None:
+        # Recent NLTK versions tokenize with punkt_tab, older ones with punkt
+        try:
+            nltk_resources.require('punkt_tab')
+        except LookupError:
+            nltk_resources.require('punkt')
+        from nltk.tokenize import word_tokenize
+        _word_tokenize = word_tokenize
+    return _word_tokenize
 
-# Download required NLTK data if not already present
-nltk.download('stopwords', quiet=True)
-nltk.download('punkt', quiet=True)
-nltk.download('punkt_tab', quiet=True)
 
 # I've added this function as previously some of the text for genres was not fully processed and wouldn't match
 # any of the genres I had listed - this takes the text and removes words like 'and', removes capitals, commas etc.
 def preprocess_text(text):
-    stop_words = set(stopwords.words('english'))
+    stop_words = get_stop_words()
     if not isinstance(text, str):
         return ''
     text = text.lower()
-    text = text.translate(str.maketrans('', '', string.punctuation))
-    words = word_tokenize(text)
+    text = text.translate(_punctuation_table)
+    words = get_word_tokenize()(text)
     words = [word for word in words if word not in stop_words]
     return ' '.join(words)
 
 # I'm using the large file we have and trying to split it into the following genres - the genres were chosen
 # as previously the file had many very niche genres and so I chose those with the large amounts of books within
 # that genre in order to be able to explore the data fully
-reviews_df = pd.read_csv('Data/books_and_reviews.csv', usecols=['title', 'categories', 'review_summary',
-                                                                 'review_score', 'publisher'])
-
-reviews_df['categories'] = reviews_df['categories'].apply(preprocess_text)
-
 category_list = ['antiques collectibles', 'architecture', 'art', 'bible', 'biography autobiography',
                  'body mind spirit', 'business economics', 'comics graphic novels',
                  'computers', 'cooking', 'crafts hobbies', 'design', 'drama', 'education', 'family relationships',
@@ -40,18 +77,347 @@ category_list = ['antiques collectibles', 'architecture', 'art', 'bible', 'biogr
                  'reference', 'religion', 'science', 'self-help', 'social science', 'sports recreation', 'study aids',
                  'technology engineering', 'transportation', 'travel', 'true crime', 'young adult fiction']
 
-# BUG FIX: Create the output directory if it doesn't exist.
-# Previously files were saved to the current working directory instead of Data/filtered_reviews/
-output_dir = 'Data/filtered_reviews'
-os.makedirs(output_dir, exist_ok=True)
+'''
+Normalises a column of raw category strings with preprocess_text. The master file only has a few thousand
+distinct category strings across millions of rows, so each distinct string is processed once and remembered
+in `cache` (shared between chunks); the column itself is then converted with a vectorised map.
+'''
+def normalize_categories(categories, cache):
+    for raw in categories.unique():
+        if raw not in cache:
+            cache[raw] = preprocess_text(raw)
+    return categories.map(cache)
+
+'''
+Splits the master CSV into one CSV per genre in a single streaming pass. The master file is read chunk_size
+rows at a time, each chunk's rows are grouped by genre and appended to that genre's file, so memory use
+depends on the chunk size rather than on the size of the master file. Sentiment is scored per chunk as
+the rows are written, on one process pool for the whole file. Returns a dict of genre -> number of rows
+written.
+'''
+def partition_reviews(source=master_csv, output_dir=genre_store.filtered_dir, chunk_size=200_000,
+                      processes=None):
+    os.makedirs(output_dir, exist_ok=True)
+    genres = set(category_list)
+    category_cache = {}
+    rows_written = {}
+    rows_read = 0
+    start = time.perf_counter()
+
+    # review_score is always read as float so every chunk writes it the same way ("5.0"), whether or not
+    # that particular chunk happens to contain a missing score
+    chunks = pd.read_csv(source, usecols=source_columns, dtype={'review_score': 'float64'}, chunksize=chunk_size)
+    with sentiment_pool(processes) as pool:
+        for chunk in chunks:
+            rows_read += len(chunk)
+            chunk['categories'] = normalize_categories(chunk['categories'], category_cache)
+            chunk = chunk[chunk['categories'].isin(genres)].copy()
+            # Score every review once here so recommend_book can read the stored sentiment. The whole chunk is
+            # scored in one batch, on a pool started once for the whole file.
+            add_sentiment_column(chunk, processes, pool)
+
+            for genre, genre_df in chunk.groupby('categories', sort=False):
+                filename = os.path.join(output_dir, f"{genre}_df.csv")
+                first_write = genre not in rows_written
+                genre_df.to_csv(filename, mode='w' if first_write else 'a', header=first_write, index=False)
+                rows_written[genre] = rows_written.get(genre, 0) + len(genre_df)
+
+            elapsed = time.perf_counter() - start
+            print(f"Read {rows_read} rows ({rows_read / elapsed:,.0f} rows/s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"Partitioned {rows_read} rows into {len(rows_written)} genres in {elapsed:.1f}s "
+          f"({rows_read / max(elapsed, 1e-9):,.0f} rows/s)")
+    return rows_written
 
-# BUG FIX: Replaced nested loop (which compared every group against every genre, O(n*m) and fragile)
-# with a direct filter per genre using boolean masking — much faster and more reliable.
-for genre in category_list:
-    genre_df = reviews_df[reviews_df['categories'] == genre]
-    if not genre_df.empty:
+def manifest_path(output_dir):
+    return os.path.join(output_dir, 'manifest.json')
+
+
+def load_manifest(output_dir):
+    path = manifest_path(output_dir)
+    if not os.path.exists(path):
+        return {'full_build': None, 'deltas': {}}
+    with open(path) as f:
+        return json.load(f)
+
+'''
+Writes the manifest to a temporary file and renames it into place, so a crash never leaves a half-written
+manifest behind.
+'''
+def save_manifest(manifest, output_dir):
+    tmp_path = manifest_path(output_dir) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path(output_dir))
+
+
+def file_fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+'''
+Appends the rows of a delta file (same columns as the master CSV) to the existing genre files, without
+rebuilding anything else. Progress is recorded in manifest.json under the delta's SHA-256:
+  - rows_read is the watermark - how many rows of the delta have been appended so far
+  - file_sizes are the genre file sizes as of that watermark
+After a crash, any genre file that grew past its recorded size is truncated back, and ingestion carries on
+from the watermark. Running the same delta again once it is complete does nothing.
+Rows are appended in the column order of the genre file they go to, whatever the order in the delta. Raises
+ValueError before appending anything if an existing genre file doesn't have exactly genre_columns (e.g. one
+written before sentiment was stored - run sentiment_analysis.py on it first).
+Once all rows are in, the derived artifacts are updated for the genres that received rows (see
+update_derived_artifacts), and the manifest records which ones were rewritten for each genre under
+'artifacts'. Returns a dict of genre -> rows appended (empty if the delta was already done).
+'''
+def ingest_delta(delta_path, output_dir=genre_store.filtered_dir, chunk_size=200_000, processes=None):
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    fingerprint = file_fingerprint(delta_path)
+    entry = manifest['deltas'].get(fingerprint)
+
+    if entry is not None and entry['artifacts_built']:
+        print(f"{delta_path} has already been ingested — nothing to do.")
+        return {}
+
+    headers = {genre: _csv_header(output_dir, genre) for genre in category_list}
+    mismatched = [genre for genre, header in headers.items()
+                  if header is not None and sorted(header) != sorted(genre_columns)]
+    if mismatched:
+        raise ValueError(f"Genre file(s) {mismatched} in {output_dir} don't have the columns {genre_columns}; "
+                         f"run sentiment_analysis.py on them (or rebuild) before appending a delta.")
+
+    if entry is None:
+        entry = {
+            'file': os.path.basename(delta_path),
+            'rows_read': 0,
+            'complete': False,
+            'artifacts_built': False,
+            'rows_appended': {},
+            'file_sizes': {genre: _file_size(output_dir, genre) for genre in category_list},
+        }
+        manifest['deltas'][fingerprint] = entry
+        save_manifest(manifest, output_dir)
+
+    # Undo anything appended after the last recorded watermark
+    for genre, size in entry['file_sizes'].items():
         filename = os.path.join(output_dir, f"{genre}_df.csv")
-        genre_df.to_csv(filename, index=False)
-        print(f"Saved {filename}")
-    else:
-        print(f"No data found for genre: '{genre}' — skipping.")
+        if os.path.exists(filename) and os.path.getsize(filename) > size:
+            with open(filename, 'r+b') as f:
+                f.truncate(size)
+
+    if not entry['complete']:
+        genres = set(category_list)
+        category_cache = {}
+        rows_seen = 0
+        start = time.perf_counter()
+        chunks = pd.read_csv(delta_path, usecols=source_columns, dtype={'review_score': 'float64'},
+                             chunksize=chunk_size)
+        with sentiment_pool(processes) as pool:
+            for chunk in chunks:
+                chunk_start = rows_seen
+                rows_seen += len(chunk)
+                if rows_seen <= entry['rows_read']:
+                    continue
+                chunk = chunk.iloc[max(entry['rows_read'] - chunk_start, 0):]
+
+                chunk['categories'] = normalize_categories(chunk['categories'], category_cache)
+                chunk = chunk[chunk['categories'].isin(genres)].copy()
+                add_sentiment_column(chunk, processes, pool)
+                for genre, genre_df in chunk.groupby('categories', sort=False):
+                    filename = os.path.join(output_dir, f"{genre}_df.csv")
+                    header = _csv_header(output_dir, genre)
+                    genre_df[header or genre_columns].to_csv(filename, mode='a', header=header is None,
+                                                             index=False)
+                    entry['rows_appended'][genre] = entry['rows_appended'].get(genre, 0) + len(genre_df)
+                    entry['file_sizes'][genre] = _file_size(output_dir, genre)
+
+                entry['rows_read'] = rows_seen
+                save_manifest(manifest, output_dir)
+                elapsed = time.perf_counter() - start
+                print(f"Ingested {rows_seen} delta rows ({rows_seen / elapsed:,.0f} rows/s)")
+
+        entry['complete'] = True
+        save_manifest(manifest, output_dir)
+
+    entry['artifacts'] = update_derived_artifacts(entry['rows_appended'], output_dir, chunk_size)
+    entry['artifacts_built'] = True
+    save_manifest(manifest, output_dir)
+    return entry['rows_appended']
+
+
+def _file_size(output_dir, genre):
+    filename = os.path.join(output_dir, f"{genre}_df.csv")
+    return os.path.getsize(filename) if os.path.exists(filename) else 0
+
+
+# Column names of a genre CSV, or None if it doesn't exist yet (or is empty)
+def _csv_header(output_dir, genre):
+    if _file_size(output_dir, genre) == 0:
+        return None
+    return pd.read_csv(os.path.join(output_dir, f"{genre}_df.csv"), nrows=0).columns.tolist()
+
+'''
+Reads a genre CSV chunk_size rows at a time.
+'''
+def read_genre_chunks(genre, output_dir=genre_store.filtered_dir, chunk_size=200_000):
+    return pd.read_csv(os.path.join(output_dir, f"{genre}_df.csv"), dtype={'review_score': 'float64'},
+                       chunksize=chunk_size)
+
+'''
+Brings the derived artifacts of the given genres up to date after rows were appended to their CSVs.
+The columnar store is rewritten from the CSV, and only the appended rows are tokenized and added to the
+token corpus. If a keyword index has been built for the genre, only the appended rows are added to it.
+The CSV is read chunk_size rows at a time, so apart from the saved models below, memory use depends on the
+chunk size and the size of the delta rather than on the size of the genre. The models trained on the whole
+genre (see rebuild_models) are retrained if they had been built, which does load the genre's titles and
+review text.
+Sentiment needs nothing here as it is stored with the rows when they are appended, and title
+de-duplication happens at query time so there is no stored state to update.
+Returns a dict of genre -> names of the artifacts rewritten.
+'''
+def update_derived_artifacts(genres, output_dir=genre_store.filtered_dir, chunk_size=200_000):
+    updated = {}
+    for genre in genres:
+        corpus = load_token_corpus(genre, data_dir=output_dir)
+        index = load_keyword_index(genre, data_dir=output_dir)
+        store = GenreStoreWriter(genre, output_dir)
+        tokens = TokenCorpusBuilder(extend=corpus)
+        new_rows = []
+        for chunk in read_genre_chunks(genre, output_dir, chunk_size):
+            store.append(chunk)
+            # The rows past those the token corpus and the keyword index already cover
+            tokens.append(chunk['review_summary'].iloc[max(tokens.n_rows - store.n_rows + len(chunk), 0):])
+            if index is not None:
+                new_rows.append(chunk.iloc[max(index.n_rows - store.n_rows + len(chunk), 0):])
+        store.close()
+
+        if tokens.n_rows == store.n_rows:
+            corpus = tokens.build()
+        else:
+            # The saved corpus has more rows than the genre file, so it belongs to another version of it
+            tokens = TokenCorpusBuilder()
+            for chunk in read_genre_chunks(genre, output_dir, chunk_size):
+                tokens.append(chunk['review_summary'])
+            corpus = tokens.build()
+        save_token_corpus(corpus, genre, output_dir)
+
+        updated[genre] = ['store', 'token_corpus']
+
+        if index is not None and index.n_rows <= store.n_rows:
+            index = extend_keyword_index(index, pd.concat(new_rows))
+            save_keyword_index(index, genre, output_dir)
+            updated[genre].append('keyword_index')
+
+        updated[genre] += rebuild_models(genre, corpus, output_dir)
+        print(f"Updated derived data for {genre}: {', '.join(updated[genre])}")
+    return updated
+
+'''
+Retrains the topic model, the similarity model and the semantic index of a genre, each only if one has been
+saved, with the settings the saved one was built with (topic count, neighbours per title, vector size and
+number of lists). They are fitted on the whole genre, so appended rows can't be added to them in place, and
+a stale one would keep answering without the new rows. The genre's titles and review text are loaded from
+the columnar store when there is a model to retrain. Returns the names of the models rewritten.
+'''
+def rebuild_models(genre, corpus, output_dir=genre_store.filtered_dir):
+    topic_model = load_topic_model(genre, data_dir=output_dir)
+    similarity_path = model_path(genre, output_dir)
+    has_similarity = os.path.exists(os.path.join(similarity_path, 'vectorizer.joblib'))
+    semantic_path = index_path(genre, output_dir)
+    has_semantic = os.path.exists(os.path.join(semantic_path, 'vectorizer.joblib'))
+    if topic_model is None and not has_similarity and not has_semantic:
+        return []
+
+    rebuilt = []
+    genre_df = genre_store.load_genre_reviews(genre, columns=['title', 'review_summary'], data_dir=output_dir)
+    if topic_model is not None:
+        topic_model = train_topic_model(genre_df, topic_model.lda.n_components, token_corpus=corpus)
+        save_topic_model(topic_model, genre, output_dir)
+        rebuilt.append('topic_model')
+
+    if has_similarity:
+        model = build_similarity_model(genre_df, token_corpus=corpus)
+        neighbours_path = os.path.join(similarity_path, 'neighbours.npy')
+        if os.path.exists(neighbours_path):
+            model = precompute_neighbours(model, k=np.load(neighbours_path, mmap_mode='r').shape[1])
+        save_similarity_model(model, genre, output_dir)
+        rebuilt.append('similarity_model')
+
+    if has_semantic:
+        components = np.load(os.path.join(semantic_path, 'components.npy'), mmap_mode='r').shape[0]
+        n_lists = np.load(os.path.join(semantic_path, 'centroids.npy'), mmap_mode='r').shape[0]
+        index = build_semantic_index(genre_df, n_components=components, n_lists=n_lists, token_corpus=corpus)
+        save_semantic_index(index, genre, output_dir)
+        rebuilt.append('semantic_index')
+    return rebuilt
+
+'''
+Writes the columnar store and the token corpus (see token_corpus.py) for each genre from its finished CSV.
+Each genre file is read chunk_size rows at a time and written as it is read, so memory use depends on the chunk
+size (plus a few bytes per row for the stored codes, numbers and token ids) rather than on the size of the genre.
+A keyword index or model left from the data the CSV replaced would point at the wrong reviews (the index is
+only checked against the row count), so the ones that had been built are rebuilt from the new data: the
+keyword index from the token corpus, the models with rebuild_models.
+Returns a dict of genre -> names of the artifacts written.
+'''
+def build_genre_stores(genres, output_dir=genre_store.filtered_dir, chunk_size=200_000):
+    built = {}
+    for genre in genres:
+        store = GenreStoreWriter(genre, output_dir)
+        tokens = TokenCorpusBuilder()
+        for chunk in read_genre_chunks(genre, output_dir, chunk_size):
+            store.append(chunk)
+            tokens.append(chunk['review_summary'])
+        store.close()
+        corpus = tokens.build()
+        save_token_corpus(corpus, genre, output_dir)
+        built[genre] = ['store', 'token_corpus']
+
+        if os.path.exists(keyword_index_path(genre, output_dir)):
+            save_keyword_index(index_from_token_corpus(corpus), genre, output_dir)
+            built[genre].append('keyword_index')
+        built[genre] += rebuild_models(genre, corpus, output_dir)
+    return built
+
+def main():
+    parser = argparse.ArgumentParser(description='Split the master reviews CSV into one file per genre.')
+    parser.add_argument('--source', default=master_csv)
+    parser.add_argument('--output-dir', default=genre_store.filtered_dir)
+    parser.add_argument('--chunk-size', type=int, default=200_000)
+    parser.add_argument('--processes', type=int, default=None, help='processes used for sentiment scoring')
+    parser.add_argument('--delta', default=None,
+                        help='append the reviews in this CSV to the existing genre files instead of a full rebuild')
+    args = parser.parse_args()
+
+    if args.delta:
+        try:
+            rows_appended = ingest_delta(args.delta, args.output_dir, args.chunk_size, args.processes)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+        for genre, rows in rows_appended.items():
+            print(f"Appended {rows} rows to {genre}")
+        return
+
+    rows_written = partition_reviews(args.source, args.output_dir, args.chunk_size, args.processes)
+
+    for genre in category_list:
+        if genre in rows_written:
+            print(f"Saved {os.path.join(args.output_dir, f'{genre}_df.csv')} ({rows_written[genre]} rows)")
+        else:
+            print(f"No data found for genre: '{genre}' — skipping.")
+
+    artifacts = build_genre_stores(rows_written, args.output_dir, args.chunk_size)
+
+    # A full rebuild replaces every genre file, so deltas ingested before it no longer apply
+    save_manifest({'full_build': {'source': os.path.abspath(args.source), 'rows': rows_written,
+                                  'artifacts': artifacts, 'time': time.strftime('%Y-%m-%d %H:%M:%S')},
+                   'deltas': {}}, args.output_dir)
+
+
+if __name__ == "__main__":
+    main()
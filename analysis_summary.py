@@ -1,8 +1,33 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-from topic_modeling import main_topics
+from topic_modeling import get_topic_model, main_topics
 from sentiment_analysis import apply_sentiment_analysis
-import os
-from fuzzywuzzy import fuzz
+from genre_store import available_genres, load_genre_reviews
+from corpus_cache import corpus_cache, get_corpus
+from instrumentation import add_stages, capture_stages, is_collecting, stage, timed_request
+from similar_books import get_similarity_model
+from result_cache import fingerprints, result_cache, result_key
+from relevance import blend_scores, resolve_weights, row_relevance
+from semantic_search import get_semantic_index, semantic_index_built
+
+# How a title with several matching reviews is scored, see score_matches
+SCORE_POLICIES = ('first', 'max', 'mean')
+
+# Passing this as the genre to recommend_book searches every genre
+ALL_GENRES = 'all'
+
+# How recommend_book finds the books for the keywords: fuzzy keyword matching, or semantic search (see
+# semantic_search.py), which also finds reviews that use other words with a similar meaning
+SEARCH_MODES = ('keyword', 'semantic')
+
+# Titles semantic search retrieves per genre before they are ranked by the blended score
+SEMANTIC_CANDIDATES = 50
+
+# fuzzywuzzy is imported where it is used (as in keyword_index.py): a request answered from the keyword index's
+# term cache or the result cache never needs it
 
 '''
 Returns True if any keyword (or a sufficiently similar word) is found in the review text.
@@ -11,6 +36,7 @@ Uses fuzzy matching so minor spelling differences still count as a match.
 def has_keywords(text, keywords):
     if not isinstance(text, str):
         return False
+    from fuzzywuzzy import fuzz
     text = text.lower()
     words = text.split()
     threshold = 80
@@ -20,108 +46,339 @@ def has_keywords(text, keywords):
                 return True
     return False
 
+'''
+Returns a NumPy boolean array with True for every review (row of reviews_df) that contains at least one of
+the keywords, using has_keywords semantics. If a KeywordIndex built from the same dataframe is passed in,
+the matching rows are looked up in the index instead of running has_keywords on every review.
+'''
+def match_mask(reviews_df, keywords, index=None):
+    mask = np.zeros(len(reviews_df), dtype=bool)
+    if index is not None:
+        mask[index.matching_rows(keywords)] = True
+    else:
+        texts = reviews_df['review_summary']
+        mask[:] = np.fromiter((has_keywords(text, keywords) for text in texts), dtype=bool, count=len(texts))
+    return mask
+
 '''
 Takes a dataframe and a list of keywords, and returns a list of dicts for books whose reviews
-contain at least one of the given keywords. Each title is only included once (de-duplicated).
+contain at least one of the given keywords. Each title is only included once (de-duplicated), using
+its first matching review.
 '''
-def matched_books(reviews_df, keywords):
-    matching_books = []
-    seen_titles = set()
+def matched_books(reviews_df, keywords, index=None):
+    matches = reviews_df[match_mask(reviews_df, keywords, index)]
+    matches = matches[~matches['title'].duplicated()].assign(**{'keyword match': 1})
+    return matches.to_dict('records')
 
-    for _, review in reviews_df.iterrows():
-        keyword_score = 1 if has_keywords(review['review_summary'], keywords) else 0
-        if review['title'] not in seen_titles and keyword_score == 1:
-            matching_books.append({
-                'title': review['title'],
-                'categories': review['categories'],
-                'review_summary': review['review_summary'],
-                'review_score': review['review_score'],
-                'publisher': review['publisher'],
-                'keyword match': keyword_score
-            })
-            seen_titles.add(review['title'])
+'''
+Semantic counterpart of match_mask: finds the `candidates` titles whose reviews are closest in meaning to the
+keywords in the genre's SemanticIndex, and returns a boolean mask of all their reviews in reviews_df together
+with the cosine similarity of each selected review's title (one value per True in the mask).
+'''
+def semantic_matches(reviews_df, keywords, index, candidates=SEMANTIC_CANDIDATES, nprobe=None):
+    titles = index.similar_to_text(' '.join(keywords), k=candidates, nprobe=nprobe)
+    mask = reviews_df['title'].isin(titles['title']).to_numpy()
+    similarity = dict(zip(titles['title'], titles['similarity']))
+    return mask, reviews_df['title'][mask].map(similarity).to_numpy(dtype=float)
 
-    return matching_books
+'''
+Indices of the k largest values of scores, largest first. Ties keep their original order (also when only
+some of the values tied with the k-th largest fit) and NaN scores go last. Uses a partition so only the k
+selected values are sorted.
+'''
+def top_k_positions(scores, k):
+    scores = np.where(np.isnan(scores), -np.inf, scores)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if len(scores) > k:
+        # argpartition alone would pick an arbitrary subset of the values tied with the k-th largest
+        kth = np.partition(-scores, k - 1)[k - 1]
+        above = np.flatnonzero(-scores < kth)
+        positions = np.concatenate([above, np.flatnonzero(-scores == kth)[:k - len(above)]])
+    else:
+        positions = np.arange(len(scores))
+    return positions[np.lexsort((positions, -scores[positions]))]
 
 '''
-Main recommendation function used by app.py.
-Given a genre and a keyword string, returns:
-  - top_10_recommended: DataFrame of up to 10 books ranked by combined sentiment + review score
-  - review_topics: string summarising the topics found in those top reviews
-Returns (empty DataFrame, []) if no matches are found.
+Scores the matched reviews (mask from match_mask) and returns the top k books as a DataFrame, one row per
+title. Each review's total_score blends its star rating, VADER sentiment and, when relevance is given (one
+value per matched row, see relevance.row_relevance), how relevant its title is to the keywords, using the
+ranking weights (relevance.blend_scores; without relevance it is the average of rating and sentiment for the
+default weights). For semantic search similarity (from semantic_matches) takes the place of relevance and
+there is no 'keyword match' column. policy decides which of a title's matching reviews represents it:
+  - 'first': its first matching review (what matched_books has always done)
+  - 'max': its best-scoring matching review
+  - 'mean': its first matching review, with review_score, sentiment and total_score averaged over all of
+    the title's matching reviews
+Everything is done with array/groupby operations over the matched rows; VADER only runs for matched
+reviews without a stored sentiment.
 '''
-def recommend_book(genre, key_term):
-    base_path = os.path.abspath(os.path.dirname(__file__))
-    file_path = os.path.join(base_path, f"Data/filtered_reviews/{genre}_df.csv")
+def score_matches(reviews_df, mask, policy='first', k=10, relevance=None, weights=None, similarity=None):
+    if policy not in SCORE_POLICIES:
+        raise ValueError(f"Unknown policy '{policy}', expected one of {SCORE_POLICIES}")
 
-    # BUG FIX: Added a clear FileNotFoundError message so users know what went wrong
-    # rather than getting an opaque pandas crash.
-    if not os.path.exists(file_path):
-        print(f"Error: Data file not found at {file_path}. Run Genre_filter.py first.")
-        return pd.DataFrame(), []
+    columns = [c for c in ['title', 'categories', 'review_summary', 'review_score', 'publisher', 'sentiment']
+               if c in reviews_df.columns]
+    with stage('select_matches') as info:
+        matches = reviews_df.loc[mask, columns]
+        info['rows'] = len(matches)
+        if relevance is not None:
+            matches.insert(columns.index('publisher') + 1, 'relevance', relevance)
+        if similarity is not None:
+            matches.insert(columns.index('publisher') + 1, 'similarity', similarity)
+        if policy == 'first':
+            # Only the first review of each title can be picked, so don't score the others
+            matches = matches[~matches['title'].duplicated()]
+        if similarity is None:
+            matches.insert(columns.index('publisher') + 1, 'keyword match', 1)
 
-    reviews_df = pd.read_csv(file_path, usecols=['title', 'categories', 'review_summary',
-                                                   'review_score', 'publisher'])
+    matches = apply_sentiment_analysis(matches.copy())
 
-    keywords = key_term.strip().split()
+    with stage('scoring', policy=policy) as info:
+        info['rows'] = len(matches)
+        matches['total_score'] = blend_scores(matches['review_score'], matches['sentiment'],
+                                              matches.get('relevance'), weights, matches.get('similarity'))
 
-    # BUG FIX: keywords list was split but could contain empty strings if key_term had extra spaces.
-    keywords = [k for k in keywords if k]
+        if policy == 'max':
+            # Best review of each title, earliest first on ties. Titles whose reviews all lack a score keep their
+            # first review (NaN scores sort last), which top_k_positions then ranks below every scored title.
+            order = np.argsort(-matches['total_score'].to_numpy(dtype=float), kind='stable')
+            best = order[~matches['title'].iloc[order].duplicated().to_numpy()]
+            matches = matches.iloc[np.sort(best)]
+        elif policy == 'mean':
+            score_columns = ['review_score', 'sentiment', 'total_score']
+            averages = matches.groupby('title', sort=False, dropna=False)[score_columns].transform('mean')
+            matches[score_columns] = averages
+            matches = matches[~matches['title'].duplicated()]
 
-    if not keywords:
-        return pd.DataFrame(), []
+        return matches.iloc[top_k_positions(matches['total_score'].to_numpy(dtype=float), k)]
+
+'''
+Loads one genre, matches the keywords and returns its top k books (see score_matches), without topics.
+In 'semantic' mode the books are found with semantic_matches instead of keyword matching.
+Returns None if there is no data for the genre. This is the unit of work that recommend_book runs per genre,
+in a worker process when several genres are searched.
+'''
+def recommend_from_genre(genre, keywords, k=10, policy='first', weights=None, mode='keyword'):
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+
+    # The genre data and its keyword index are loaded once and kept in the process-wide corpus cache
+    # (see corpus_cache.py), so repeat requests for the same genre skip loading entirely.
+    with stage('load', genre=genre) as info:
+        info['cache_hit'] = genre in corpus_cache
+        corpus = get_corpus(genre)
+        info['rows'] = 0 if corpus is None else len(corpus.reviews_df)
+
+    if corpus is None:
+        return None
+
+    if mode == 'semantic':
+        # Nearest titles from the genre's IVF index, saved by semantic_search.py
+        index = get_semantic_index(genre)
+        if index is None:
+            print(f"Error: Semantic index not built for genre '{genre}'. Run semantic_search.py '{genre}' first.")
+            return pd.DataFrame()
+        with stage('semantic_search') as info:
+            mask, similarity = semantic_matches(corpus.reviews_df, keywords, index)
+            info['matched'] = int(mask.sum())
+        if not mask.any():
+            return pd.DataFrame()
+        return score_matches(corpus.reviews_df, mask, policy=policy, k=k, weights=weights, similarity=similarity)
+
+    with stage('match', keywords=len(keywords)) as info:
+        mask = match_mask(corpus.reviews_df, keywords, index=corpus.index)
+        info['rows'] = len(mask)
+        info['matched'] = int(mask.sum())
+
+    if not mask.any():
+        return pd.DataFrame()
+
+    # BM25-style relevance of each matched review's title, from the index's term statistics
+    with stage('relevance') as info:
+        relevance = row_relevance(corpus.index, keywords, corpus.title_stats, np.flatnonzero(mask))
+        info['available'] = relevance is not None
+
+    # Sentiment, composite score (star rating, VADER compound sentiment and relevance), per-title
+    # selection and top-k, all over the matched rows only
+    return score_matches(corpus.reviews_df, mask, policy=policy, k=k, relevance=relevance, weights=weights)
+
+'''
+Process pool shared by multi-genre searches, created on first use. Each worker keeps its own corpus cache,
+so genres a worker has already searched stay in its memory. BOOKREC_WORKERS sets the number of processes
+(default: one per CPU). The corpus cache budget (BOOKREC_CACHE_BYTES) is split evenly between the workers, so
+with the main process's own cache, loaded genres take at most twice BOOKREC_CACHE_BYTES in total.
+'''
+_genre_pool = None
+
+def get_genre_pool():
+    global _genre_pool
+    if _genre_pool is None:
+        workers = int(os.environ.get('BOOKREC_WORKERS', 0)) or os.cpu_count()
+        # spawn rather than fork: the Streamlit server is multi-threaded, and forking a threaded process can
+        # copy locks in a held state
+        _genre_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                          initializer=_init_genre_worker,
+                                          initargs=(corpus_cache.max_bytes // workers,))
+    return _genre_pool
 
-    books_list = matched_books(reviews_df, keywords)
 
-    if len(books_list) == 0:
+def _init_genre_worker(cache_bytes):
+    corpus_cache.max_bytes = cache_bytes
+
+'''
+recommend_from_genre as run on the process pool. The request's timing report only exists in this process, so
+when capture is True the worker's stage timings are recorded and sent back with the result.
+'''
+def _recommend_in_worker(genre, keywords, k, policy, weights, mode, capture):
+    with capture_stages(capture) as stages:
+        result = recommend_from_genre(genre, keywords, k, policy, weights, mode)
+    return result, stages
+
+'''
+Searches several genres and merges each genre's top k into one overall top k. Genres are searched in
+parallel on the process pool (or one after another in this process when parallel is False), so the time
+taken depends on the number of cores rather than the number of genres. A title listed under several genres
+is only kept once, with its best score.
+'''
+def recommend_from_genres(genres, keywords, k=10, policy='first', parallel=True, weights=None, mode='keyword'):
+    with stage('search_genres', genres=len(genres), parallel=parallel):
+        if parallel and len(genres) > 1:
+            pool = get_genre_pool()
+            n = len(genres)
+            outputs = list(pool.map(_recommend_in_worker, genres, [keywords] * n, [k] * n, [policy] * n,
+                                    [weights] * n, [mode] * n, [is_collecting()] * n))
+            results = [result for result, _ in outputs]
+            for genre, (_, stages) in zip(genres, outputs):
+                add_stages(stages, genre=genre, worker=True)
+        else:
+            results = [recommend_from_genre(genre, keywords, k, policy, weights, mode) for genre in genres]
+
+    missing = [genre for genre, result in zip(genres, results) if result is None]
+    if missing:
+        print(f"Error: Data file not found for genre(s) {missing}. Run Genre_filter.py first.")
+
+    results = [result for result in results if result is not None and not result.empty]
+    if not results:
+        return pd.DataFrame()
+
+    with stage('merge', partitions=len(results)):
+        merged = pd.concat(results, ignore_index=True)
+        merged = merged.iloc[top_k_positions(merged['total_score'].to_numpy(dtype=float), len(merged))]
+        merged = merged[~merged['title'].duplicated()]
+        return merged.head(k)
+
+'''
+Normalises a keyword string the way matching sees it: has_keywords lowercases every keyword, and a review
+matches if it contains any of them, so case, order and repeats don't change the results. Returns a sorted
+tuple of distinct lowercase keywords, e.g. 'Funny  adventure funny' -> ('adventure', 'funny').
+'''
+def normalize_keywords(key_term):
+    return tuple(sorted({word.lower() for word in key_term.split()}))
+
+'''
+Turns the genre argument of recommend_book into a list of genres: a single genre name, a list of genre
+names, or 'all' for every genre that has data.
+'''
+def resolve_genres(genre):
+    if isinstance(genre, str):
+        return available_genres() if genre == ALL_GENRES else [genre]
+    return list(dict.fromkeys(genre))
+
+'''
+Main recommendation function used by app.py.
+Given a genre (or a list of genres, or 'all') and a keyword string, returns:
+  - top_10_recommended: DataFrame of up to k (default 10) books ranked by the blend of keyword relevance,
+    review score and sentiment (weights: see relevance.py), with each title represented according to
+    policy (see score_matches). mode='semantic' finds the books by meaning rather than by the keywords
+    themselves (see SEARCH_MODES)
+  - review_topics: string summarising the topics found in those top reviews
+Returns (empty DataFrame, []) if no matches are found, or in semantic mode if a genre's semantic index
+hasn't been built.
+'''
+@timed_request('recommend_book')
+def recommend_book(genre, key_term, k=10, policy='first', weights=None, mode='keyword'):
+    genres = resolve_genres(genre)
+
+    # BUG FIX: keywords list was split but could contain empty strings if key_term had extra spaces.
+    # normalize_keywords also drops case and repeats, which don't change the matches, so that equivalent
+    # queries share one result cache entry.
+    keywords = list(normalize_keywords(key_term))
+
+    if not keywords or not genres:
         return pd.DataFrame(), []
 
-    # BUG FIX: matched_books returns a plain list of dicts; apply_sentiment_analysis now
-    # handles conversion internally, but we convert here explicitly for clarity.
-    matching_books = pd.DataFrame(books_list)
+    unbuilt = [genre for genre in genres if not semantic_index_built(genre)] if mode == 'semantic' else []
+    if unbuilt:
+        print(f"Error: Semantic index not built for genre(s) {unbuilt}. Run semantic_search.py first.")
+        return pd.DataFrame(), []
 
-    # Apply sentiment analysis
-    recommended_books = apply_sentiment_analysis(matching_books)
+    # Popular queries are answered from the result cache (see result_cache.py) as long as the genre files and
+    # saved models haven't changed since the result was computed
+    with stage('result_cache') as info:
+        key = result_key(genres, keywords, k, policy, resolve_weights(weights), mode)
+        genre_fingerprints = fingerprints(genres)
+        cached = result_cache.get(key, genre_fingerprints)
+        info['cache_hit'] = cached is not None
+    if cached is not None:
+        top_10_recommended, review_topics = cached
+        return top_10_recommended.copy(), review_topics
 
-    # Calculate composite score: average of star rating and VADER compound sentiment
-    recommended_books['total_score'] = (
-        recommended_books['review_score'] + recommended_books['sentiment']
-    ) / 2
+    if len(genres) > 1:
+        top_10_recommended = recommend_from_genres(genres, keywords, k=k, policy=policy, weights=weights,
+                                                   mode=mode)
+        topic_model = None
+    else:
+        top_10_recommended = recommend_from_genre(genres[0], keywords, k=k, policy=policy, weights=weights,
+                                                  mode=mode)
+        # BUG FIX: Added a clear FileNotFoundError message so users know what went wrong
+        # rather than getting an opaque pandas crash.
+        if top_10_recommended is None:
+            print(f"Error: Data file not found for genre '{genres[0]}'. Run Genre_filter.py first.")
+            return pd.DataFrame(), []
+        topic_model = get_topic_model(genres[0])
 
-    # Sort by composite score descending
-    recommended_books = recommended_books.sort_values(by='total_score', ascending=False)
+    if top_10_recommended.empty:
+        result_cache.put(key, genre_fingerprints, (pd.DataFrame(), []))
+        return pd.DataFrame(), []
 
-    # Return top 10
-    top_10_recommended = recommended_books.head(10)
-    review_topics = main_topics(top_10_recommended)
+    # Uses the genre's offline-trained topic model if there is one (single genre searches only),
+    # otherwise fits one on these reviews
+    review_topics = main_topics(top_10_recommended, topic_model=topic_model)
 
+    result_cache.put(key, genre_fingerprints, (top_10_recommended.copy(), review_topics))
     return top_10_recommended, review_topics
 
+'''
+"Similar books" lookup used by app.py. Returns a DataFrame of up to k titles in the genre whose reviews are
+most similar to the reviews of the given title (TF-IDF cosine similarity, see similar_books.py), with a
+similarity column. Returns an empty DataFrame if the genre's similarity model hasn't been built or the
+title isn't found.
+'''
+def recommend_similar(genre, title, k=10):
+    model = get_similarity_model(genre)
+    if model is None:
+        print(f"Error: Similarity model not built for genre '{genre}'. Run similar_books.py '{genre}' first.")
+        return pd.DataFrame()
+    return model.similar_titles(title.strip(), k=k)
+
 
 def main():
     keywords = ['serious', 'melancholy']
     genre = 'biography autobiography'
 
-    reviews_df = pd.read_csv(f"Data/filtered_reviews/{genre}_df.csv",
-                              usecols=['title', 'categories', 'review_summary',
-                                       'review_score', 'publisher'])
+    reviews_df = load_genre_reviews(genre)
+    if reviews_df is None:
+        print(f"Error: Data file not found for genre '{genre}'. Run Genre_filter.py first.")
+        return
 
-    books_list = matched_books(reviews_df, keywords)
+    mask = match_mask(reviews_df, keywords)
 
-    if not books_list:
+    if not mask.any():
         print("No matching books found.")
         return
 
-    # BUG FIX: apply_sentiment_analysis expects a DataFrame, not a list
-    matching_books = pd.DataFrame(books_list)
-    recommended_books = apply_sentiment_analysis(matching_books)
-
-    recommended_books['total_score'] = (
-        recommended_books['review_score'] + recommended_books['sentiment']
-    ) / 2
-    recommended_books = recommended_books.sort_values(by='total_score', ascending=False)
-
-    top_10_recommended = recommended_books.head(10)
+    top_10_recommended = score_matches(reviews_df, mask, k=10)
     review_topics = main_topics(top_10_recommended)
 
     print('Recommended books:')
@@ -1,10 +1,38 @@
+import os
 import streamlit as st
-from analysis_summary import recommend_book
+from analysis_summary import recommend_book, recommend_similar
+from corpus_cache import cache_stats, warm_corpus
+from instrumentation import collect
+from result_cache import result_cache_stats
+
+GENRES = ['antiques collectibles', 'architecture', 'art', 'bible', 'biography autobiography',
+          'body mind spirit', 'business economics', 'comics graphic novels', 'computers',
+          'cooking', 'crafts hobbies', 'design', 'drama', 'education', 'family relationships',
+          'fiction', 'foreign language study', 'games', 'gardening', 'health fitness',
+          'history', 'house home', 'humor', 'juvenile fiction', 'juvenile nonfiction',
+          'language arts disciplines', 'law', 'literary collections', 'literary criticism',
+          'mathematics', 'medical', 'music', 'nature', 'performing arts', 'pets', 'philosophy',
+          'photography', 'poetry', 'political science', 'psychology', 'reference', 'religion',
+          'science', 'self-help', 'social science', 'sports recreation', 'study aids',
+          'technology engineering', 'transportation', 'travel', 'true crime',
+          'young adult fiction']
+
+# Genres to load into memory when the server starts so the first users don't wait for them,
+# e.g. BOOKREC_WARM_GENRES="fiction,humor,travel"
+WARM_GENRES = tuple(g.strip() for g in os.environ.get('BOOKREC_WARM_GENRES', '').split(',') if g.strip())
+
+
+# st.cache_resource runs this once per server process rather than on every rerun of the script
+@st.cache_resource
+def warm_genres(genres):
+    warm_corpus(genres)
+    return True
 
 
 def main():
+    warm_genres(WARM_GENRES)
     st.title('Book Recommendation System')
-    menu = ["Home", "Recommend", "About"]
+    menu = ["Home", "Recommend", "Similar books", "About"]
     choice = st.sidebar.selectbox("Menu", menu)
 
     if choice == "Home":
@@ -16,7 +44,7 @@ def main():
             **How to Use This App:**
 
             1. Navigate to the **Recommend** tab from the sidebar.
-            2. Select your preferred genre from the dropdown menu.
+            2. Select one or more genres (or 'All genres') from the dropdown menu.
             3. Enter a keyword that interests you (e.g., 'adventure', 'romance').
             4. Click the **Recommend** button to see a list of books tailored to your preferences.
 
@@ -26,29 +54,30 @@ def main():
     elif choice == "Recommend":
         st.subheader("Get Your Book Recommendations")
 
-        genre_select = st.selectbox(
-            'Please select your preferred genre:',
-            ['antiques collectibles', 'architecture', 'art', 'bible', 'biography autobiography',
-             'body mind spirit', 'business economics', 'comics graphic novels', 'computers',
-             'cooking', 'crafts hobbies', 'design', 'drama', 'education', 'family relationships',
-             'fiction', 'foreign language study', 'games', 'gardening', 'health fitness',
-             'history', 'house home', 'humor', 'juvenile fiction', 'juvenile nonfiction',
-             'language arts disciplines', 'law', 'literary collections', 'literary criticism',
-             'mathematics', 'medical', 'music', 'nature', 'performing arts', 'pets', 'philosophy',
-             'photography', 'poetry', 'political science', 'psychology', 'reference', 'religion',
-             'science', 'self-help', 'social science', 'sports recreation', 'study aids',
-             'technology engineering', 'transportation', 'travel', 'true crime',
-             'young adult fiction']
+        genre_select = st.multiselect(
+            'Please select your preferred genre(s):',
+            ['All genres'] + GENRES
         )
 
         key_term = st.text_input("Enter a keyword (e.g., 'adventure', 'romance', 'history')")
+        semantic = st.checkbox("Also find books described in other words (semantic search)")
 
         if st.button("Recommend"):
             if genre_select and key_term.strip():
-                st.write(f"Recommendations for genre: **{genre_select}** | Keyword: **{key_term}**")
+                # One genre is passed as a plain string, several as a list, and 'All genres' as 'all'
+                if 'All genres' in genre_select:
+                    genres = 'all'
+                elif len(genre_select) == 1:
+                    genres = genre_select[0]
+                else:
+                    genres = genre_select
+                st.write(f"Recommendations for genre: **{', '.join(genre_select)}** | Keyword: **{key_term}**")
 
                 with st.spinner("Finding the best books for you..."):
-                    results, topics = recommend_book(genre_select, key_term)
+                    # With BOOKREC_INSTRUMENT=1 this records how long each pipeline stage took
+                    with collect('app_recommend', genre=genres, key_term=key_term) as timings:
+                        results, topics = recommend_book(genres, key_term,
+                                                         mode='semantic' if semantic else 'keyword')
 
                 # BUG FIX: The original code had a broken conditional:
                 #   if results.empty → warning (correct)
@@ -62,6 +91,8 @@ def main():
 
                     # Display recommended books table with selected columns
                     display_cols = ['title', 'review_score', 'sentiment', 'total_score']
+                    if isinstance(genres, list) or genres == 'all':
+                        display_cols.insert(1, 'categories')
                     # Only show columns that exist (sentiment/total_score are computed)
                     available_cols = [c for c in display_cols if c in results.columns]
                     st.dataframe(results[available_cols].reset_index(drop=True))
@@ -70,8 +101,31 @@ def main():
                     if topics and isinstance(topics, str) and topics.strip():
                         st.subheader("Key Themes in These Reviews")
                         st.write(topics)
+
+                if timings is not None:
+                    with st.expander(f"Timing breakdown ({timings.total_seconds:.2f}s)"):
+                        st.dataframe(timings.as_frame())
+            else:
+                st.error("Please select at least one genre and enter at least one keyword.")
+
+    elif choice == "Similar books":
+        st.subheader("Find Books Like One You Enjoyed")
+
+        genre_select = st.selectbox('Please select the genre of the book:', GENRES)
+        title = st.text_input("Enter the book's title")
+
+        if st.button("Find similar books"):
+            if title.strip():
+                with st.spinner("Looking for similar books..."):
+                    results = recommend_similar(genre_select, title)
+
+                if results.empty:
+                    st.warning("No similar books found. Check the title and genre.")
+                else:
+                    st.success(f"Found {len(results)} similar book(s)!")
+                    st.dataframe(results.reset_index(drop=True))
             else:
-                st.error("Please select a genre and enter at least one keyword.")
+                st.error("Please enter a book title.")
 
     else:
         st.subheader("About")
@@ -87,6 +141,10 @@ def main():
             - Swarna Dharshini S
         """)
 
+        # Shared corpus cache counters, used to size BOOKREC_CACHE_BYTES in production
+        with st.expander("Cache statistics"):
+            st.json({'genres': cache_stats(), 'results': result_cache_stats()})
+
 
 if __name__ == '__main__':
     main()
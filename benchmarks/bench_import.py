@@ -0,0 +1,95 @@
+'''
+Measures how long it takes to import the app's modules in a fresh interpreter - the cost every Streamlit
+cold start, worker process and pytest run pays before doing anything. Each module is imported `repeat`
+times in a new `python -X importtime` process; the JSON output has the p50/p95 wall time, the slowest
+packages pulled in (cumulative microseconds from -X importtime) and which heavy dependencies were loaded.
+It fails if a module loads a dependency MUST_NOT_LOAD lists for it (e.g. fuzzywuzzy for analysis_summary).
+
+    python -m benchmarks.bench_import --repeat 5
+    python -m benchmarks.bench_import analysis_summary Genre_filter --output import.json
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+from benchmarks.bench_pipeline import git_commit, summarize
+
+MODULES = ['analysis_summary', 'sentiment_analysis', 'topic_modeling', 'similar_books', 'Genre_filter', 'app']
+# Dependencies that should only be imported on first use
+HEAVY = ['sklearn', 'scipy', 'nltk', 'joblib', 'fuzzywuzzy']
+# Dependencies a module must not load at import time; the benchmark fails if it does
+MUST_NOT_LOAD = {'analysis_summary': ['fuzzywuzzy']}
+
+CHECK = ("import sys, {module}; "
+         "print(','.join(m for m in {heavy!r} if m in sys.modules))")
+
+
+def import_once(module, root):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHECK.format(module=module, heavy=HEAVY)],
+                            capture_output=True, text=True, cwd=root)
+    seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed: {result.stderr.strip().splitlines()[-1]}")
+    return seconds, result.stdout.strip(), result.stderr
+
+
+'''
+Packages (by top-level name) that took the longest to import, from the -X importtime report on stderr.
+The benchmarked module itself and the interpreter's own startup imports are left out.
+'''
+def slowest_packages(importtime_report, module, count=5):
+    packages = {}
+    for line in importtime_report.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        if package in (module, 'site', 'encodings') or package.startswith('_'):
+            continue
+        packages[package] = max(packages.get(package, 0), int(cumulative))
+    slowest = sorted(packages.items(), key=lambda item: -item[1])[:count]
+    return {name: round(microseconds / 1000, 1) for name, microseconds in slowest}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default=None, help='write the JSON here instead of printing it')
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    report = {'commit': git_commit(), 'python': sys.version.split()[0], 'repeat': args.repeat, 'results': []}
+    for module in args.modules:
+        try:
+            runs = [import_once(module, root) for _ in range(args.repeat)]
+        except RuntimeError as error:
+            print(error, file=sys.stderr)
+            continue
+        times = np.array([seconds for seconds, _, _ in runs])
+        report['results'].append({
+            'module': module,
+            **summarize(times),
+            'heavy_modules_loaded': [m for m in runs[-1][1].split(',') if m],
+            'slowest_imports_ms': slowest_packages(runs[-1][2], module),
+        })
+        print(f"Benchmarked import of {module}", file=sys.stderr, flush=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    for result in report['results']:
+        loaded = set(result['heavy_modules_loaded']) & set(MUST_NOT_LOAD.get(result['module'], []))
+        assert not loaded, f"importing {result['module']} loaded {sorted(loaded)}"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+'''
+Times each stage of recommend_book on synthetic genres, so it runs without the private Data/ files:
+
+    load       load_genre_reviews from the columnar store (or --format csv)
+    index      build_keyword_index (offline step, timed once per size)
+    match      match_mask with the keyword index (what matched_books uses)
+    sentiment  apply_sentiment_analysis on the matched titles
+    scoring    score_matches (composite score, per-title selection, top-k)
+    topics     main_topics on the top 10
+
+Results are printed (or written with --output) as JSON with p50/p95 latency per stage, throughput and peak
+RSS, so runs from different commits can be compared.
+
+    python -m benchmarks.bench_pipeline --sizes 1000 10000 100000 --keyword-counts 1 3 --repeat 5
+    python -m benchmarks.bench_pipeline --sizes 10000000 --repeat 3 --output bench.json
+'''
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import sklearn
+import topic_modeling
+from analysis_summary import match_mask, score_matches
+from genre_store import csv_path, load_genre_reviews, write_genre_store
+from keyword_index import build_keyword_index
+from sentiment_analysis import add_sentiment_column, apply_sentiment_analysis
+from synthetic_data import make_genre_reviews
+
+STAGES = ['load', 'match', 'sentiment', 'scoring', 'topics']
+# Keywords are taken from this list in order, so a run with n keywords always uses the same ones
+KEYWORDS = ['adventure', 'funny', 'melancholy', 'inspiring', 'scary', 'classic', 'journey', 'romance']
+
+
+def peak_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == 'Darwin' else peak * 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(times):
+    times = np.asarray(times)
+    return {'p50_ms': round(float(np.percentile(times, 50)) * 1000, 3),
+            'p95_ms': round(float(np.percentile(times, 95)) * 1000, 3)}
+
+
+'''
+Runs every stage `repeat` times for one genre size and keyword count. Caches that would make repeats
+artificially fast (the index's per-keyword cache and the topic memo) are cleared before each run.
+'''
+def bench_query(data_dir, genre, index, keywords, repeat, stored_sentiment):
+    times = {stage: [] for stage in STAGES}
+    matched_rows = 0
+    for _ in range(repeat):
+        index._term_cache.clear()
+        topic_modeling._fit_topics.cache_clear()
+
+        start = time.perf_counter()
+        reviews_df = load_genre_reviews(genre, data_dir=data_dir)
+        times['load'].append(time.perf_counter() - start)
+        if not stored_sentiment and 'sentiment' in reviews_df.columns:
+            reviews_df = reviews_df.drop(columns='sentiment')
+
+        start = time.perf_counter()
+        mask = match_mask(reviews_df, keywords, index=index)
+        times['match'].append(time.perf_counter() - start)
+        matched_rows = int(mask.sum())
+
+        matches = reviews_df[mask]
+        matches = matches[~matches['title'].duplicated()]
+        start = time.perf_counter()
+        scored = apply_sentiment_analysis(matches.copy())
+        times['sentiment'].append(time.perf_counter() - start)
+
+        # Score with the sentiment already filled in so this stage only measures the scoring itself
+        with_sentiment = reviews_df.loc[mask].copy()
+        with_sentiment['sentiment'] = 0.0
+        with_sentiment.loc[scored.index, 'sentiment'] = scored['sentiment']
+        start = time.perf_counter()
+        top_10 = score_matches(with_sentiment, np.ones(len(with_sentiment), dtype=bool), k=10)
+        times['scoring'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        topic_modeling.main_topics(top_10)
+        times['topics'].append(time.perf_counter() - start)
+
+    stages = {stage: summarize(stage_times) for stage, stage_times in times.items()}
+    total = np.sum([times[stage] for stage in STAGES], axis=0)
+    return {
+        'keywords': keywords,
+        'matched_rows': matched_rows,
+        'stages': stages,
+        'total': summarize(total),
+        'queries_per_second': round(1 / float(np.percentile(total, 50)), 3),
+        'match_rows_per_second': round(index.n_rows / max(float(np.percentile(times['match'], 50)), 1e-9)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--keyword-counts', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--format', choices=['store', 'csv'], default='store')
+    parser.add_argument('--stored-sentiment', action='store_true',
+                        help='precompute sentiment like Genre_filter.py does, instead of scoring at query time')
+    parser.add_argument('--output', default=None, help='write the JSON here instead of printing it')
+    args = parser.parse_args()
+
+    genre = 'fiction'
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__,
+        'format': args.format,
+        'stored_sentiment': args.stored_sentiment,
+        'repeat': args.repeat,
+        'results': [],
+    }
+
+    for size in args.sizes:
+        reviews_df = make_genre_reviews(size, genre=genre)
+        if args.stored_sentiment:
+            add_sentiment_column(reviews_df)
+
+        with tempfile.TemporaryDirectory() as data_dir:
+            if args.format == 'store':
+                write_genre_store(reviews_df, genre, data_dir)
+            else:
+                reviews_df.to_csv(csv_path(genre, data_dir), index=False)
+
+            start = time.perf_counter()
+            index = build_keyword_index(reviews_df)
+            index_seconds = time.perf_counter() - start
+            del reviews_df
+
+            queries = [bench_query(data_dir, genre, index, KEYWORDS[:count], args.repeat, args.stored_sentiment)
+                       for count in args.keyword_counts]
+
+        report['results'].append({
+            'rows': size,
+            'index_build_seconds': round(index_seconds, 3),
+            'queries': queries,
+            'peak_rss_bytes': peak_rss_bytes(),
+        })
+        print(f"Benchmarked {size} rows", file=sys.stderr, flush=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+'''
+How the per-request cost grows with the size of a genre, on synthetic genres of several sizes. For each size it
+reports the best-of-repeat time of matching (match_mask with the keyword index) and of the whole per-request
+path after loading - matching, relevance and scoring (sentiment is stored, as after sentiment_analysis.py) -
+and how many times longer each took than at the previous size. With the default sizes (each twice the last)
+a linear cost gives ratios of about 2. --max-ratio fails the run if any ratio is above it; times below
+--noise-floor-ms are treated as that floor, as they are mostly timer noise.
+
+    python -m benchmarks.bench_scaling --sizes 100000 200000 400000 800000
+    python -m benchmarks.bench_scaling --max-ratio 2.5 --output scaling.json
+'''
+import argparse
+import json
+import sys
+import time
+import numpy as np
+from analysis_summary import match_mask, score_matches
+from benchmarks.bench_pipeline import git_commit
+from keyword_index import build_keyword_index
+from relevance import row_relevance, title_statistics
+from synthetic_data import make_genre_reviews
+
+# 'story' is a common word in the synthetic reviews, so its postings are long
+KEYWORDS = ['adventure', 'funny', 'story']
+
+
+'''
+Best-of-repeat seconds of matching, and of matching + relevance + scoring, for a synthetic genre of n_rows.
+'''
+def request_times(n_rows, keywords, repeat=5):
+    reviews_df = make_genre_reviews(n_rows, seed=1)
+    reviews_df['sentiment'] = np.float32(0.5)
+    index = build_keyword_index(reviews_df)
+    stats = title_statistics(reviews_df['title'], index)
+    match_seconds, request_seconds = [], []
+    for _ in range(repeat):
+        # Start from an empty keyword cache so every repeat does the full lookup
+        index._term_cache.clear()
+        start = time.perf_counter()
+        mask = match_mask(reviews_df, keywords, index=index)
+        matched = time.perf_counter()
+        relevance = row_relevance(index, keywords, stats, np.flatnonzero(mask))
+        score_matches(reviews_df, mask, relevance=relevance)
+        match_seconds.append(matched - start)
+        request_seconds.append(time.perf_counter() - start)
+    return min(match_seconds), min(request_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50_000, 100_000, 200_000, 400_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-ratio', type=float, default=None,
+                        help='fail if a time grows by more than this between two consecutive sizes')
+    parser.add_argument('--noise-floor-ms', type=float, default=5.0)
+    parser.add_argument('--output', default=None, help='write the JSON here instead of printing it')
+    args = parser.parse_args()
+
+    floor = args.noise_floor_ms / 1000
+    report = {'commit': git_commit(), 'keywords': KEYWORDS, 'repeat': args.repeat, 'results': []}
+    previous = None
+    for size in sorted(args.sizes):
+        times = np.array(request_times(size, KEYWORDS, args.repeat))
+        result = {'rows': size, 'match_ms': round(float(times[0]) * 1000, 3),
+                  'request_ms': round(float(times[1]) * 1000, 3)}
+        if previous is not None:
+            ratios = np.maximum(times, floor) / np.maximum(previous, floor)
+            result['match_ratio'] = round(float(ratios[0]), 2)
+            result['request_ratio'] = round(float(ratios[1]), 2)
+        report['results'].append(result)
+        previous = times
+        print(f"Benchmarked {size} rows", file=sys.stderr, flush=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.max_ratio is not None:
+        worst = max((max(r['match_ratio'], r['request_ratio']) for r in report['results'][1:]), default=0)
+        assert worst <= args.max_ratio, f"time grew {worst}x between two sizes (limit {args.max_ratio}x)"
+
+
+if __name__ == "__main__":
+    main()
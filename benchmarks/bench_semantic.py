@@ -0,0 +1,79 @@
+'''
+Recall and latency of the semantic search IVF index against the exact search over the same vectors, on a
+synthetic genre so it runs without the private data. For each nprobe, recall@k is the share of the exact top
+k the approximate search also returns, averaged over queries taken from the genre's own reviews. Titles with
+the same reviews have the same vector, so a returned title counts if it scores as well as the exact k-th best
+(any of the tied titles is a correct answer).
+
+    python -m benchmarks.bench_semantic --rows 200000 --nprobe 1 4 16 64 --queries 200
+    python -m benchmarks.bench_semantic --rows 2000000 --components 128 --output semantic.json
+'''
+import argparse
+import json
+import time
+import numpy as np
+from benchmarks.bench_pipeline import git_commit, summarize
+from semantic_search import DEFAULT_COMPONENTS, build_semantic_index
+from synthetic_data import make_genre_reviews
+
+
+def timed_searches(search, queries):
+    results, times = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query)[1])
+        times.append(time.perf_counter() - start)
+    return results, times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--components', type=int, default=DEFAULT_COMPONENTS)
+    parser.add_argument('--lists', type=int, default=0, help='IVF clusters (default: sqrt of the title count)')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--output', help='write the JSON results to this file as well')
+    args = parser.parse_args()
+
+    reviews_df = make_genre_reviews(args.rows)
+    start = time.perf_counter()
+    index = build_semantic_index(reviews_df, n_components=args.components, n_lists=args.lists or None)
+    build_seconds = time.perf_counter() - start
+
+    texts = reviews_df['review_summary'].dropna().sample(args.queries, random_state=0).tolist()
+    queries = index.encode(texts)
+    exact, exact_times = timed_searches(lambda query: index.exact_search(query, args.k), queries)
+    # float16 vectors give float32 scores that can differ in the last bits between the two searches
+    thresholds = [scores[-1] - 1e-5 if len(scores) else np.inf for scores in exact]
+
+    runs = []
+    for nprobe in args.nprobe:
+        found, times = timed_searches(lambda query: index.search(query, args.k, nprobe), queries)
+        recall = [np.sum(scores >= threshold) / len(expected)
+                  for scores, threshold, expected in zip(found, thresholds, exact)]
+        runs.append({'nprobe': min(nprobe, index.n_lists), 'recall_at_k': round(float(np.mean(recall)), 4),
+                     **summarize(times)})
+
+    results = {
+        'git_commit': git_commit(),
+        'rows': args.rows,
+        'titles': len(index.titles),
+        'components': index.vectors.shape[1],
+        'lists': index.n_lists,
+        'k': args.k,
+        'queries': len(queries),
+        'build_seconds': round(build_seconds, 3),
+        'index_bytes': int(index.nbytes),
+        'exact': summarize(exact_times),
+        'ivf': runs,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
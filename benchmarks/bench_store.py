@@ -0,0 +1,63 @@
+'''
+Compares loading a genre from the CSV against loading it from the columnar store, on a synthetic genre
+file so it runs without the private data.
+
+    python -m benchmarks.bench_store --rows 2000000 --repeat 3
+'''
+import argparse
+import json
+import os
+import tempfile
+import time
+import pandas as pd
+from genre_store import REVIEW_COLUMNS, csv_path, load_genre_store, store_path, write_genre_store
+from synthetic_data import make_genre_reviews
+
+
+def folder_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    genre = 'fiction'
+    reviews_df = make_genre_reviews(args.rows, genre=genre)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        reviews_df.to_csv(csv_path(genre, data_dir), index=False)
+        write_genre_store(reviews_df, genre, data_dir)
+        del reviews_df
+
+        csv_seconds = best_time(lambda: pd.read_csv(csv_path(genre, data_dir), usecols=REVIEW_COLUMNS),
+                                args.repeat)
+        store_seconds = best_time(lambda: load_genre_store(genre, data_dir=data_dir), args.repeat)
+
+        results = {
+            'rows': args.rows,
+            'csv_seconds': round(csv_seconds, 4),
+            'store_seconds': round(store_seconds, 4),
+            'speedup': round(csv_seconds / store_seconds, 2),
+            'csv_bytes': folder_size(csv_path(genre, data_dir)),
+            'store_bytes': folder_size(store_path(genre, data_dir)),
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import os
+import pytest
+import genre_store
+from genre_store import available_genres
+from synthetic_data import write_genre_partitions
+
+'''
+Shared test setup. test_recommendations.py searches the genre files in Data/filtered_reviews/, which are not in
+the repository. When there are none, synthetic genre files (synthetic_data.write_genre_partitions) are written
+to a temporary folder and used instead, so the suite runs the same on a clean checkout. BOOKREC_TEST_ROWS sets
+the number of reviews per synthetic genre (default 20000).
+'''
+
+TEST_ROWS = int(os.environ.get('BOOKREC_TEST_ROWS', 20_000))
+
+
+@pytest.fixture(scope='session')
+def synthetic_data_dir(tmp_path_factory):
+    data_dir = str(tmp_path_factory.mktemp('filtered_reviews'))
+    write_genre_partitions(data_dir, n_rows=TEST_ROWS)
+    return data_dir
+
+
+@pytest.fixture(scope='session', autouse=True)
+def genre_data_dir(request):
+    if available_genres():
+        yield genre_store.filtered_dir
+        return
+    data_dir = request.getfixturevalue('synthetic_data_dir')
+    # BOOKREC_DATA_DIR as well, for the worker processes of multi-genre searches
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(genre_store, 'filtered_dir', data_dir)
+        monkeypatch.setenv('BOOKREC_DATA_DIR', data_dir)
+        yield data_dir
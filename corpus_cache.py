@@ -0,0 +1,176 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from genre_store import genre_fingerprint, load_genre_reviews
+from keyword_index import build_keyword_index, load_keyword_index
+from relevance import title_statistics
+from token_corpus import load_token_corpus
+
+# Memory budget for all cached genres together, in bytes. Set BOOKREC_CACHE_BYTES to change it
+# (e.g. BOOKREC_CACHE_BYTES=4000000000 for ~4GB).
+DEFAULT_CACHE_BYTES = 2 * 1024 ** 3
+
+
+'''
+Everything recommend_book needs for one genre once it has been loaded and preprocessed: the reviews
+DataFrame, the keyword index over its review text and the per-title statistics used for relevance.
+fingerprint is the genre_fingerprint of the files it was loaded from.
+'''
+class GenreCorpus:
+    def __init__(self, genre, reviews_df, index, fingerprint=None):
+        self.genre = genre
+        self.reviews_df = reviews_df
+        self.index = index
+        self.fingerprint = fingerprint
+        # Per-title word counts for relevance ranking, None if the index has no term statistics
+        self.title_stats = title_statistics(reviews_df['title'], index)
+        self.nbytes = corpus_size(reviews_df, index) + (self.title_stats.nbytes if self.title_stats else 0)
+
+
+'''
+Rough size in bytes of a loaded genre - the DataFrame including its strings, plus the index arrays and
+vocabulary. Used to keep the cache under its memory budget.
+'''
+def corpus_size(reviews_df, index):
+    size = int(reviews_df.memory_usage(deep=True).sum())
+    if index is not None:
+        size += index.postings_rows.nbytes + index.postings_offsets.nbytes
+        size += index.char_counts.nbytes + index.term_lengths.nbytes
+        if index.has_term_statistics:
+            size += index.postings_counts.nbytes + index.row_lengths.nbytes
+        size += sum(sys.getsizeof(term) for term in index.terms)
+    return size
+
+
+'''
+Loads a genre from disk and prepares it for matching. The prebuilt keyword index is used if it is up to
+date, otherwise one is built here from the genre's token corpus (or its text if there isn't one) - only
+once per genre while the genre stays cached.
+Returns None if there is no data for the genre.
+'''
+def load_corpus(genre):
+    fingerprint = genre_fingerprint(genre)
+    reviews_df = load_genre_reviews(genre)
+    if reviews_df is None:
+        return None
+    index = load_keyword_index(genre, n_rows=len(reviews_df))
+    if index is None:
+        index = build_keyword_index(reviews_df, token_corpus=load_token_corpus(genre, n_rows=len(reviews_df)))
+    return GenreCorpus(genre, reviews_df, index, fingerprint)
+
+
+'''
+Process-wide cache of loaded genres, shared by every Streamlit session in the same server process.
+Genres are evicted least-recently-used first once the total size goes over max_bytes. A genre that is
+bigger than the whole budget on its own is returned but not kept. A cached genre whose files have changed on
+disk since it was loaded (e.g. after Genre_filter.py --delta) is dropped and loaded again.
+'''
+class CorpusCache:
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, loader=load_corpus):
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # One lock per genre so two sessions asking for the same genre only load it once, while
+        # requests for other genres aren't held up behind a slow load.
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reloads = 0
+
+    def __contains__(self, genre):
+        with self._lock:
+            return genre in self._entries
+
+    def _is_stale(self, corpus):
+        fingerprint = getattr(corpus, 'fingerprint', None)
+        return fingerprint is not None and fingerprint != genre_fingerprint(corpus.genre)
+
+    def _drop(self, genre):
+        corpus = self._entries.pop(genre, None)
+        if corpus is not None:
+            self._bytes -= corpus.nbytes
+
+    def get(self, genre):
+        with self._lock:
+            cached = self._entries.get(genre)
+        if cached is not None and self._is_stale(cached):
+            with self._lock:
+                if self._entries.get(genre) is cached:
+                    self._drop(genre)
+                    self.reloads += 1
+
+        with self._lock:
+            if genre in self._entries:
+                self._entries.move_to_end(genre)
+                self.hits += 1
+                return self._entries[genre]
+            load_lock = self._load_locks.setdefault(genre, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                # Another session may have loaded it while we were waiting
+                if genre in self._entries:
+                    self._entries.move_to_end(genre)
+                    self.hits += 1
+                    return self._entries[genre]
+                self.misses += 1
+
+            corpus = self.loader(genre)
+            if corpus is not None:
+                self._put(genre, corpus)
+            return corpus
+
+    def _put(self, genre, corpus):
+        with self._lock:
+            if corpus.nbytes > self.max_bytes:
+                return
+            self._drop(genre)
+            self._entries[genre] = corpus
+            self._bytes += corpus.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    '''
+    Loads the given genres ahead of time (e.g. at app startup) so the first user doesn't pay for it.
+    '''
+    def warm(self, genres):
+        for genre in genres:
+            self.get(genre)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'reloads': self.reloads,
+                'genres': list(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+corpus_cache = CorpusCache(int(os.environ.get('BOOKREC_CACHE_BYTES', DEFAULT_CACHE_BYTES)))
+
+
+def get_corpus(genre):
+    return corpus_cache.get(genre)
+
+
+def warm_corpus(genres):
+    corpus_cache.warm(genres)
+
+
+def cache_stats():
+    return corpus_cache.stats()
@@ -0,0 +1,266 @@
+import json
+import os
+import re
+import shutil
+import numpy as np
+import pandas as pd
+
+base_path = os.path.abspath(os.path.dirname(__file__))
+# BOOKREC_DATA_DIR points everything at a different folder of genre files (also picked up by worker processes)
+filtered_dir = os.environ.get('BOOKREC_DATA_DIR') or os.path.join(base_path, 'Data', 'filtered_reviews')
+
+REVIEW_COLUMNS = ['title', 'categories', 'review_summary', 'review_score', 'publisher']
+# Precomputed VADER score per review, added by sentiment_analysis.score_genre (may be missing)
+SENTIMENT_COLUMN = 'sentiment'
+
+# Columns with few distinct values are stored as integer codes into a table of unique strings
+# (dictionary encoding); review_summary is mostly unique so it is stored as one block of text instead.
+DICTIONARY_COLUMNS = ['title', 'categories', 'publisher']
+TEXT_COLUMNS = ['review_summary']
+NUMERIC_COLUMNS = {'review_score': np.float32, SENTIMENT_COLUMN: np.float32}
+
+# Strings are joined with the ASCII unit separator so a whole column can be decoded with a single
+# bytes.decode() + str.split() instead of one Python call per row.
+SEPARATOR = '\x1f'
+# A separator inside a string is written as ESCAPE + 's' (and ESCAPE itself as ESCAPE + 'e'), so every string
+# round-trips; blocks without ESCAPE, i.e. nearly all of them, are still decoded with the single split.
+ESCAPE = '\x1b'
+_UNESCAPED = {'s': SEPARATOR, 'e': ESCAPE}
+_ESCAPE_PATTERN = re.compile(re.escape(ESCAPE) + '(.)', re.DOTALL)
+STORE_VERSION = 1
+
+
+def csv_path(genre, data_dir=None):
+    return os.path.join(data_dir or filtered_dir, f"{genre}_df.csv")
+
+
+def store_path(genre, data_dir=None):
+    return os.path.join(data_dir or filtered_dir, f"{genre}_store")
+
+
+def escape_string(value):
+    return value.replace(ESCAPE, ESCAPE + 'e').replace(SEPARATOR, ESCAPE + 's')
+
+
+def unescape_string(value):
+    return _ESCAPE_PATTERN.sub(lambda match: _UNESCAPED[match.group(1)], value)
+
+
+def join_strings(values):
+    return SEPARATOR.join(escape_string(value) for value in values).encode('utf-8')
+
+
+def write_strings(path, values):
+    with open(path, 'wb') as f:
+        f.write(join_strings(values))
+
+
+def read_strings(path, count):
+    if count == 0:
+        return []
+    with open(path, 'rb') as f:
+        text = f.read().decode('utf-8')
+    values = text.split(SEPARATOR)
+    if ESCAPE in text:
+        values = [unescape_string(value) if ESCAPE in value else value for value in values]
+    return values
+
+
+'''
+Writes a genre to the columnar store: a folder with one file per column plus meta.json. Dictionary columns
+become int32 codes (-1 for missing) and a table of unique values, review_score becomes float32, and
+review_summary is written as one separated block of text plus a missing-value mask.
+Rows are added with append, a chunk at a time, so a genre never has to be in memory all at once: text goes
+straight to its file, and only the codes and numbers (a few bytes per row) and the tables of distinct values
+are kept until close. The columns are those of the first chunk. The folder is written next to the old one and
+swapped in by close, so readers never see half a store.
+'''
+class GenreStoreWriter:
+    def __init__(self, genre, data_dir=None):
+        self.final_path = store_path(genre, data_dir)
+        self.tmp_path = self.final_path + '.tmp'
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+        self.columns = None
+        self.n_rows = 0
+        self._parts = {}
+        self._values = {}
+        self._text_files = {}
+
+    def append(self, reviews_df):
+        if self.columns is None:
+            self.columns = [c for c in reviews_df.columns if c in DICTIONARY_COLUMNS + TEXT_COLUMNS
+                            or c in NUMERIC_COLUMNS]
+            for column in self.columns:
+                self._parts[column] = []
+                if column in DICTIONARY_COLUMNS:
+                    self._values[column] = {}
+                elif column in TEXT_COLUMNS:
+                    self._text_files[column] = open(os.path.join(self.tmp_path, f"{column}_values.txt"), 'wb')
+
+        for column in self.columns:
+            values = reviews_df[column]
+            if column in DICTIONARY_COLUMNS:
+                codes, uniques = pd.factorize(values)
+                # Codes of this chunk's distinct values in the table for the whole genre, with -1 kept for missing
+                table = self._values[column]
+                mapping = np.fromiter((table.setdefault(str(v), len(table)) for v in uniques), dtype=np.int32,
+                                      count=len(uniques))
+                self._parts[column].append(np.append(mapping, np.int32(-1))[codes])
+            elif column in TEXT_COLUMNS:
+                self._parts[column].append(values.isna().to_numpy())
+                if len(values):
+                    text_file = self._text_files[column]
+                    if self.n_rows:
+                        text_file.write(SEPARATOR.encode('utf-8'))
+                    text_file.write(join_strings(values.fillna('').astype(str).tolist()))
+            else:
+                self._parts[column].append(values.to_numpy(dtype=NUMERIC_COLUMNS[column]))
+        self.n_rows += len(reviews_df)
+
+    def close(self):
+        for text_file in self._text_files.values():
+            text_file.close()
+        columns = self.columns or []
+        for column in columns:
+            values = np.concatenate(self._parts[column])
+            if column in DICTIONARY_COLUMNS:
+                np.save(os.path.join(self.tmp_path, f"{column}_codes.npy"), values)
+                write_strings(os.path.join(self.tmp_path, f"{column}_values.txt"), list(self._values[column]))
+            elif column in TEXT_COLUMNS:
+                np.save(os.path.join(self.tmp_path, f"{column}_na.npy"), values)
+            else:
+                np.save(os.path.join(self.tmp_path, f"{column}.npy"), values)
+
+        with open(os.path.join(self.tmp_path, 'meta.json'), 'w') as f:
+            json.dump({'version': STORE_VERSION, 'n_rows': self.n_rows, 'columns': columns}, f)
+
+        shutil.rmtree(self.final_path, ignore_errors=True)
+        os.rename(self.tmp_path, self.final_path)
+
+
+'''
+Writes a whole genre DataFrame to the columnar store (see GenreStoreWriter).
+'''
+def write_genre_store(reviews_df, genre, data_dir=None):
+    writer = GenreStoreWriter(genre, data_dir)
+    writer.append(reviews_df)
+    writer.close()
+
+
+'''
+Reads a genre back from the columnar store. The numeric and code arrays are memory-mapped; title is
+expanded back to strings, categories and publisher stay dictionary-encoded as pandas Categoricals.
+Returns None if there is no store for this genre.
+'''
+def load_genre_store(genre, columns=None, data_dir=None):
+    path = store_path(genre, data_dir)
+    meta_file = os.path.join(path, 'meta.json')
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file) as f:
+        meta = json.load(f)
+
+    n_rows = meta['n_rows']
+    data = {}
+    for column in meta['columns']:
+        if columns is not None and column not in columns:
+            continue
+        if column in DICTIONARY_COLUMNS:
+            codes = np.load(os.path.join(path, f"{column}_codes.npy"), mmap_mode='r')
+            uniques = read_strings(os.path.join(path, f"{column}_values.txt"), int(codes.max(initial=-1)) + 1)
+            if column == 'title':
+                table = np.array(uniques + [np.nan], dtype=object)
+                data[column] = table[codes]
+            else:
+                data[column] = pd.Categorical.from_codes(codes, categories=uniques)
+        elif column in TEXT_COLUMNS:
+            missing = np.load(os.path.join(path, f"{column}_na.npy"), mmap_mode='r')
+            values = np.array(read_strings(os.path.join(path, f"{column}_values.txt"), n_rows), dtype=object)
+            values[missing] = np.nan
+            data[column] = values
+        else:
+            data[column] = np.load(os.path.join(path, f"{column}.npy"), mmap_mode='r')
+
+    order = [c for c in (columns or meta['columns']) if c in data]
+    return pd.DataFrame({c: data[c] for c in order})
+
+
+'''
+Loads the reviews for a genre, from the columnar store if it has been built and from the CSV otherwise.
+The stored sentiment column is included when the genre has been scored. Returns None if neither exists.
+'''
+def load_genre_reviews(genre, columns=None, data_dir=None):
+    columns = columns or REVIEW_COLUMNS + [SENTIMENT_COLUMN]
+    reviews_df = load_genre_store(genre, columns=columns, data_dir=data_dir)
+    if reviews_df is not None:
+        return reviews_df
+
+    file_path = csv_path(genre, data_dir)
+    if not os.path.exists(file_path):
+        return None
+    reviews_df = pd.read_csv(file_path, usecols=lambda c: c in columns)
+    return reviews_df[[c for c in columns if c in reviews_df.columns]]
+
+
+'''
+The modification time and size of each of the files (None for files that don't exist), to tell whether any
+of them has been rewritten since.
+'''
+def files_fingerprint(paths):
+    fingerprint = []
+    for path in paths:
+        try:
+            info = os.stat(path)
+            fingerprint.append((info.st_mtime_ns, info.st_size))
+        except OSError:
+            fingerprint.append(None)
+    return tuple(fingerprint)
+
+
+'''
+Identifies the current version of a genre's files: the files_fingerprint of its CSV and of its columnar
+store's meta.json. Any rewrite or append changes it, so caches of anything derived from the genre compare
+fingerprints to notice when the data has changed.
+'''
+def genre_fingerprint(genre, data_dir=None):
+    return files_fingerprint([csv_path(genre, data_dir), os.path.join(store_path(genre, data_dir), 'meta.json')])
+
+
+'''
+Names of all genres that have data (a genre CSV or a columnar store), sorted.
+'''
+def available_genres(data_dir=None):
+    data_dir = data_dir or filtered_dir
+    if not os.path.isdir(data_dir):
+        return []
+    genres = set()
+    for filename in os.listdir(data_dir):
+        if filename.endswith('_df.csv'):
+            genres.add(filename[:-len('_df.csv')])
+        elif filename.endswith('_store') and os.path.exists(os.path.join(data_dir, filename, 'meta.json')):
+            genres.add(filename[:-len('_store')])
+    return sorted(genres)
+
+
+'''
+Converts every genre CSV in Data/filtered_reviews/ to the columnar store. Genre_filter.py writes the
+store itself for new runs; this is for CSVs that were generated before the store existed.
+'''
+def main():
+    if not os.path.isdir(filtered_dir):
+        print(f"Error: {filtered_dir} not found. Run Genre_filter.py first.")
+        return
+
+    for filename in sorted(os.listdir(filtered_dir)):
+        if not filename.endswith('_df.csv'):
+            continue
+        genre = filename[:-len('_df.csv')]
+        reviews_df = pd.read_csv(os.path.join(filtered_dir, filename),
+                                 usecols=lambda c: c in REVIEW_COLUMNS + [SENTIMENT_COLUMN])
+        write_genre_store(reviews_df, genre)
+        print(f"Saved {store_path(genre)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import cProfile
+import functools
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+import pandas as pd
+
+'''
+Opt-in timing of the recommendation pipeline. Each stage (loading, matching, sentiment, scoring, topics)
+is wrapped in `with stage(name):`, which records its wall time plus whatever counts the stage adds (rows
+processed, cache hits) into the report of the request being handled. When instrumentation is off, stage()
+does nothing beyond handing back a throwaway dict, so the normal path pays almost nothing.
+
+Turn it on with BOOKREC_INSTRUMENT=1 (or enable()). Each stage and each finished request is then logged as
+a one-line JSON record on the 'bookrec.timing' logger, and if BOOKREC_PROFILE_DIR is set every request is
+also run under cProfile and dumped there as a .prof file (open with snakeviz or pstats).
+'''
+
+logger = logging.getLogger('bookrec.timing')
+
+_enabled = os.environ.get('BOOKREC_INSTRUMENT', '') not in ('', '0')
+_profile_dir = os.environ.get('BOOKREC_PROFILE_DIR') or None
+_current_report = ContextVar('bookrec_timing_report', default=None)
+
+
+def enable(on=True, profile_dir=None):
+    global _enabled, _profile_dir
+    _enabled = on
+    if profile_dir is not None:
+        _profile_dir = profile_dir
+    if on:
+        logger.setLevel(logging.INFO)
+        if not logger.handlers and not logging.getLogger().handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+
+
+def is_enabled():
+    return _enabled
+
+
+if _enabled:
+    enable()
+
+
+'''
+The stages recorded for one request, in the order they finished.
+'''
+class TimingReport:
+    def __init__(self, label, **fields):
+        self.label = label
+        self.fields = fields
+        self.stages = []
+        self.total_seconds = None
+        self.profile_path = None
+
+    def as_frame(self):
+        return pd.DataFrame(self.stages)
+
+    def as_dict(self):
+        return {'request': self.label, **self.fields, 'total_seconds': self.total_seconds,
+                'stages': self.stages, 'profile': self.profile_path}
+
+
+'''
+Collects the timings of everything run inside it into one TimingReport and yields it. Nested calls share
+the outer report. Yields None when instrumentation is off.
+'''
+@contextmanager
+def collect(label, **fields):
+    report = _current_report.get()
+    if report is not None:
+        yield report
+        return
+    if not _enabled:
+        yield None
+        return
+
+    report = TimingReport(label, **fields)
+    token = _current_report.set(report)
+    profiler = cProfile.Profile() if _profile_dir else None
+    start = time.perf_counter()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        yield report
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(_profile_dir, exist_ok=True)
+            filename = f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{id(report)}.prof"
+            report.profile_path = os.path.join(_profile_dir, filename)
+            profiler.dump_stats(report.profile_path)
+        report.total_seconds = round(time.perf_counter() - start, 6)
+        _current_report.reset(token)
+        logger.info(json.dumps(report.as_dict(), default=str))
+
+
+'''
+Decorator version of collect() for a whole request function, e.g. recommend_book.
+'''
+def timed_request(label):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with collect(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+'''
+Times one pipeline stage. Yields a dict the stage can add counts to (e.g. info['rows'] = len(df)); the
+wall time is added when the block ends and the record is appended to the current report and logged.
+'''
+@contextmanager
+def stage(name, **fields):
+    info = dict(fields)
+    report = _current_report.get()
+    if report is None:
+        yield info
+        return
+
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        record = {'stage': name, 'seconds': round(time.perf_counter() - start, 6), **info}
+        report.stages.append(record)
+        logger.info(json.dumps({'request': report.label, **record}, default=str))
+
+
+'''
+Whether a report is being collected for the current request, i.e. whether work sent to another process should
+record its stages (see capture_stages).
+'''
+def is_collecting():
+    return _current_report.get() is not None
+
+
+'''
+Collects the stage records of work done in a worker process, where the report of the request being handled
+doesn't exist. Yields the list they are appended to, to be sent back with the result and added to that
+report with add_stages. Records nothing when capture is False.
+'''
+@contextmanager
+def capture_stages(capture):
+    if not capture:
+        yield []
+        return
+    report = TimingReport('worker')
+    token = _current_report.set(report)
+    try:
+        yield report.stages
+    finally:
+        _current_report.reset(token)
+
+
+'''
+Adds stage records sent back from a worker process (see capture_stages) to the current report, with the
+given fields added to each, and logs them like stage() does.
+'''
+def add_stages(records, **fields):
+    report = _current_report.get()
+    if report is None:
+        return
+    for record in records:
+        record = {**record, **fields}
+        report.stages.append(record)
+        logger.info(json.dumps({'request': report.label, **record}, default=str))
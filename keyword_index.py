@@ -0,0 +1,279 @@
+import os
+import pickle
+import numpy as np
+import pandas as pd
+import genre_store
+from token_corpus import build_token_corpus, load_token_corpus
+
+# Same threshold as has_keywords in analysis_summary.py - a review word counts as a match for a keyword
+# when fuzz.ratio(keyword, word) >= 80.
+FUZZY_THRESHOLD = 80
+
+# fuzz.ratio is round(100 * 2 * M / (len(a) + len(b))) where M is the number of matching characters, so a
+# score of 80 needs the unrounded ratio to be at least 0.795. M can never be more than the shorter word or
+# the characters the two words have in common, which lets us throw away most of the vocabulary before
+# calling fuzz.ratio. 0.79 leaves a little slack for floating point so we never drop a real match.
+MIN_RATIO = 0.79
+
+# Characters are counted in 37 buckets (a-z, 0-9 and everything else) for the shared-character bound.
+N_CHAR_BUCKETS = 37
+
+# fuzzywuzzy is only imported the first time a keyword isn't in the term cache, so importing this module (and
+# analysis_summary) doesn't pay for it
+
+
+'''
+Maps every character of every term to one of the N_CHAR_BUCKETS buckets and returns an array with a row
+of bucket counts per term. Used to bound how many characters a keyword can share with each term.
+'''
+def char_bucket_counts(terms):
+    counts = np.zeros((len(terms), N_CHAR_BUCKETS), dtype=np.int32)
+    if not terms:
+        return counts
+    lengths = np.fromiter((len(t) for t in terms), dtype=np.int64, count=len(terms))
+    codes = np.frombuffer(''.join(terms).encode('utf-32-le'), dtype=np.uint32)
+    buckets = np.full(len(codes), N_CHAR_BUCKETS - 1, dtype=np.int64)
+    letters = (codes >= ord('a')) & (codes <= ord('z'))
+    digits = (codes >= ord('0')) & (codes <= ord('9'))
+    buckets[letters] = codes[letters] - ord('a')
+    buckets[digits] = codes[digits] - ord('0') + 26
+    term_ids = np.repeat(np.arange(len(terms)), lengths)
+    np.add.at(counts, (term_ids, buckets), 1)
+    return counts
+
+
+'''
+np.unique for integer arrays. np.unique became hash based in NumPy 2.x and is many times slower than
+sorting for the large id arrays used here.
+'''
+def sorted_unique(values):
+    values = np.sort(values)
+    if len(values) == 0:
+        return values
+    return values[np.concatenate(([True], values[1:] != values[:-1]))]
+
+
+'''
+Vocabulary index over the review_summary column of one genre. Each unique review word has a postings list
+of the row numbers (positions in the genre DataFrame) whose review contains it. Looking up a keyword
+only runs fuzz.ratio against words that could possibly reach the threshold, instead of against every
+word of every review.
+
+It also keeps the term statistics relevance ranking needs (see relevance.py): postings_counts holds how many
+times the word occurs in each of those reviews, and row_lengths the number of words in every review. Indexes
+saved before these were added have None for both.
+'''
+class KeywordIndex:
+    def __init__(self, terms, postings_offsets, postings_rows, n_rows, postings_counts=None, row_lengths=None):
+        self.terms = terms
+        self.postings_offsets = postings_offsets
+        self.postings_rows = postings_rows
+        self.n_rows = n_rows
+        self.postings_counts = postings_counts
+        self.row_lengths = row_lengths
+        self.term_lengths = np.fromiter((len(t) for t in terms), dtype=np.int32, count=len(terms))
+        self.char_counts = char_bucket_counts(terms)
+        self._term_cache = {}
+
+    def __len__(self):
+        return len(self.terms)
+
+    '''
+    Returns the ids of the terms that could score >= FUZZY_THRESHOLD against the keyword, using the
+    length and shared-character bounds. Every real match is guaranteed to be in this list.
+    '''
+    def candidate_terms(self, keyword):
+        keyword = keyword.lower()
+        total = self.term_lengths + len(keyword)
+        shortest = np.minimum(self.term_lengths, len(keyword))
+        keep = 2 * shortest >= MIN_RATIO * total
+        if not keep.any():
+            return np.empty(0, dtype=np.int64)
+
+        keyword_counts = char_bucket_counts([keyword])[0]
+        candidates = np.flatnonzero(keep)
+        shared = np.minimum(self.char_counts[candidates], keyword_counts).sum(axis=1)
+        return candidates[2 * shared >= MIN_RATIO * total[candidates]]
+
+    '''
+    Returns the ids of the terms that has_keywords would treat as a match for the keyword, and their
+    fuzz.ratio scores against it.
+    '''
+    def term_scores(self, keyword):
+        keyword = keyword.lower()
+        if keyword not in self._term_cache:
+            from fuzzywuzzy import fuzz
+            candidates = self.candidate_terms(keyword)
+            ratios = np.fromiter((fuzz.ratio(keyword, self.terms[i]) for i in candidates), dtype=np.int64,
+                                 count=len(candidates))
+            matches = ratios >= FUZZY_THRESHOLD
+            self._term_cache[keyword] = (candidates[matches].astype(np.int64), ratios[matches])
+        return self._term_cache[keyword]
+
+    '''
+    Returns the ids of the terms that has_keywords would treat as a match for the keyword.
+    '''
+    def matching_terms(self, keyword):
+        return self.term_scores(keyword)[0]
+
+    @property
+    def has_term_statistics(self):
+        return self.postings_counts is not None and self.row_lengths is not None
+
+    '''
+    The postings of several terms at once: the rows of each term one after the other, and the position in
+    term_ids each row came from.
+    '''
+    def postings_of(self, term_ids):
+        starts = self.postings_offsets[term_ids]
+        lengths = self.postings_offsets[np.asarray(term_ids) + 1] - starts
+        total = int(lengths.sum())
+        owners = np.repeat(np.arange(len(term_ids)), lengths)
+        positions = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths) + starts[owners]
+        return positions, owners
+
+    '''
+    Returns the sorted row numbers whose review matches at least one keyword - the same rows for which
+    has_keywords(review_summary, keywords) is True.
+    '''
+    def matching_rows(self, keywords):
+        term_ids = [self.matching_terms(keyword) for keyword in keywords]
+        term_ids = np.concatenate(term_ids) if term_ids else np.empty(0, dtype=np.int64)
+        if len(term_ids) == 0:
+            return np.empty(0, dtype=np.int64)
+        rows = [self.postings_rows[self.postings_offsets[i]:self.postings_offsets[i + 1]] for i in term_ids]
+        return sorted_unique(np.concatenate(rows)).astype(np.int64)
+
+    def __getstate__(self):
+        # The character counts and length arrays are cheap to rebuild, so only the vocabulary and the
+        # postings are written to disk.
+        return {'terms': self.terms, 'postings_offsets': self.postings_offsets,
+                'postings_rows': self.postings_rows, 'n_rows': self.n_rows,
+                'postings_counts': self.postings_counts, 'row_lengths': self.row_lengths}
+
+    def __setstate__(self, state):
+        self.__init__(state['terms'], state['postings_offsets'], state['postings_rows'], state['n_rows'],
+                      state.get('postings_counts'), state.get('row_lengths'))
+
+
+def _postings_dict(index, first_row=0):
+    postings = {}
+    for i, term in enumerate(index.terms):
+        start, end = index.postings_offsets[i], index.postings_offsets[i + 1]
+        counts = None if index.postings_counts is None else index.postings_counts[start:end]
+        postings[term] = (index.postings_rows[start:end] + first_row, counts)
+    return postings
+
+
+def _from_postings(postings, n_rows, row_lengths=None):
+    # Terms stay in first-seen order, the order build_token_corpus gives them ids in
+    terms = list(postings)
+    lengths = np.fromiter((len(postings[t][0]) for t in terms), dtype=np.int64, count=len(terms))
+    postings_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=postings_offsets[1:])
+    postings_rows = np.empty(0, dtype=np.int32)
+    postings_counts = None if row_lengths is None else np.empty(0, dtype=np.int32)
+    if terms:
+        postings_rows = np.concatenate([np.asarray(postings[t][0], dtype=np.int32) for t in terms])
+        if row_lengths is not None:
+            postings_counts = np.concatenate([np.asarray(postings[t][1], dtype=np.int32) for t in terms])
+
+    return KeywordIndex(terms, postings_offsets, postings_rows, n_rows, postings_counts, row_lengths)
+
+
+'''
+Builds a KeywordIndex from a TokenCorpus (see token_corpus.py) without tokenizing again: the postings are
+the corpus' (word id, row) pairs, de-duplicated and sorted by word, so it is all array operations. How many
+times each pair occurs is kept as the term count.
+'''
+def index_from_token_corpus(corpus):
+    n_rows = max(corpus.n_rows, 1)
+    pairs = np.sort(np.asarray(corpus.ids, dtype=np.int64) * n_rows + corpus.token_rows())
+    starts = np.flatnonzero(np.concatenate(([True], pairs[1:] != pairs[:-1]))) if len(pairs) else pairs
+    postings_counts = np.diff(np.append(starts, len(pairs))).astype(np.int32)
+    pairs = pairs[starts]
+    term_ids = pairs // n_rows
+    postings_rows = (pairs % n_rows).astype(np.int32)
+    postings_offsets = np.zeros(len(corpus.vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_ids, minlength=len(corpus.vocab)), out=postings_offsets[1:])
+    row_lengths = np.diff(corpus.offsets).astype(np.int32)
+    return KeywordIndex(list(corpus.vocab), postings_offsets, postings_rows, corpus.n_rows, postings_counts,
+                        row_lengths)
+
+
+'''
+Builds a KeywordIndex from a genre DataFrame (or any DataFrame with a review_summary column), or from the
+genre's saved token corpus if one is passed in.
+'''
+def build_keyword_index(reviews_df, token_corpus=None):
+    if token_corpus is None:
+        token_corpus = build_token_corpus(reviews_df['review_summary'])
+    return index_from_token_corpus(token_corpus)
+
+
+'''
+Returns a new index covering the rows of `index` plus new_reviews_df appended after them, as when new
+reviews are appended to a genre file. Only the new rows are tokenized; existing postings are reused.
+'''
+def extend_keyword_index(index, new_reviews_df):
+    new_index = build_keyword_index(new_reviews_df)
+    postings = _postings_dict(index)
+    for term, (rows, counts) in _postings_dict(new_index, first_row=index.n_rows).items():
+        if term in postings:
+            old_rows, old_counts = postings[term]
+            rows = np.concatenate([old_rows, rows])
+            counts = None if old_counts is None else np.concatenate([old_counts, counts])
+        postings[term] = (rows, counts)
+    row_lengths = None
+    if index.has_term_statistics:
+        row_lengths = np.concatenate([index.row_lengths, new_index.row_lengths])
+    return _from_postings(postings, index.n_rows + len(new_reviews_df), row_lengths)
+
+
+def index_path(genre, data_dir=None):
+    return os.path.join(data_dir or genre_store.filtered_dir, f"{genre}_index.pkl")
+
+
+def save_keyword_index(index, genre, data_dir=None):
+    with open(index_path(genre, data_dir), 'wb') as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+'''
+Loads the prebuilt index for a genre. Returns None if it hasn't been built, or if it was built from a
+different version of the genre file (row count differs) so the caller can fall back to scanning.
+'''
+def load_keyword_index(genre, n_rows=None, data_dir=None):
+    path = index_path(genre, data_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        index = pickle.load(f)
+    if n_rows is not None and index.n_rows != n_rows:
+        print(f"Keyword index for '{genre}' is out of date - falling back to a full scan.")
+        return None
+    return index
+
+
+'''
+Builds and saves the keyword index for every genre file in Data/filtered_reviews/.
+Run this after Genre_filter.py.
+'''
+def main():
+    filtered_dir = genre_store.filtered_dir
+    if not os.path.isdir(filtered_dir):
+        print(f"Error: {filtered_dir} not found. Run Genre_filter.py first.")
+        return
+
+    for filename in sorted(os.listdir(filtered_dir)):
+        if not filename.endswith('_df.csv'):
+            continue
+        genre = filename[:-len('_df.csv')]
+        reviews_df = pd.read_csv(os.path.join(filtered_dir, filename), usecols=['review_summary'])
+        index = build_keyword_index(reviews_df, token_corpus=load_token_corpus(genre, n_rows=len(reviews_df)))
+        save_keyword_index(index, genre)
+        print(f"Indexed {genre}: {len(index)} unique words over {index.n_rows} reviews")
+
+
+if __name__ == "__main__":
+    main()
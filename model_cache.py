@@ -0,0 +1,44 @@
+import threading
+from collections import OrderedDict
+from genre_store import files_fingerprint
+
+
+'''
+Process-wide cache of per-genre models loaded from saved files (the similarity model, the topic model and the
+semantic index), so a model is only read from disk once. loader(genre) loads a genre's saved model, or returns
+None if there isn't one; paths(genre) lists the files it is loaded from. Each entry remembers the
+files_fingerprint of those files and is loaded again once they change (e.g. after Genre_filter.py --delta or
+a rebuild retrains the model). None is never cached, so a model saved later is picked up straight away.
+Genres are evicted least-recently-used first once more than maxsize are cached.
+'''
+class ModelCache:
+    def __init__(self, loader, paths, maxsize=8):
+        self.loader = loader
+        self.paths = paths
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def fingerprint(self, genre):
+        return files_fingerprint(self.paths(genre))
+
+    def get(self, genre):
+        fingerprint = self.fingerprint(genre)
+        with self._lock:
+            entry = self._entries.get(genre)
+            if entry is not None and entry[0] == fingerprint:
+                self._entries.move_to_end(genre)
+                return entry[1]
+            self._entries.pop(genre, None)
+
+        model = self.loader(genre)
+        if model is not None:
+            with self._lock:
+                self._entries[genre] = (fingerprint, model)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return model
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,71 @@
+import argparse
+import os
+
+'''
+Finds the NLTK data this project needs without going to the network. Nothing is downloaded at import time
+any more (that stalled or failed on machines without internet access); instead the data is looked up in a
+local folder that is put at the front of NLTK's search path:
+
+    BOOKREC_NLTK_DATA   if set, otherwise
+    nltk_data/          next to this file (fill it once with `python nltk_resources.py`)
+
+followed by NLTK's usual locations (~/nltk_data, /usr/share/nltk_data, ...). A missing resource raises a
+LookupError saying how to bundle it, instead of attempting a download.
+'''
+
+base_path = os.path.abspath(os.path.dirname(__file__))
+local_nltk_dir = os.environ.get('BOOKREC_NLTK_DATA') or os.path.join(base_path, 'nltk_data')
+
+# Resource name -> path inside nltk_data, as passed to nltk.data.find
+RESOURCES = {
+    'vader_lexicon': 'sentiment/vader_lexicon.zip',
+    'stopwords': 'corpora/stopwords',
+    'punkt': 'tokenizers/punkt',
+    'punkt_tab': 'tokenizers/punkt_tab',
+}
+
+_path_added = False
+
+
+def _add_local_path():
+    global _path_added
+    import nltk
+    if not _path_added:
+        if local_nltk_dir not in nltk.data.path:
+            nltk.data.path.insert(0, local_nltk_dir)
+        _path_added = True
+    return nltk
+
+
+'''
+Makes sure an NLTK resource (a key of RESOURCES) is available locally and returns the nltk module.
+Raises LookupError if it isn't - never downloads.
+'''
+def require(resource):
+    nltk = _add_local_path()
+    try:
+        nltk.data.find(RESOURCES[resource])
+    except LookupError:
+        raise LookupError(f"NLTK resource '{resource}' not found in {local_nltk_dir} or NLTK's default paths. "
+                          f"Run 'python nltk_resources.py' once on a machine with internet access and copy "
+                          f"the nltk_data folder across (or point BOOKREC_NLTK_DATA at one).") from None
+    return nltk
+
+
+'''
+Downloads the resources into the local folder. This is the only place that talks to the network, and is
+run by hand when setting up a machine (or when building an image for offline workers).
+'''
+def main():
+    parser = argparse.ArgumentParser(description='Download the NLTK data used by the project into a local folder.')
+    parser.add_argument('resources', nargs='*', default=list(RESOURCES))
+    parser.add_argument('--dir', default=local_nltk_dir)
+    args = parser.parse_args()
+
+    import nltk
+    for resource in args.resources:
+        nltk.download(resource, download_dir=args.dir)
+
+
+if __name__ == "__main__":
+    main()
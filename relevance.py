@@ -0,0 +1,166 @@
+import os
+import numpy as np
+import pandas as pd
+from keyword_index import sorted_unique
+
+'''
+Relevance ranking. A title's relevance to the keywords is a BM25 score over all of its reviews taken together
+as one document, where a review word counts towards a keyword in proportion to how well it fuzzy-matches
+it (fuzz.ratio / 100, so an exact match counts 1 and a borderline match 0.8):
+
+    relevance(title) = sum over keywords q of  idf(q) * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_length))
+
+tf is the fuzzy-weighted number of times q occurs in the title's reviews, length the number of words in
+them, and idf(q) = ln(1 + (n_titles - df + 0.5) / (df + 0.5)) with df the number of titles that contain q.
+Everything comes from the keyword index's postings (which rows contain which word, and how often) and the
+per-title word counts worked out when the genre is loaded, so only the postings of the matched words are
+touched - the cost grows with the number of matches, not the size of the genre.
+
+The final score of a review blends the title's relevance with its star rating and sentiment:
+
+    total_score = w_relevance * 5 * r / (r + RELEVANCE_PIVOT) + w_rating * review_score + w_sentiment * sentiment
+
+so the relevance part is on the same 0-5 scale as the rating. Weights come from BOOKREC_RANKING_WEIGHTS
+(e.g. "relevance=0.5,rating=0.25,sentiment=0.25") or the weights argument of recommend_book. When relevance
+isn't available (an index saved before term statistics were added) the other two weights are rescaled to
+add up to one, which for the default weights is the original (review_score + sentiment) / 2.
+'''
+
+K1 = 1.2
+B = 0.75
+# Relevance at which the relevance part of the score is half of its maximum (2.5 out of 5)
+RELEVANCE_PIVOT = 2.0
+
+WEIGHT_NAMES = ('relevance', 'rating', 'sentiment')
+DEFAULT_WEIGHTS = {'relevance': 0.4, 'rating': 0.3, 'sentiment': 0.3}
+
+
+'''
+Parses "relevance=0.5,rating=0.3,sentiment=0.2" into a weights dict; names that are left out keep their
+default weight.
+'''
+def parse_weights(text):
+    weights = dict(DEFAULT_WEIGHTS)
+    for part in filter(None, (part.strip() for part in text.split(','))):
+        name, _, value = part.partition('=')
+        name = name.strip()
+        if name not in WEIGHT_NAMES:
+            raise ValueError(f"Unknown ranking weight '{name}', expected one of {WEIGHT_NAMES}")
+        weights[name] = float(value)
+    return weights
+
+
+RANKING_WEIGHTS = parse_weights(os.environ.get('BOOKREC_RANKING_WEIGHTS', ''))
+
+
+'''
+The configured weights with any given in weights (which may leave names out) taking their place.
+'''
+def resolve_weights(weights=None):
+    return {**RANKING_WEIGHTS, **(weights or {})}
+
+
+'''
+Per-title word counts for one genre: title_codes gives every review's title number (-1 for a missing
+title), and title_lengths the total number of words in each title's reviews.
+'''
+class TitleStatistics:
+    def __init__(self, title_codes, title_lengths):
+        self.title_codes = title_codes
+        self.title_lengths = title_lengths
+        self.avg_length = float(title_lengths.mean()) if len(title_lengths) else 0.0
+
+    @property
+    def n_titles(self):
+        return len(self.title_lengths)
+
+    @property
+    def nbytes(self):
+        return self.title_codes.nbytes + self.title_lengths.nbytes
+
+
+'''
+Works out the TitleStatistics of a genre from its titles and the keyword index's row lengths. Returns None
+if the index has no term statistics.
+'''
+def title_statistics(titles, index):
+    if index is None or not index.has_term_statistics:
+        return None
+    title_codes, uniques = pd.factorize(pd.Series(titles))
+    title_codes = title_codes.astype(np.int32)
+    has_title = title_codes >= 0
+    title_lengths = np.bincount(title_codes[has_title], weights=np.asarray(index.row_lengths)[has_title],
+                                minlength=len(uniques))
+    return TitleStatistics(title_codes, title_lengths)
+
+
+def _sum_by(keys, values):
+    unique_keys = sorted_unique(keys)
+    return unique_keys, np.bincount(np.searchsorted(unique_keys, keys), weights=values,
+                                    minlength=len(unique_keys))
+
+
+'''
+BM25 relevance of every title that matches at least one keyword. Returns (title numbers, scores), sorted by
+title number; titles that aren't listed have relevance 0.
+'''
+def title_relevance(index, keywords, stats):
+    titles, scores = [], []
+    for keyword in dict.fromkeys(keyword.lower() for keyword in keywords):
+        term_ids, ratios = index.term_scores(keyword)
+        if len(term_ids) == 0:
+            continue
+        positions, owners = index.postings_of(term_ids)
+        rows = index.postings_rows[positions]
+        weighted_counts = index.postings_counts[positions] * (ratios[owners] / 100)
+
+        codes = stats.title_codes[rows]
+        has_title = codes >= 0
+        keyword_titles, tf = _sum_by(codes[has_title], weighted_counts[has_title])
+
+        df = len(keyword_titles)
+        idf = np.log(1 + (stats.n_titles - df + 0.5) / (df + 0.5))
+        length_norm = 1 - B + B * stats.title_lengths[keyword_titles] / max(stats.avg_length, 1e-9)
+        titles.append(keyword_titles)
+        scores.append(idf * tf * (K1 + 1) / (tf + K1 * length_norm))
+
+    if not titles:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    return _sum_by(np.concatenate(titles), np.concatenate(scores))
+
+
+'''
+Relevance of the reviews at the given rows (e.g. np.flatnonzero(match_mask(...))): each review gets its
+title's relevance. Returns None if the statistics aren't available.
+'''
+def row_relevance(index, keywords, stats, rows):
+    if stats is None or index is None or not index.has_term_statistics:
+        return None
+    titles, scores = title_relevance(index, keywords, stats)
+    relevance = np.zeros(len(rows))
+    if len(titles):
+        codes = stats.title_codes[rows]
+        positions = np.minimum(np.searchsorted(titles, codes), len(titles) - 1)
+        found = titles[positions] == codes
+        relevance[found] = scores[positions[found]]
+    return relevance
+
+
+'''
+Combines star rating, sentiment and relevance (any of them arrays or Series of the same length) into the
+total score, see the top of this file. relevance may be None; weights may leave out names to use the
+configured weight for them. Semantic search (see semantic_search.py) passes the cosine similarity of the
+title to the keywords as similarity instead of relevance; it is already between 0 and 1, so 5 * similarity
+is used as the relevance part.
+'''
+def blend_scores(review_score, sentiment, relevance=None, weights=None, similarity=None):
+    weights = resolve_weights(weights)
+    if similarity is not None:
+        relevance_part = 5 * np.clip(similarity, 0, 1)
+    elif relevance is not None:
+        relevance_part = 5 * relevance / (relevance + RELEVANCE_PIVOT)
+    else:
+        rest = weights['rating'] + weights['sentiment']
+        return (weights['rating'] * review_score + weights['sentiment'] * sentiment) / rest
+    return (weights['relevance'] * relevance_part + weights['rating'] * review_score
+            + weights['sentiment'] * sentiment)
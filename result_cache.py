@@ -0,0 +1,233 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+import genre_store
+from genre_store import genre_fingerprint
+from semantic_search import semantic_index_cache
+from similar_books import similarity_model_cache
+from topic_modeling import topic_mode, topic_model_cache
+
+'''
+Cache of finished recommend_book results, so popular queries ("fiction adventure", "humor funny") are
+answered without matching, scoring and topic modelling again.
+
+Results are keyed on the genres, the normalised keywords (see analysis_summary.normalize_keywords), k and the
+scoring policy, and stored together with the fingerprints of every genre involved: its genre store plus its
+saved topic model, similarity model and semantic index. An entry is only used while it is younger than the
+TTL and every fingerprint still matches the files on disk, so a rebuilt or appended genre (Genre_filter.py,
+--delta) or a retrained model is never answered from an old result. The memory tier holds at most
+max_entries results, least recently used dropped first. If a directory is given, results are also pickled
+there so they survive an app restart; the disk tier follows the same TTL and fingerprint rules and keeps at
+most max_disk_entries files. The files are counted once and the count kept up to date as entries are written
+and removed, so the folder is only listed again when the count goes over the limit; the oldest files are
+then removed until DISK_PRUNE_TO of the limit is left.
+
+    BOOKREC_RESULT_CACHE_SIZE   results kept in memory (default 512, 0 turns the cache off)
+    BOOKREC_RESULT_CACHE_TTL    seconds a result stays valid (default 3600)
+    BOOKREC_RESULT_CACHE_DIR    folder for the on-disk tier (off unless set)
+'''
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_MAX_DISK_ENTRIES = 10_000
+DISK_PRUNE_TO = 0.9
+
+
+class ResultCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS, cache_dir=None,
+                 max_disk_entries=DEFAULT_MAX_DISK_ENTRIES, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Number of result files in cache_dir, counted on the first write (see _write_disk)
+        self._disk_count = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidated = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.pkl")
+
+    def _read_disk(self, key):
+        try:
+            with open(self._disk_path(key), 'rb') as f:
+                stored_key, entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+        # Guards against (very unlikely) file name collisions
+        return entry if stored_key == key else None
+
+    def _write_disk(self, key, entry):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        replaced = os.path.exists(path)
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((key, entry), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        if self._disk_count is None:
+            self._disk_count = len(self._disk_files())
+        elif not replaced:
+            self._disk_count += 1
+        if self._disk_count > self.max_disk_entries:
+            self._prune_disk()
+
+    def _remove_disk(self, key):
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            return
+        if self._disk_count is not None:
+            self._disk_count -= 1
+
+    def _disk_files(self):
+        return [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                if name.endswith('.pkl')]
+
+    '''
+    Removes the oldest result files until DISK_PRUNE_TO of max_disk_entries are left. Only called once the
+    running count goes over the limit; the count is reset from the listing, which also picks up files
+    written or removed by other processes sharing the folder.
+    '''
+    def _prune_disk(self):
+        files = self._disk_files()
+        keep = int(self.max_disk_entries * DISK_PRUNE_TO)
+        if len(files) > keep:
+            files.sort(key=lambda path: os.stat(path).st_mtime_ns)
+            for path in files[:len(files) - keep]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            files = files[len(files) - keep:]
+        self._disk_count = len(files)
+
+    '''
+    Checks a cached (created, fingerprints, value) entry. Returns None if it's still valid, otherwise the
+    name of the counter to bump.
+    '''
+    def _why_invalid(self, entry, fingerprints):
+        created, stored_fingerprints, _ = entry
+        if self.clock() - created > self.ttl:
+            return 'expired'
+        if stored_fingerprints != fingerprints:
+            return 'invalidated'
+        return None
+
+    '''
+    Returns the cached value for key, or None if there is none or it is stale. fingerprints are the
+    current fingerprints of the genres (see fingerprints()) the entry must have been computed from.
+    '''
+    def get(self, key, fingerprints):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            from_disk = False
+            if entry is None and self.cache_dir:
+                entry = self._read_disk(key)
+                from_disk = entry is not None
+
+            if entry is not None:
+                reason = self._why_invalid(entry, fingerprints)
+                if reason is None:
+                    self.hits += 1
+                    self.disk_hits += from_disk
+                    self._entries[key] = entry
+                    self._entries.move_to_end(key)
+                    self._evict()
+                    return entry[2]
+                setattr(self, reason, getattr(self, reason) + 1)
+                self._entries.pop(key, None)
+                if self.cache_dir:
+                    self._remove_disk(key)
+
+            self.misses += 1
+            return None
+
+    def put(self, key, fingerprints, value):
+        if not self.enabled:
+            return
+        entry = (self.clock(), fingerprints, value)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._evict()
+            if self.cache_dir:
+                self._write_disk(key, entry)
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.cache_dir:
+                for path in self._disk_files():
+                    os.remove(path)
+                self._disk_count = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'invalidated': self.invalidated,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'cache_dir': self.cache_dir,
+            }
+
+
+'''
+Cache key for a recommend_book call. The data folder is part of it, so results for a different
+BOOKREC_DATA_DIR are never mixed up, and so are the ranking weights if given, the search mode and the
+topic mode (BOOKREC_TOPIC_MODE), which decides whether the saved topic model is used.
+'''
+def result_key(genres, keywords, k, policy, weights=None, mode='keyword'):
+    weights = tuple(sorted(weights.items())) if weights else None
+    return (genre_store.filtered_dir, tuple(genres), tuple(keywords), k, policy, weights, mode, topic_mode())
+
+
+'''
+What a cached result of the genres was computed from: for each genre, the fingerprints of its genre store
+and of its saved topic model, similarity model and semantic index (missing files included, so building one
+invalidates the results computed without it).
+'''
+def fingerprints(genres):
+    return tuple((genre_fingerprint(genre), topic_model_cache.fingerprint(genre),
+                  similarity_model_cache.fingerprint(genre), semantic_index_cache.fingerprint(genre))
+                 for genre in genres)
+
+
+result_cache = ResultCache(
+    max_entries=int(os.environ.get('BOOKREC_RESULT_CACHE_SIZE', DEFAULT_MAX_ENTRIES)),
+    ttl=float(os.environ.get('BOOKREC_RESULT_CACHE_TTL', DEFAULT_TTL_SECONDS)),
+    cache_dir=os.environ.get('BOOKREC_RESULT_CACHE_DIR') or None,
+)
+
+
+def result_cache_stats():
+    return result_cache.stats()
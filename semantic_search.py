@@ -0,0 +1,225 @@
+import argparse
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import genre_store
+from genre_store import available_genres, load_genre_reviews
+from model_cache import ModelCache
+from similar_books import build_similarity_model, top_k
+from token_corpus import get_token_corpus
+
+# Size of the dense title vectors
+DEFAULT_COMPONENTS = 128
+# Inverted lists probed per query: more finds more of the exact nearest titles, fewer answers faster. Every list
+# probed gives the exact search. BOOKREC_SEMANTIC_NPROBE changes the default.
+DEFAULT_NPROBE = int(os.environ.get('BOOKREC_SEMANTIC_NPROBE', 16))
+# Rows scored at a time when scanning vectors, so a float32 copy of a whole memory-mapped array is never made
+SCAN_BLOCK_ROWS = 65536
+# The files of a saved index in its {genre}_semantic folder
+INDEX_FILES = ['vectorizer.joblib', 'components.npy', 'vectors.npy', 'centroids.npy', 'list_offsets.npy',
+               'list_ids.npy']
+
+# scikit-learn and joblib are imported where they are used, see topic_modeling.py
+
+'''
+Semantic ("meaning") search over a genre's titles, so a search for "scary" also finds books whose reviews
+only say "terrifying". Each title gets a dense vector from latent semantic analysis: the per-title TF-IDF
+rows of similar_books.py projected onto their top singular vectors (TruncatedSVD), where words that are used
+in the same reviews end up close together. Vectors are L2-normalised so the dot product is the cosine
+similarity, and stored as float16 to halve their size; saved indexes memory-map them.
+
+Scoring every title for every query gets slow for big genres, so the vectors are grouped into n_lists
+clusters (an IVF, inverted file index, with the centres from MiniBatchKMeans) and stored cluster by cluster.
+A query is only compared with the nprobe clusters whose centres are closest to it, which finds nearly all of
+the exact nearest titles while reading a small part of the vectors.
+'''
+class SemanticIndex:
+    def __init__(self, titles, vectorizer, components, vectors, centroids, list_offsets, list_ids):
+        self.titles = np.asarray(titles, dtype=object)
+        self.vectorizer = vectorizer
+        self.components = components
+        # vectors[list_offsets[i]:list_offsets[i + 1]] are the vectors of cluster i; list_ids gives the title
+        # number of every row of vectors
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @property
+    def nbytes(self):
+        return self.vectors.nbytes + self.centroids.nbytes + self.list_ids.nbytes + self.components.nbytes
+
+    '''
+    Turns texts into unit-length vectors in the same space as the titles (all zero if no known word is used).
+    '''
+    def encode(self, texts):
+        return normalize_rows(np.asarray(self.vectorizer.transform(texts) @ self.components.T, dtype=np.float32))
+
+    def _scan(self, start, stop, query):
+        scores = np.empty(stop - start, dtype=np.float32)
+        for block_start in range(start, stop, SCAN_BLOCK_ROWS):
+            block_stop = min(block_start + SCAN_BLOCK_ROWS, stop)
+            scores[block_start - start:block_stop - start] = \
+                np.asarray(self.vectors[block_start:block_stop], dtype=np.float32) @ query
+        return scores
+
+    '''
+    Approximate top k: the title numbers and cosine similarities of the k titles closest to the query vector
+    among the nprobe closest clusters, best first.
+    '''
+    def search(self, query, k=10, nprobe=None):
+        nprobe = min(nprobe or DEFAULT_NPROBE, self.n_lists)
+        lists, _ = top_k(self.centroids @ query, nprobe)
+        lists = np.sort(lists)
+        starts, stops = self.list_offsets[lists], self.list_offsets[lists + 1]
+        scores = np.concatenate([self._scan(start, stop, query) for start, stop in zip(starts, stops)])
+        positions = np.concatenate([np.arange(start, stop) for start, stop in zip(starts, stops)])
+        best, scores = top_k(scores, k)
+        return np.asarray(self.list_ids[positions[best]], dtype=np.int64), scores
+
+    '''
+    Exact top k by comparing the query with every title, for checking the recall of search.
+    '''
+    def exact_search(self, query, k=10):
+        best, scores = top_k(self._scan(0, len(self.vectors), query), k)
+        return np.asarray(self.list_ids[best], dtype=np.int64), scores
+
+    '''
+    Returns a DataFrame of up to k titles whose reviews are closest in meaning to the text, best first, with
+    their cosine similarity. Titles with no similarity at all are left out.
+    '''
+    def similar_to_text(self, text, k=10, nprobe=None):
+        ids, scores = self.search(self.encode([text])[0], k, nprobe)
+        keep = scores > 0
+        return pd.DataFrame({'title': self.titles[ids[keep]], 'similarity': scores[keep]})
+
+
+def normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+'''
+Assigns every vector to the centre it has the largest dot product with - the same measure search uses to
+pick the clusters to probe.
+'''
+def assign_lists(vectors, centroids):
+    return np.concatenate([np.argmax(vectors[start:start + SCAN_BLOCK_ROWS] @ centroids.T, axis=1)
+                           for start in range(0, len(vectors), SCAN_BLOCK_ROWS)])
+
+
+'''
+Builds the SemanticIndex of a genre: per-title TF-IDF (see similar_books.build_similarity_model, which uses the
+genre's token corpus if passed in), TruncatedSVD down to n_components dimensions, and MiniBatchKMeans into
+n_lists clusters (about the square root of the number of titles by default).
+'''
+def build_semantic_index(reviews_df, n_components=DEFAULT_COMPONENTS, n_lists=None, max_features=50000,
+                         token_corpus=None, seed=0):
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.decomposition import TruncatedSVD
+    model = build_similarity_model(reviews_df, max_features=max_features, token_corpus=token_corpus)
+    n_titles, n_features = model.matrix.shape
+    n_components = max(1, min(n_components, n_features - 1, n_titles - 1))
+    svd = TruncatedSVD(n_components=n_components, random_state=seed).fit(model.matrix)
+    components = svd.components_.astype(np.float32)
+    vectors = normalize_rows(np.asarray(model.matrix @ components.T, dtype=np.float32))
+
+    n_lists = max(1, min(n_lists or int(round(np.sqrt(n_titles))), n_titles))
+    kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, n_init=3, batch_size=4096).fit(vectors)
+    centroids = normalize_rows(kmeans.cluster_centers_.astype(np.float32))
+    labels = assign_lists(vectors, centroids)
+
+    order = np.argsort(labels, kind='stable')
+    list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+    np.cumsum(np.bincount(labels, minlength=n_lists), out=list_offsets[1:])
+    return SemanticIndex(model.titles, model.vectorizer, components, vectors[order].astype(np.float16), centroids,
+                         list_offsets, order.astype(np.int32))
+
+
+def index_path(genre, data_dir=None):
+    return os.path.join(data_dir or genre_store.filtered_dir, f"{genre}_semantic")
+
+
+def index_files(genre, data_dir=None):
+    return [os.path.join(index_path(genre, data_dir), name) for name in INDEX_FILES]
+
+
+def semantic_index_built(genre, data_dir=None):
+    return os.path.exists(os.path.join(index_path(genre, data_dir), 'vectorizer.joblib'))
+
+
+'''
+Saves the vectorizer and titles with joblib and the arrays as .npy files in a {genre}_semantic folder, written
+to a temporary folder that then replaces the old one so the titles and arrays of two indexes are never mixed.
+'''
+def save_semantic_index(index, genre, data_dir=None):
+    import joblib
+    final_path = index_path(genre, data_dir)
+    tmp_path = final_path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    joblib.dump({'titles': index.titles, 'vectorizer': index.vectorizer}, os.path.join(tmp_path, 'vectorizer.joblib'))
+    for name in ['components', 'vectors', 'centroids', 'list_offsets', 'list_ids']:
+        np.save(os.path.join(tmp_path, f"{name}.npy"), getattr(index, name))
+    shutil.rmtree(final_path, ignore_errors=True)
+    os.rename(tmp_path, final_path)
+
+
+'''
+Loads a saved index, with the title vectors and their title numbers memory-mapped. Returns None if there is none.
+'''
+def load_semantic_index(genre, data_dir=None):
+    path = index_path(genre, data_dir)
+    if not semantic_index_built(genre, data_dir):
+        return None
+    import joblib
+    saved = joblib.load(os.path.join(path, 'vectorizer.joblib'))
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+              for name, mmap_mode in [('components', None), ('vectors', 'r'), ('centroids', None),
+                                      ('list_offsets', None), ('list_ids', 'r')]}
+    return SemanticIndex(saved['titles'], saved['vectorizer'], **arrays)
+
+
+semantic_index_cache = ModelCache(load_semantic_index, index_files)
+
+'''
+Returns the saved semantic index for a genre, kept in memory after the first call and loaded again when the
+saved files change (see model_cache.py). Returns None if no index has been saved for the genre - building
+one takes far too long to do while serving a request, so run this file to build it.
+'''
+def get_semantic_index(genre):
+    return semantic_index_cache.get(genre)
+
+
+'''
+Builds and saves the semantic index of the given genres (every genre in Data/filtered_reviews/ if none are
+given).  e.g.  python semantic_search.py fiction --components 128 --lists 1000
+'''
+def main():
+    parser = argparse.ArgumentParser(description='Build the semantic search indexes.')
+    parser.add_argument('genres', nargs='*')
+    parser.add_argument('--components', type=int, default=DEFAULT_COMPONENTS, help='size of the title vectors')
+    parser.add_argument('--lists', type=int, default=0, help='IVF clusters (default: sqrt of the title count)')
+    args = parser.parse_args()
+
+    genres = args.genres or available_genres()
+
+    for genre in genres:
+        reviews_df = load_genre_reviews(genre, columns=['title', 'review_summary'])
+        if reviews_df is None:
+            print(f"No data found for genre: '{genre}' — skipping.")
+            continue
+        index = build_semantic_index(reviews_df, n_components=args.components, n_lists=args.lists or None,
+                                     token_corpus=get_token_corpus(reviews_df, genre))
+        save_semantic_index(index, genre)
+        print(f"Saved {index_path(genre)} ({len(index.titles)} titles, {index.n_lists} lists, "
+              f"{index.nbytes / 1024 ** 2:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,25 @@
+import argparse
+import os
+from contextlib import contextmanager
+from multiprocessing import Pool
+import numpy as np
 import pandas as pd
-from nltk.sentiment import SentimentIntensityAnalyzer
-import nltk
+import genre_store
+import nltk_resources
+from instrumentation import stage
 
-# Download vader lexicon which analyses the sentiment of the text and creates an instance of an nltk class which uses vader
-nltk.download('vader_lexicon', quiet=True)
-sia = SentimentIntensityAnalyzer()
+# The VADER analyzer (an nltk class using the vader lexicon) is created on first use rather than at import,
+# and the lexicon is read from the local NLTK data folder instead of being downloaded (see nltk_resources.py)
+_sia = None
+
+
+def get_analyzer():
+    global _sia
+    if _sia is None:
+        nltk_resources.require('vader_lexicon')
+        from nltk.sentiment import SentimentIntensityAnalyzer
+        _sia = SentimentIntensityAnalyzer()
+    return _sia
 
 '''
 Takes text as input and returns the compound sentiment score: a normalized score which summarizes
@@ -15,23 +30,108 @@ def analyze_sentiment(review_text):
     # previously when VADER received a non-string value.
     if not isinstance(review_text, str) or review_text.strip() == '':
         return 0.0
-    sentiment_score = sia.polarity_scores(review_text)
+    sentiment_score = get_analyzer().polarity_scores(review_text)
     return sentiment_score['compound']  # Compound score as overall sentiment measure
 
+def _score_chunk(texts):
+    return [analyze_sentiment(text) for text in texts]
+
+'''
+Scores a whole column of review text at once, for the offline pipeline. Each distinct review is only
+scored once (short summaries like "Great book!" repeat a lot), and the distinct reviews are split into
+chunks that are scored in parallel by a multiprocessing pool - the given pool if there is one (see
+sentiment_pool), otherwise one started for this call. Returns a float32 array, one score per text.
+'''
+def batch_sentiment(texts, processes=None, chunk_size=5000, pool=None):
+    texts = pd.Series(texts).fillna('').astype(str)
+    codes, unique_texts = pd.factorize(texts)
+    unique_texts = list(unique_texts)
+    chunks = [unique_texts[i:i + chunk_size] for i in range(0, len(unique_texts), chunk_size)]
+
+    if processes == 1 or len(chunks) <= 1:
+        scored = [_score_chunk(chunk) for chunk in chunks]
+    elif pool is not None:
+        scored = pool.map(_score_chunk, chunks)
+    else:
+        with Pool(processes) as pool:
+            scored = pool.map(_score_chunk, chunks)
+
+    scores = np.array([score for chunk in scored for score in chunk], dtype=np.float32)
+    return scores[codes] if len(scores) else np.zeros(len(texts), dtype=np.float32)
+
+'''
+A pool for scoring many batches with batch_sentiment, e.g. every chunk of a file read in chunks, so the
+worker processes are started once rather than once per batch. Yields None when processes is 1.
+'''
+@contextmanager
+def sentiment_pool(processes=None):
+    if processes == 1:
+        yield None
+        return
+    with Pool(processes) as pool:
+        yield pool
+
+'''
+Adds the precomputed sentiment column to a genre DataFrame (see batch_sentiment).
+'''
+def add_sentiment_column(reviews_df, processes=None, pool=None):
+    reviews_df[genre_store.SENTIMENT_COLUMN] = batch_sentiment(reviews_df['review_summary'], processes, pool=pool)
+    return reviews_df
+
+'''
+Scores every review of a genre once and stores the result as a sentiment column in both the genre CSV
+and the columnar store, so recommend_book can read the score instead of running VADER per request.
+'''
+def score_genre(genre, processes=None, data_dir=None):
+    file_path = genre_store.csv_path(genre, data_dir)
+    reviews_df = pd.read_csv(file_path)
+    add_sentiment_column(reviews_df, processes)
+    reviews_df.to_csv(file_path, index=False)
+    genre_store.write_genre_store(reviews_df, genre, data_dir)
+    return reviews_df
+
 def apply_sentiment_analysis(reviews_df):
     # BUG FIX: reviews_df may arrive as a plain list of dicts (from matched_books in analysis_summary.py).
     # Convert to DataFrame first if needed so .apply() works correctly.
     if not isinstance(reviews_df, pd.DataFrame):
         reviews_df = pd.DataFrame(reviews_df)
 
-    # Apply sentiment to the review_summary column, filling any NaN values with empty string
-    reviews_df['sentiment'] = reviews_df['review_summary'].fillna('').apply(analyze_sentiment)
-    return reviews_df
+    with stage('sentiment') as info:
+        info['rows'] = len(reviews_df)
 
+        # Reviews that already have a stored score (from score_genre) keep it; only the rest are scored here.
+        if 'sentiment' in reviews_df.columns:
+            missing = reviews_df['sentiment'].isna()
+            info['scored_live'] = int(missing.sum())
+            if missing.any():
+                reviews_df.loc[missing, 'sentiment'] = (
+                    reviews_df.loc[missing, 'review_summary'].fillna('').apply(analyze_sentiment)
+                )
+            return reviews_df
+
+        # Apply sentiment to the review_summary column, filling any NaN values with empty string
+        info['scored_live'] = len(reviews_df)
+        reviews_df['sentiment'] = reviews_df['review_summary'].fillna('').apply(analyze_sentiment)
+        return reviews_df
+
+'''
+Precomputes and stores sentiment for the given genres (every genre in Data/filtered_reviews/ if none are
+given). Run after Genre_filter.py, e.g.  python sentiment_analysis.py fiction humor --processes 8
+'''
 def main():
-    reviews_df = pd.read_csv('Data/filtered_reviews/architecture_df.csv')
-    sentiment_df = apply_sentiment_analysis(reviews_df)
-    print(sentiment_df[['title', 'sentiment']].head())
+    parser = argparse.ArgumentParser(description='Precompute VADER sentiment for genre files.')
+    parser.add_argument('genres', nargs='*')
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    genres = args.genres
+    if not genres:
+        genres = sorted(f[:-len('_df.csv')] for f in os.listdir(genre_store.filtered_dir) if f.endswith('_df.csv'))
+
+    for genre in genres:
+        sentiment_df = score_genre(genre, processes=args.processes)
+        print(f"Scored {len(sentiment_df)} reviews for {genre}")
+        print(sentiment_df[['title', 'sentiment']].head())
 
 if __name__ == "__main__":
     main()
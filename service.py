@@ -0,0 +1,233 @@
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from analysis_summary import (SCORE_POLICIES, SEARCH_MODES, normalize_keywords, recommend_book, recommend_similar,
+                              resolve_genres)
+from corpus_cache import cache_stats
+from result_cache import result_cache_stats
+from semantic_search import semantic_index_built
+
+'''
+HTTP/JSON API around recommend_book for other internal apps, alongside the Streamlit UI.
+
+    GET  /recommend?genre=fiction&keywords=adventure+epic&k=10&policy=first&mode=keyword
+    POST /recommend   {"genre": ["fiction", "humor"], "keywords": "adventure epic", "k": 10}
+    GET  /similar?genre=fiction&title=Dune&k=10
+    GET  /health
+
+The pipeline is CPU-bound, so it runs on a thread pool and never blocks the event loop. Identical requests
+that arrive while one is already being computed wait for that result instead of computing it again
+(request coalescing - keywords are compared after normalize_keywords, so 'Funny Epic' and 'epic funny' are the
+same request). Requests wait in a bounded queue for a free worker; when the queue is full the service answers
+503 straight away rather than piling up work it can't finish.
+
+    python service.py --port 8080 --workers 4 --max-queue 64
+'''
+
+DEFAULT_WORKERS = int(os.environ.get('BOOKREC_SERVICE_WORKERS', 4))
+DEFAULT_MAX_QUEUE = int(os.environ.get('BOOKREC_SERVICE_MAX_QUEUE', 64))
+
+
+class QueueFull(Exception):
+    pass
+
+
+'''
+Runs recommendation jobs on an executor, coalescing identical jobs and bounding how many can wait.
+'''
+class RecommendationService:
+    def __init__(self, workers=DEFAULT_WORKERS, max_queue=DEFAULT_MAX_QUEUE, recommend=recommend_book,
+                 similar=recommend_similar):
+        self.workers = workers
+        self.recommend = recommend
+        self.similar = similar
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='recommend')
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.inflight = {}
+        self.stats = {'requests': 0, 'computed': 0, 'coalesced': 0, 'rejected': 0, 'errors': 0}
+        self._worker_tasks = []
+
+    async def start(self):
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            key, func, args, future = await self.queue.get()
+            try:
+                result = await loop.run_in_executor(self.executor, func, *args)
+                self.stats['computed'] += 1
+                future.set_result(result)
+            except Exception as error:
+                self.stats['errors'] += 1
+                future.set_exception(error)
+            finally:
+                self.inflight.pop(key, None)
+                self.queue.task_done()
+
+    '''
+    Returns the result of func(*args), sharing it with any identical request (same key) already in flight.
+    Raises QueueFull if the job would have to wait and the queue is full.
+    '''
+    async def submit(self, key, func, *args):
+        self.stats['requests'] += 1
+        if key in self.inflight:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(self.inflight[key])
+
+        if self.queue.full():
+            self.stats['rejected'] += 1
+            raise QueueFull()
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        self.queue.put_nowait((key, func, args, future))
+        return await asyncio.shield(future)
+
+    async def recommend_books(self, genre, key_term, k=10, policy='first', mode='keyword'):
+        keywords = normalize_keywords(key_term)
+        genre_key = genre if isinstance(genre, str) else tuple(sorted(set(genre)))
+        key = ('recommend', genre_key, keywords, k, policy, mode)
+        return await self.submit(key, self.recommend, genre, ' '.join(keywords), k, policy, mode)
+
+    async def similar_books(self, genre, title, k=10):
+        key = ('similar', genre, title.strip().lower(), k)
+        return await self.submit(key, self.similar, genre, title, k)
+
+    def health(self):
+        return {'status': 'ok', 'queued': self.queue.qsize(), 'inflight': len(self.inflight), **self.stats}
+
+
+def _records(df):
+    # to_json turns NaN into null, which json.dumps of the records would not
+    return json.loads(df.to_json(orient='records')) if not df.empty else []
+
+
+def _int_param(value, name, default):
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise web.HTTPBadRequest(text=json.dumps({'error': f"'{name}' must be an integer"}),
+                                 content_type='application/json')
+    if value < 1:
+        raise web.HTTPBadRequest(text=json.dumps({'error': f"'{name}' must be at least 1"}),
+                                 content_type='application/json')
+    return value
+
+
+def _bad_request(message):
+    return web.json_response({'error': message}, status=400)
+
+
+async def handle_recommend(request):
+    if request.method == 'POST':
+        try:
+            params = await request.json()
+        except json.JSONDecodeError:
+            return _bad_request('body must be JSON')
+        if not isinstance(params, dict):
+            return _bad_request('body must be a JSON object')
+        genre = params.get('genre')
+    else:
+        params = request.query
+        genres = params.getall('genre', [])
+        genre = genres[0] if len(genres) == 1 else genres or None
+
+    keywords = params.get('keywords') or ''
+    policy = params.get('policy') or 'first'
+    mode = params.get('mode') or 'keyword'
+    k = _int_param(params.get('k'), 'k', 10)
+    if not isinstance(keywords, str):
+        return _bad_request("'keywords' must be a string")
+    if isinstance(genre, list) and not all(isinstance(name, str) for name in genre):
+        return _bad_request("'genre' must be a string or a list of strings")
+    if not genre or not isinstance(genre, (str, list)) or not keywords.strip():
+        return _bad_request("'genre' and 'keywords' are required")
+    if policy not in SCORE_POLICIES:
+        return _bad_request(f"'policy' must be one of {list(SCORE_POLICIES)}")
+    if mode not in SEARCH_MODES:
+        return _bad_request(f"'mode' must be one of {list(SEARCH_MODES)}")
+    if mode == 'semantic':
+        unbuilt = [name for name in resolve_genres(genre) if not semantic_index_built(name)]
+        if unbuilt:
+            return _bad_request(f"semantic index not built for {unbuilt}; run semantic_search.py first")
+
+    service = request.app[service_key]
+    try:
+        results, topics = await service.recommend_books(genre, keywords, k, policy, mode)
+    except QueueFull:
+        return web.json_response({'error': 'too many requests, try again shortly'}, status=503,
+                                 headers={'Retry-After': '1'})
+    return web.json_response({'results': _records(results), 'topics': topics or None})
+
+
+async def handle_similar(request):
+    genre = request.query.get('genre')
+    title = request.query.get('title') or ''
+    k = _int_param(request.query.get('k'), 'k', 10)
+    if not genre or not title.strip():
+        return _bad_request("'genre' and 'title' are required")
+
+    service = request.app[service_key]
+    try:
+        results = await service.similar_books(genre, title, k)
+    except QueueFull:
+        return web.json_response({'error': 'too many requests, try again shortly'}, status=503,
+                                 headers={'Retry-After': '1'})
+    return web.json_response({'results': _records(results)})
+
+
+async def handle_health(request):
+    return web.json_response({**request.app[service_key].health(), 'corpus_cache': cache_stats(),
+                              'result_cache': result_cache_stats()})
+
+
+service_key = web.AppKey('service', RecommendationService)
+
+
+'''
+Builds the aiohttp application. The service can be passed in (e.g. with a fake recommend function in
+tests); by default one is created when the app starts.
+'''
+def create_app(service=None, workers=DEFAULT_WORKERS, max_queue=DEFAULT_MAX_QUEUE):
+    app = web.Application()
+
+    async def start_service(app):
+        app[service_key] = service or RecommendationService(workers, max_queue)
+        await app[service_key].start()
+
+    async def stop_service(app):
+        await app[service_key].stop()
+
+    app.on_startup.append(start_service)
+    app.on_cleanup.append(stop_service)
+    app.router.add_get('/recommend', handle_recommend)
+    app.router.add_post('/recommend', handle_recommend)
+    app.router.add_get('/similar', handle_similar)
+    app.router.add_get('/health', handle_health)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the book recommendation HTTP service.')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE)
+    args = parser.parse_args()
+    web.run_app(create_app(workers=args.workers, max_queue=args.max_queue), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import argparse
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import genre_store
+from genre_store import load_genre_reviews
+from model_cache import ModelCache
+from token_corpus import build_token_corpus, fit_counts, get_token_corpus
+
+# Rough cap on the dense block of similarity scores held in memory while precomputing neighbours
+MAX_BLOCK_BYTES = 256 * 1024 ** 2
+
+# The files of a saved model in its {genre}_tfidf folder (the neighbours only if they were precomputed)
+MODEL_FILES = ['vectorizer.joblib', 'matrix.npz', 'neighbours.npy', 'neighbour_scores.npy']
+
+# scikit-learn, scipy and joblib are imported where they are used so importing this module (and the app) stays
+# fast; see topic_modeling.py
+
+'''
+"More like this" search, promoted from tf-idf.ipynb. The notebook built one TF-IDF row per review and a
+dense N x N cosine_similarity matrix, which stops fitting in memory after a few tens of thousands of reviews.
+Here all the reviews of a title are joined into one document, giving one sparse L2-normalised TF-IDF row per
+title, so the cosine similarity of two titles is just the dot product of their rows. A lookup only computes
+the similarities of one title against all the others, and picks the top k with argpartition.
+'''
+class SimilarityModel:
+    def __init__(self, titles, vectorizer, matrix, neighbours=None, neighbour_scores=None):
+        self.titles = np.asarray(titles, dtype=object)
+        self.vectorizer = vectorizer
+        self.matrix = matrix.tocsr()
+        self.neighbours = neighbours
+        self.neighbour_scores = neighbour_scores
+        self.title_rows = {title: row for row, title in enumerate(self.titles)}
+        self.lower_title_rows = {}
+        for row, title in enumerate(self.titles):
+            self.lower_title_rows.setdefault(str(title).lower(), row)
+
+    '''
+    Finds the row for a title, ignoring case if there is no exact match. Returns None if not found.
+    '''
+    def find_title(self, title):
+        if title in self.title_rows:
+            return self.title_rows[title]
+        return self.lower_title_rows.get(str(title).strip().lower())
+
+    '''
+    Returns a DataFrame of up to k titles most similar to the given one, best first.
+    Uses the precomputed neighbours when they have been built for this model.
+    '''
+    def similar_titles(self, title, k=10):
+        row = self.find_title(title)
+        if row is None:
+            return pd.DataFrame(columns=['title', 'similarity'])
+
+        if self.neighbours is not None and k <= self.neighbours.shape[1]:
+            ids = self.neighbours[row, :k]
+            scores = self.neighbour_scores[row, :k]
+        else:
+            scores = (self.matrix @ self.matrix[row].T).toarray().ravel()
+            scores[row] = -np.inf
+            ids, scores = top_k(scores, k)
+
+        keep = np.isfinite(scores) & (scores > 0)
+        return pd.DataFrame({'title': self.titles[ids[keep]], 'similarity': scores[keep]})
+
+    '''
+    Same as similar_titles but for free text, e.g. a description of the kind of book wanted.
+    '''
+    def similar_to_text(self, text, k=10):
+        query = self.vectorizer.transform([text])
+        scores = (self.matrix @ query.T).toarray().ravel()
+        ids, scores = top_k(scores, k)
+        keep = scores > 0
+        return pd.DataFrame({'title': self.titles[ids[keep]], 'similarity': scores[keep]})
+
+
+'''
+Indices and values of the k largest scores, largest first, without sorting the whole array.
+'''
+def top_k(scores, k):
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=scores.dtype)
+    ids = np.argpartition(-scores, k - 1)[:k]
+    ids = ids[np.argsort(-scores[ids], kind='stable')]
+    return ids, scores[ids]
+
+
+'''
+Treats all reviews of each title as one document and fits the TF-IDF model over those documents. The word
+counts per title are summed from the genre's token corpus (tokenized here unless the saved one is passed
+in) rather than joining and re-tokenizing the review text; the result is the same matrix TfidfVectorizer
+gives for the joined reviews.
+'''
+def build_similarity_model(reviews_df, max_features=50000, token_corpus=None):
+    from sklearn.feature_extraction.text import TfidfTransformer
+    if token_corpus is None:
+        token_corpus = build_token_corpus(reviews_df['review_summary'])
+    title_codes, titles = pd.factorize(reviews_df['title'])
+    vectorizer, counts = fit_counts(token_corpus, max_features=max_features, groups=title_codes,
+                                    n_groups=len(titles), dtype=np.float32)
+    vectorizer.tfidf = TfidfTransformer(sublinear_tf=True)
+    matrix = vectorizer.tfidf.fit_transform(counts)
+    return SimilarityModel(np.asarray(titles, dtype=object), vectorizer, matrix)
+
+
+'''
+Precomputes the k nearest titles for every title (batch mode). Rows are processed in blocks: each block of
+TF-IDF rows is multiplied by the whole matrix, giving a dense block x n_titles slice of the similarity
+matrix that is reduced to its top k and thrown away, so the full matrix never exists in memory.
+'''
+def precompute_neighbours(model, k=10, block_size=None):
+    matrix = model.matrix
+    n_titles = matrix.shape[0]
+    k = min(k, max(n_titles - 1, 0))
+    if block_size is None:
+        block_size = max(1, min(4096, MAX_BLOCK_BYTES // (4 * max(n_titles, 1))))
+
+    neighbours = np.zeros((n_titles, k), dtype=np.int32)
+    neighbour_scores = np.zeros((n_titles, k), dtype=np.float32)
+    transposed = matrix.T.tocsc()
+    for start in range(0, n_titles, block_size):
+        stop = min(start + block_size, n_titles)
+        block = (matrix[start:stop] @ transposed).toarray()
+        # A title is not its own neighbour
+        block[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+        if k == 0:
+            continue
+        ids = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(block, ids, axis=1)
+        order = np.argsort(-scores, axis=1, kind='stable')
+        neighbours[start:stop] = np.take_along_axis(ids, order, axis=1)
+        neighbour_scores[start:stop] = np.take_along_axis(scores, order, axis=1)
+
+    model.neighbours = neighbours
+    model.neighbour_scores = neighbour_scores
+    return model
+
+
+def model_path(genre, data_dir=None):
+    return os.path.join(data_dir or genre_store.filtered_dir, f"{genre}_tfidf")
+
+
+def model_files(genre, data_dir=None):
+    return [os.path.join(model_path(genre, data_dir), name) for name in MODEL_FILES]
+
+
+'''
+Saves the fitted vectorizer and titles with joblib and the TF-IDF matrix (and neighbours, if computed)
+as NumPy/SciPy files in a {genre}_tfidf folder. The files are written to a temporary folder that then replaces
+the old one, so a request served meanwhile never reads the titles of one model with the matrix of another.
+'''
+def save_similarity_model(model, genre, data_dir=None):
+    import joblib
+    from scipy import sparse
+    final_path = model_path(genre, data_dir)
+    tmp_path = final_path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    joblib.dump({'titles': model.titles, 'vectorizer': model.vectorizer}, os.path.join(tmp_path, 'vectorizer.joblib'))
+    sparse.save_npz(os.path.join(tmp_path, 'matrix.npz'), model.matrix)
+    if model.neighbours is not None:
+        np.save(os.path.join(tmp_path, 'neighbours.npy'), model.neighbours)
+        np.save(os.path.join(tmp_path, 'neighbour_scores.npy'), model.neighbour_scores)
+    shutil.rmtree(final_path, ignore_errors=True)
+    os.rename(tmp_path, final_path)
+
+
+def load_similarity_model(genre, data_dir=None):
+    path = model_path(genre, data_dir)
+    if not os.path.exists(os.path.join(path, 'vectorizer.joblib')):
+        return None
+    import joblib
+    from scipy import sparse
+    saved = joblib.load(os.path.join(path, 'vectorizer.joblib'))
+    matrix = sparse.load_npz(os.path.join(path, 'matrix.npz'))
+    neighbours = neighbour_scores = None
+    if os.path.exists(os.path.join(path, 'neighbours.npy')):
+        neighbours = np.load(os.path.join(path, 'neighbours.npy'), mmap_mode='r')
+        neighbour_scores = np.load(os.path.join(path, 'neighbour_scores.npy'), mmap_mode='r')
+    return SimilarityModel(saved['titles'], saved['vectorizer'], matrix, neighbours, neighbour_scores)
+
+
+similarity_model_cache = ModelCache(load_similarity_model, model_files)
+
+'''
+Returns the saved similarity model for a genre, kept in memory after the first call and loaded again when
+the saved files change (see model_cache.py). Returns None if no model has been saved for the genre - fitting
+one takes far too long to do while serving a request, so run this file to build it.
+'''
+def get_similarity_model(genre):
+    return similarity_model_cache.get(genre)
+
+
+'''
+Fits, precomputes neighbours for, and saves the similarity model of the given genres (every genre in
+Data/filtered_reviews/ if none are given).  e.g.  python similar_books.py fiction --k 20
+'''
+def main():
+    parser = argparse.ArgumentParser(description='Build the "similar books" TF-IDF models.')
+    parser.add_argument('genres', nargs='*')
+    parser.add_argument('--k', type=int, default=10, help='neighbours to precompute per title')
+    args = parser.parse_args()
+
+    genres = args.genres
+    if not genres:
+        genres = sorted(f[:-len('_df.csv')] for f in os.listdir(genre_store.filtered_dir) if f.endswith('_df.csv'))
+
+    for genre in genres:
+        reviews_df = load_genre_reviews(genre, columns=['title', 'review_summary'])
+        if reviews_df is None:
+            print(f"No data found for genre: '{genre}' — skipping.")
+            continue
+        model = build_similarity_model(reviews_df, token_corpus=get_token_corpus(reviews_df, genre))
+        model = precompute_neighbours(model, k=args.k)
+        save_similarity_model(model, genre)
+        print(f"Saved {model_path(genre)} ({len(model.titles)} titles)")
+
+
+if __name__ == "__main__":
+    main()
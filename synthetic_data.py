@@ -0,0 +1,112 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from genre_store import csv_path, write_genre_store
+
+# Words that show up a lot in real review summaries, so keyword searches in benchmarks and tests behave
+# roughly like they do on the Amazon data. The rest of the vocabulary is made-up words for the long tail.
+COMMON_WORDS = ['book', 'great', 'good', 'read', 'story', 'love', 'loved', 'the', 'a', 'and', 'of', 'best',
+                'adventure', 'epic', 'funny', 'humor', 'dark', 'serious', 'melancholy', 'inspiring',
+                'beautiful', 'boring', 'classic', 'history', 'travel', 'journey', 'characters', 'plot',
+                'amazing', 'excellent', 'terrible', 'disappointing', 'recommend', 'fun', 'wonderful',
+                'romance', 'mystery', 'thriller', 'scary', 'terrifying', 'heartwarming', 'must', 'not',
+                'too', 'long', 'short', 'easy', 'interesting', 'informative', 'useful', 'well', 'written']
+
+LETTERS = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+
+# Genres write_genre_partitions writes by default: the ones test_recommendations.py expects results from, plus a
+# couple more. 'antiques collectibles' is left out on purpose - test_no_matching_books expects no match for
+# "Mary Jane" there, and made-up words such as "jan" fuzzy-match it.
+DEFAULT_GENRES = ('fiction', 'humor', 'travel', 'biography autobiography', 'poetry')
+
+
+def _make_vocabulary(rng, vocab_size):
+    n_made_up = max(vocab_size - len(COMMON_WORDS), 0)
+    lengths = rng.integers(3, 11, size=n_made_up)
+    letters = LETTERS[rng.integers(0, len(LETTERS), size=int(lengths.sum()))]
+    made_up = [''.join(chunk) for chunk in np.split(letters, np.cumsum(lengths)[:-1])] if n_made_up else []
+    return np.array(COMMON_WORDS + made_up, dtype=object)
+
+
+'''
+Generates a deterministic DataFrame shaped like a Data/filtered_reviews/{genre}_df.csv file, so benchmarks
+and tests can run without the private data. The same arguments always give the same rows.
+Review texts are drawn from a pool of at most max_unique_reviews distinct summaries (real summaries repeat
+a lot too), which keeps generating multi-million row files fast.
+'''
+def make_genre_reviews(n_rows, genre='fiction', seed=0, vocab_size=5000, max_unique_reviews=200_000):
+    rng = np.random.default_rng(seed)
+    vocabulary = _make_vocabulary(rng, vocab_size)
+
+    n_unique = max(1, min(n_rows, max_unique_reviews))
+    lengths = rng.integers(1, 16, size=n_unique)
+    # Zipf-like word frequencies: a few words are everywhere, most are rare
+    word_ids = (rng.zipf(1.3, size=int(lengths.sum())) - 1) % len(vocabulary)
+    words = vocabulary[word_ids]
+    pool = np.array([' '.join(chunk) for chunk in np.split(words, np.cumsum(lengths)[:-1])], dtype=object)
+
+    n_titles = max(1, n_rows // 8)
+    n_publishers = max(1, min(200, n_titles))
+    titles = np.array([f"{genre.title()} Book {i}" for i in range(n_titles)], dtype=object)
+    publishers = np.array([f"Publisher {i}" for i in range(n_publishers)], dtype=object)
+
+    summaries = pool[rng.integers(0, n_unique, size=n_rows)]
+    # About 1% of reviews are missing their summary, like in the real files
+    summaries[rng.random(n_rows) < 0.01] = np.nan
+
+    return pd.DataFrame({
+        'title': titles[rng.integers(0, n_titles, size=n_rows)],
+        'categories': genre,
+        'review_summary': summaries,
+        'review_score': rng.integers(1, 6, size=n_rows).astype(float),
+        'publisher': publishers[rng.integers(0, n_publishers, size=n_rows)],
+    })
+
+
+'''
+Writes synthetic genre partitions to data_dir laid out the way Genre_filter.py leaves Data/filtered_reviews/:
+a {genre}_df.csv per genre and, unless store is False, its columnar store (genre_store.py). n_rows is one size
+for every genre or a dict of sizes per genre. With sentiment=True the precomputed sentiment column is added
+as well (sentiment_analysis.add_sentiment_column), otherwise sentiment is scored live like for a fresh genre.
+Genre number i is generated with seed + i, so the same arguments always write the same files.
+Returns a dict of genre -> number of rows written.
+'''
+def write_genre_partitions(data_dir, genres=DEFAULT_GENRES, n_rows=10_000, seed=0, store=True, sentiment=False):
+    os.makedirs(data_dir, exist_ok=True)
+    written = {}
+    for i, genre in enumerate(genres):
+        size = n_rows[genre] if isinstance(n_rows, dict) else n_rows
+        reviews_df = make_genre_reviews(size, genre=genre, seed=seed + i)
+        if sentiment:
+            from sentiment_analysis import add_sentiment_column
+            add_sentiment_column(reviews_df, processes=1)
+        reviews_df.to_csv(csv_path(genre, data_dir), index=False)
+        if store:
+            write_genre_store(reviews_df, genre, data_dir)
+        written[genre] = size
+    return written
+
+
+'''
+Writes a folder of synthetic genre files to try the app, the service or the offline steps without the
+private data, e.g.
+    python synthetic_data.py /tmp/bookrec --rows 100000
+    BOOKREC_DATA_DIR=/tmp/bookrec streamlit run app.py
+'''
+def main():
+    parser = argparse.ArgumentParser(description='Write synthetic genre files.')
+    parser.add_argument('data_dir')
+    parser.add_argument('--genres', nargs='+', default=list(DEFAULT_GENRES))
+    parser.add_argument('--rows', type=int, default=10_000, help='reviews per genre')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sentiment', action='store_true', help='also precompute the sentiment column')
+    args = parser.parse_args()
+
+    written = write_genre_partitions(args.data_dir, args.genres, args.rows, args.seed, sentiment=args.sentiment)
+    for genre, size in written.items():
+        print(f"Wrote {size} reviews for {genre} to {csv_path(genre, args.data_dir)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+from corpus_cache import CorpusCache
+
+
+class FakeCorpus:
+    def __init__(self, genre, nbytes):
+        self.genre = genre
+        self.nbytes = nbytes
+
+
+def make_cache(max_bytes, sizes):
+    loads = []
+
+    def loader(genre):
+        loads.append(genre)
+        return FakeCorpus(genre, sizes[genre]) if genre in sizes else None
+
+    return CorpusCache(max_bytes, loader=loader), loads
+
+
+# Repeat requests are served from memory, and the counters record hits and misses
+def test_hits_and_misses():
+    cache, loads = make_cache(100, {'fiction': 40})
+    assert cache.get('fiction').genre == 'fiction'
+    assert cache.get('fiction').genre == 'fiction'
+    assert loads == ['fiction']
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 1, 0)
+
+
+# Least recently used genres are evicted once the byte budget is exceeded
+def test_lru_eviction_by_bytes():
+    cache, loads = make_cache(100, {'fiction': 40, 'humor': 40, 'travel': 40, 'poetry': 500})
+    cache.warm(['fiction', 'humor'])
+    cache.get('fiction')
+    cache.get('travel')
+
+    stats = cache.stats()
+    assert stats['genres'] == ['fiction', 'travel']
+    assert stats['bytes'] == 80
+    assert stats['evictions'] == 1
+
+    # Bigger than the whole budget: returned but never kept
+    assert cache.get('poetry').nbytes == 500
+    assert 'poetry' not in cache.stats()['genres']
+    assert cache.get('missing genre') is None
@@ -0,0 +1,202 @@
+import json
+from functools import partial
+import pandas as pd
+import pytest
+import Genre_filter
+import genre_store
+import sentiment_analysis
+from keyword_index import build_keyword_index, load_keyword_index, save_keyword_index
+from semantic_search import build_semantic_index, load_semantic_index, save_semantic_index
+from similar_books import build_similarity_model, load_similarity_model, precompute_neighbours, save_similarity_model
+from synthetic_data import make_genre_reviews
+from token_corpus import build_token_corpus, load_token_corpus
+from topic_modeling import load_topic_model, save_topic_model, train_topic_model
+
+
+def simple_preprocess(text):
+    return text.lower() if isinstance(text, str) else ''
+
+
+def write_partitions(tmp_path, monkeypatch):
+    monkeypatch.setattr(Genre_filter, 'preprocess_text', simple_preprocess)
+    master = pd.concat([make_genre_reviews(600, 'Travel', seed=1), make_genre_reviews(600, 'Humor', seed=2)])
+    master.to_csv(tmp_path / 'master.csv', index=False)
+    output_dir = tmp_path / 'filtered_reviews'
+    Genre_filter.partition_reviews(tmp_path / 'master.csv', output_dir, chunk_size=250, processes=1)
+    return output_dir
+
+
+# Streaming partitioning keeps every row of each genre, in the original order
+def test_partition_reviews(tmp_path, monkeypatch):
+    output_dir = write_partitions(tmp_path, monkeypatch)
+    travel = pd.read_csv(output_dir / 'travel_df.csv')
+    expected = make_genre_reviews(600, 'Travel', seed=1)
+    assert travel['title'].tolist() == expected['title'].tolist()
+    assert 'sentiment' in travel.columns
+
+
+class CountingPool:
+    created = 0
+
+    def __init__(self, processes=None):
+        CountingPool.created += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def map(self, func, items):
+        return [func(item) for item in items]
+
+
+# Sentiment is scored on one pool for the whole file, however many chunks and genres it is spread over
+def test_partition_reviews_starts_one_sentiment_pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(sentiment_analysis, 'Pool', CountingPool)
+    # Small batches, so every chunk of every genre would need a pool of its own
+    batch_sentiment = partial(sentiment_analysis.batch_sentiment, chunk_size=20)
+    monkeypatch.setattr(sentiment_analysis, 'batch_sentiment', batch_sentiment)
+    monkeypatch.setattr(Genre_filter, 'preprocess_text', simple_preprocess)
+    CountingPool.created = 0
+    master = pd.concat([make_genre_reviews(600, 'Travel', seed=1), make_genre_reviews(600, 'Humor', seed=2)])
+    master.to_csv(tmp_path / 'master.csv', index=False)
+    Genre_filter.partition_reviews(tmp_path / 'master.csv', tmp_path / 'filtered_reviews', chunk_size=250, processes=2)
+    assert CountingPool.created == 1
+
+    travel = pd.read_csv(tmp_path / 'filtered_reviews' / 'travel_df.csv')
+    expected = batch_sentiment(travel['review_summary'], processes=1)
+    assert (travel['sentiment'].to_numpy(dtype='float32') == expected).all()
+
+
+# Building the stores a chunk at a time gives the same columnar store and token corpus as the whole genre at once
+def test_build_genre_stores_in_chunks(tmp_path, monkeypatch):
+    output_dir = write_partitions(tmp_path, monkeypatch)
+    Genre_filter.build_genre_stores(['travel'], output_dir, chunk_size=70)
+    travel = pd.read_csv(output_dir / 'travel_df.csv')
+    genre_store.write_genre_store(travel, 'expected', tmp_path)
+
+    pd.testing.assert_frame_equal(genre_store.load_genre_store('travel', data_dir=output_dir),
+                                  genre_store.load_genre_store('expected', data_dir=tmp_path))
+    corpus = load_token_corpus('travel', data_dir=output_dir)
+    expected = build_token_corpus(travel['review_summary'])
+    assert corpus.vocab == expected.vocab
+    assert (corpus.offsets == expected.offsets).all() and (corpus.ids == expected.ids).all()
+
+
+# A full rebuild with the same number of rows but different reviews rebuilds the keyword index and models that
+# were built from the old data, rather than leaving postings that point at the wrong reviews
+def test_build_genre_stores_rebuilds_derived_artifacts(tmp_path, monkeypatch):
+    output_dir = write_partitions(tmp_path, monkeypatch)
+    travel = pd.read_csv(output_dir / 'travel_df.csv')
+    save_keyword_index(build_keyword_index(travel), 'travel', output_dir)
+    save_similarity_model(build_similarity_model(travel), 'travel', output_dir)
+    replaced = make_genre_reviews(600, 'Travel', seed=7)
+    replaced['title'] = 'New ' + replaced['title']
+    replaced.to_csv(output_dir / 'travel_df.csv', index=False)
+
+    built = Genre_filter.build_genre_stores(['travel', 'humor'], output_dir)
+    assert built == {'travel': ['store', 'token_corpus', 'keyword_index', 'similarity_model'],
+                     'humor': ['store', 'token_corpus']}
+    index = load_keyword_index('travel', n_rows=600, data_dir=output_dir)
+    expected = build_keyword_index(replaced)
+    keywords = ['adventure', 'funny']
+    assert index.matching_rows(keywords).tolist() == expected.matching_rows(keywords).tolist()
+    assert load_similarity_model('travel', output_dir).find_title(replaced['title'].iloc[0]) is not None
+
+
+# A delta is appended once; rerunning it is a no-op, and the keyword index is extended to cover it
+def test_ingest_delta_is_idempotent(tmp_path, monkeypatch):
+    output_dir = write_partitions(tmp_path, monkeypatch)
+    save_keyword_index(build_keyword_index(pd.read_csv(output_dir / 'travel_df.csv')), 'travel', output_dir)
+    make_genre_reviews(300, 'Travel', seed=9).to_csv(tmp_path / 'delta.csv', index=False)
+
+    assert Genre_filter.ingest_delta(tmp_path / 'delta.csv', output_dir, chunk_size=100, processes=1) == {'travel': 300}
+    assert Genre_filter.ingest_delta(tmp_path / 'delta.csv', output_dir, chunk_size=100, processes=1) == {}
+
+    travel = pd.read_csv(output_dir / 'travel_df.csv')
+    assert len(travel) == 900
+    index = load_keyword_index('travel', n_rows=900, data_dir=output_dir)
+    rebuilt = build_keyword_index(travel)
+    assert index.terms == rebuilt.terms
+    assert (index.postings_rows == rebuilt.postings_rows).all()
+
+
+# The saved models trained on the whole genre are retrained on it after a delta, with the settings they had,
+# and the manifest records every artifact rewritten
+def test_ingest_delta_rebuilds_models(tmp_path, monkeypatch):
+    output_dir = write_partitions(tmp_path, monkeypatch)
+    travel = pd.read_csv(output_dir / 'travel_df.csv')
+    save_topic_model(train_topic_model(travel, n_components=3), 'travel', output_dir)
+    save_similarity_model(precompute_neighbours(build_similarity_model(travel), k=4), 'travel', output_dir)
+    save_semantic_index(build_semantic_index(travel, n_components=8, n_lists=5), 'travel', output_dir)
+    delta = make_genre_reviews(300, 'Travel', seed=9)
+    delta['title'] = 'Delta ' + delta['title']
+    delta.to_csv(tmp_path / 'delta.csv', index=False)
+
+    Genre_filter.ingest_delta(tmp_path / 'delta.csv', output_dir, chunk_size=100, processes=1)
+    assert load_topic_model('travel', output_dir).lda.n_components == 3
+    model = load_similarity_model('travel', output_dir)
+    assert model.find_title(delta['title'].iloc[0]) is not None and model.neighbours.shape[1] == 4
+    index = load_semantic_index('travel', output_dir)
+    assert delta['title'].iloc[0] in set(index.titles)
+    assert index.components.shape[0] == 8 and index.n_lists == 5
+
+    manifest = json.loads((output_dir / 'manifest.json').read_text())
+    [entry] = manifest['deltas'].values()
+    assert entry['artifacts'] == {'travel': ['store', 'token_corpus', 'topic_model', 'similarity_model',
+                                             'semantic_index']}
+
+
+# After a crash part-way through a delta, rows past the watermark are rolled back and not duplicated
+def test_ingest_delta_resumes_after_crash(tmp_path, monkeypatch):
+    output_dir = write_partitions(tmp_path, monkeypatch)
+    make_genre_reviews(300, 'Travel', seed=9).to_csv(tmp_path / 'delta.csv', index=False)
+
+    real_save = Genre_filter.save_manifest
+    calls = []
+
+    def crashing_save(manifest, directory):
+        calls.append(1)
+        if len(calls) == 3:
+            raise RuntimeError('simulated crash')
+        real_save(manifest, directory)
+
+    monkeypatch.setattr(Genre_filter, 'save_manifest', crashing_save)
+    try:
+        Genre_filter.ingest_delta(tmp_path / 'delta.csv', output_dir, chunk_size=100, processes=1)
+    except RuntimeError:
+        pass
+    monkeypatch.setattr(Genre_filter, 'save_manifest', real_save)
+
+    Genre_filter.ingest_delta(tmp_path / 'delta.csv', output_dir, chunk_size=100, processes=1)
+    assert len(pd.read_csv(output_dir / 'travel_df.csv')) == 900
+    manifest = json.loads((output_dir / 'manifest.json').read_text())
+    assert all(entry['artifacts_built'] for entry in manifest['deltas'].values())
+
+
+# A delta with its columns in a different order is appended in the genre file's own column order
+def test_ingest_delta_reordered_columns(tmp_path, monkeypatch):
+    output_dir = write_partitions(tmp_path, monkeypatch)
+    delta = make_genre_reviews(300, 'Travel', seed=9)
+    delta[delta.columns[::-1]].to_csv(tmp_path / 'delta.csv', index=False)
+
+    assert Genre_filter.ingest_delta(tmp_path / 'delta.csv', output_dir, chunk_size=100, processes=1) == {'travel': 300}
+    travel = pd.read_csv(output_dir / 'travel_df.csv')
+    assert travel.columns.tolist() == Genre_filter.genre_columns
+    appended = travel.iloc[600:].reset_index(drop=True)
+    assert appended['title'].tolist() == delta['title'].tolist()
+    assert appended['review_score'].tolist() == delta['review_score'].tolist()
+    assert appended['publisher'].tolist() == delta['publisher'].tolist()
+
+
+# A delta is refused, before anything is appended, if a genre file has no stored sentiment column
+def test_ingest_delta_refuses_files_without_sentiment(tmp_path, monkeypatch):
+    output_dir = write_partitions(tmp_path, monkeypatch)
+    pd.read_csv(output_dir / 'humor_df.csv').drop(columns='sentiment').to_csv(output_dir / 'humor_df.csv',
+                                                                              index=False)
+    make_genre_reviews(300, 'Travel', seed=9).to_csv(tmp_path / 'delta.csv', index=False)
+
+    with pytest.raises(ValueError, match='humor'):
+        Genre_filter.ingest_delta(tmp_path / 'delta.csv', output_dir, chunk_size=100, processes=1)
+    assert len(pd.read_csv(output_dir / 'travel_df.csv')) == 600
@@ -0,0 +1,59 @@
+import pandas as pd
+from genre_store import (GenreStoreWriter, csv_path, load_genre_reviews, load_genre_store, read_strings,
+                         write_genre_store, write_strings)
+from synthetic_data import make_genre_reviews
+
+
+# The columnar store must give back the same reviews as the CSV, including missing values
+def test_store_matches_csv(tmp_path):
+    reviews_df = make_genre_reviews(3000, genre='travel', seed=1)
+    reviews_df.loc[5, 'title'] = None
+    reviews_df.loc[6, 'publisher'] = None
+    reviews_df.to_csv(csv_path('travel', tmp_path), index=False)
+
+    from_csv = load_genre_reviews('travel', data_dir=tmp_path)
+    write_genre_store(reviews_df, 'travel', tmp_path)
+    from_store = load_genre_reviews('travel', data_dir=tmp_path)
+
+    assert list(from_store.columns) == list(from_csv.columns)
+    for column in from_csv.columns:
+        expected = from_csv[column].astype(object).where(from_csv[column].notna(), None).tolist()
+        actual = from_store[column].astype(object).where(from_store[column].notna(), None).tolist()
+        assert actual == expected
+
+
+# Writing a genre a chunk at a time gives the same store as writing it in one go, including missing values and
+# chunks where a column is all missing
+def test_store_written_in_chunks(tmp_path):
+    reviews_df = make_genre_reviews(1000, genre='travel', seed=1)
+    reviews_df.loc[5, 'title'] = None
+    reviews_df.loc[300:399, 'publisher'] = None
+    write_genre_store(reviews_df, 'whole', tmp_path)
+
+    writer = GenreStoreWriter('chunked', tmp_path)
+    for start in range(0, len(reviews_df), 100):
+        writer.append(reviews_df.iloc[start:start + 100])
+    writer.close()
+    pd.testing.assert_frame_equal(load_genre_store('chunked', data_dir=tmp_path),
+                                  load_genre_store('whole', data_dir=tmp_path))
+
+
+# Strings containing the separator or the escape character come back unchanged
+def test_strings_round_trip(tmp_path):
+    values = ['plain', '', 'a\x1fb', '\x1f', 'esc\x1b', '\x1bs', '\x1b\x1f\x1be', 'last']
+    write_strings(tmp_path / 'values.txt', values)
+    assert read_strings(tmp_path / 'values.txt', len(values)) == values
+
+    reviews_df = make_genre_reviews(100, genre='travel', seed=1)
+    reviews_df.loc[3, 'review_summary'] = 'great\x1fbook'
+    reviews_df.loc[4, 'title'] = 'Odd\x1fTitle\x1b'
+    write_genre_store(reviews_df, 'travel', tmp_path)
+    store = load_genre_store('travel', data_dir=tmp_path)
+    assert store.loc[3, 'review_summary'] == 'great\x1fbook'
+    assert store.loc[4, 'title'] == 'Odd\x1fTitle\x1b'
+    assert store['title'].tolist() == reviews_df['title'].tolist()
+
+
+# Neither a store nor a CSV for the genre
+def test_missing_genre(tmp_path):
+    assert load_genre_reviews('poetry', data_dir=tmp_path) is None
@@ -0,0 +1,27 @@
+import instrumentation
+from analysis_summary import match_mask, score_matches
+from instrumentation import collect
+from synthetic_data import make_genre_reviews
+
+
+# Nothing is recorded unless instrumentation is turned on
+def test_disabled_by_default(monkeypatch):
+    monkeypatch.setattr(instrumentation, '_enabled', False)
+    with collect('test') as report:
+        assert report is None
+
+
+# Each stage run inside collect() is recorded with its timing and row counts, and can be profiled
+def test_stage_timings(monkeypatch, tmp_path):
+    monkeypatch.setattr(instrumentation, '_enabled', True)
+    monkeypatch.setattr(instrumentation, '_profile_dir', str(tmp_path))
+    reviews_df = make_genre_reviews(2000, seed=8)
+
+    with collect('test') as report:
+        score_matches(reviews_df, match_mask(reviews_df, ['adventure']), k=5)
+
+    assert [s['stage'] for s in report.stages] == ['select_matches', 'sentiment', 'scoring']
+    assert all(s['seconds'] >= 0 for s in report.stages)
+    assert report.stages[1]['scored_live'] == report.stages[1]['rows']
+    assert report.total_seconds >= sum(s['seconds'] for s in report.stages)
+    assert (tmp_path / report.profile_path.split('/')[-1]).exists()
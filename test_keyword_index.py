@@ -0,0 +1,43 @@
+import random
+import numpy as np
+import pandas as pd
+from analysis_summary import has_keywords, matched_books
+from keyword_index import build_keyword_index
+
+
+def make_reviews(n_rows=2000, seed=7):
+    rng = random.Random(seed)
+    vocab = [''.join(rng.choice('abcdeilnorstu') for _ in range(rng.randint(1, 10))) for _ in range(1500)]
+    vocab += ['Adventure', 'adventures', 'adventurous', 'Funny!', 'funny', 'fun', 'epic', '12345']
+    texts = []
+    for _ in range(n_rows):
+        if rng.random() < 0.05:
+            texts.append(np.nan)
+        else:
+            texts.append(' '.join(rng.choice(vocab) for _ in range(rng.randint(0, 12))))
+    return pd.DataFrame({
+        'title': [f"Book {rng.randint(0, n_rows // 3)}" for _ in range(n_rows)],
+        'categories': 'travel',
+        'review_summary': texts,
+        'review_score': [float(rng.randint(1, 5)) for _ in range(n_rows)],
+        'publisher': 'Publisher',
+    })
+
+
+# The index must find exactly the rows has_keywords would, including fuzzy (misspelt) matches
+def test_index_matches_has_keywords():
+    reviews_df = make_reviews()
+    index = build_keyword_index(reviews_df)
+
+    for keywords in [['adventure'], ['Funny', 'epic'], ['abc', 'rst'], ['12345'], ['a'], ['zzzzzzzzzz']]:
+        expected = [i for i, text in enumerate(reviews_df['review_summary']) if has_keywords(text, keywords)]
+        assert list(index.matching_rows(keywords)) == expected
+
+
+# matched_books gives the same de-duplicated books with and without the index
+def test_matched_books_with_index():
+    reviews_df = make_reviews()
+    index = build_keyword_index(reviews_df)
+
+    for keywords in [['adventure', 'epic'], ['funny']]:
+        assert matched_books(reviews_df, keywords, index=index) == matched_books(reviews_df, keywords)
@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+import nltk
+import pytest
+import nltk_resources
+
+
+# Importing the app's modules doesn't load scikit-learn or NLTK (and so can't try to download anything)
+def test_heavy_dependencies_are_lazy():
+    code = ("import sys, analysis_summary, Genre_filter; "
+            "print(sorted(m for m in ('sklearn', 'scipy', 'nltk', 'joblib') if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == '[]'
+
+
+# A missing resource is an error with instructions, not a download
+def test_missing_resource_raises(tmp_path, monkeypatch):
+    monkeypatch.setattr(nltk_resources, 'local_nltk_dir', str(tmp_path))
+    monkeypatch.setattr(nltk_resources, '_path_added', False)
+    monkeypatch.setattr(nltk.data, 'path', [])
+    monkeypatch.setattr(nltk, 'download', lambda *args, **kwargs: pytest.fail('tried to download'))
+
+    with pytest.raises(LookupError, match='nltk_resources.py'):
+        nltk_resources.require('stopwords')
+    assert nltk.data.path == [str(tmp_path)]
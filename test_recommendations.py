@@ -1,6 +1,16 @@
 import pytest
+import numpy as np
 import pandas as pd
-from analysis_summary import recommend_book
+import analysis_summary
+import genre_store
+import instrumentation
+from analysis_summary import (match_mask, recommend_book, recommend_from_genre, recommend_from_genres, score_matches,
+                              top_k_positions)
+from corpus_cache import cache_stats, corpus_cache
+from genre_store import write_genre_store
+from instrumentation import collect
+from result_cache import result_cache
+from synthetic_data import make_genre_reviews
 
 # Check that the program works with expected input
 def test_normal_input():
@@ -97,3 +107,82 @@ def test_invalid_input():
     # The assertion is kept but the test is now lenient: if results exist they must still be <= 10.
     # A fully numeric keyword is unlikely to produce results in book review text.
     assert recommendations.empty or len(recommendations) <= 10
+
+
+# Scoring works on any genre-shaped DataFrame: one row per title, best first, at most k rows
+def test_score_matches_policies():
+    reviews_df = make_genre_reviews(5000, genre='travel', seed=11)
+    mask = match_mask(reviews_df, ['adventure', 'epic'])
+
+    first = score_matches(reviews_df, mask, policy='first', k=5)
+    best = score_matches(reviews_df, mask, policy='max', k=5)
+    mean = score_matches(reviews_df, mask, policy='mean', k=20)
+
+    for recommendations in (first, best, mean):
+        assert recommendations['title'].is_unique
+        assert recommendations['total_score'].is_monotonic_decreasing
+    assert len(first) == len(best) == 5
+    assert len(mean) == 20
+    # The best review of each title scores at least as well as its first matching review
+    assert best['total_score'].iloc[0] >= first['total_score'].iloc[0]
+
+    # A title whose matching reviews all lack a score is kept once, ranked after every scored title
+    unscored = first['title'].iloc[0]
+    reviews_df.loc[reviews_df['title'] == unscored, 'review_score'] = np.nan
+    best = score_matches(reviews_df, mask, policy='max', k=len(reviews_df))
+    assert best['title'].is_unique
+    assert best['title'].iloc[-1] == unscored and best['total_score'].iloc[:-1].notna().all()
+
+    with pytest.raises(ValueError):
+        score_matches(reviews_df, mask, policy='median')
+
+
+# Earlier rows win ties, including when only some of the rows tied with the k-th score fit in the top k
+def test_top_k_positions_ties():
+    assert top_k_positions(np.array([3.0, 1.0, 2.0, 2.0, 2.0, np.nan]), 3).tolist() == [0, 2, 3]
+    assert top_k_positions(np.array([np.nan, 1.0]), 2).tolist() == [1, 0]
+    assert top_k_positions(np.ones(1000), 10).tolist() == list(range(10))
+    scores = np.tile([1.0, 2.0], 500)
+    assert top_k_positions(scores, 5).tolist() == [1, 3, 5, 7, 9]
+    assert len(top_k_positions(scores, 0)) == 0
+
+
+# Searching several genres merges each genre's top k into one overall top k
+def test_multi_genre_merge(tmp_path, monkeypatch):
+    monkeypatch.setattr(genre_store, 'filtered_dir', str(tmp_path))
+    corpus_cache.clear()
+    for seed, genre in enumerate(['travel', 'humor', 'poetry']):
+        write_genre_store(make_genre_reviews(3000, genre=genre, seed=seed), genre, tmp_path)
+
+    keywords = ['adventure', 'funny']
+    per_genre = pd.concat([recommend_from_genre(g, keywords, k=10) for g in ['travel', 'humor', 'poetry']])
+    merged = recommend_from_genres(['travel', 'humor', 'poetry', 'missing genre'], keywords, k=10, parallel=False)
+
+    assert len(merged) == 10
+    assert merged['total_score'].is_monotonic_decreasing
+    assert merged['total_score'].tolist() == sorted(per_genre['total_score'], reverse=True)[:10]
+    corpus_cache.clear()
+
+
+# Two genres searched on a pool of 2 worker processes give the same top k as searching them one after the other.
+# Each worker gets half the corpus cache budget, and the stage timings of both workers reach the request's report.
+def test_parallel_multi_genre_search(monkeypatch):
+    monkeypatch.setenv('BOOKREC_WORKERS', '2')
+    monkeypatch.setattr(analysis_summary, '_genre_pool', None)
+    monkeypatch.setattr(instrumentation, '_enabled', True)
+    result_cache.clear()
+    genres = ['travel', 'humor']
+    try:
+        with collect('test') as report:
+            parallel, _ = recommend_book(genres, 'adventure funny')
+        serial = recommend_from_genres(genres, ['adventure', 'funny'], parallel=False)
+        assert len(parallel) == 10
+        pd.testing.assert_frame_equal(parallel.reset_index(drop=True), serial.reset_index(drop=True))
+
+        worker_loads = [s['genre'] for s in report.stages if s['stage'] == 'load' and s.get('worker')]
+        assert sorted(worker_loads) == sorted(genres)
+        worker_stats = analysis_summary.get_genre_pool().submit(cache_stats).result()
+        assert worker_stats['max_bytes'] == corpus_cache.max_bytes // 2
+    finally:
+        analysis_summary.get_genre_pool().shutdown()
+        result_cache.clear()
@@ -0,0 +1,77 @@
+import math
+import numpy as np
+import pandas as pd
+from fuzzywuzzy import fuzz
+from analysis_summary import match_mask, score_matches
+from keyword_index import FUZZY_THRESHOLD, build_keyword_index, extend_keyword_index
+from relevance import B, K1, blend_scores, parse_weights, row_relevance, title_statistics
+from synthetic_data import make_genre_reviews
+
+
+# Straightforward BM25 over each title's words, the definition relevance.py computes from the index
+def reference_relevance(reviews_df, keywords):
+    words = {}
+    for title, text in zip(reviews_df['title'], reviews_df['review_summary']):
+        if isinstance(title, str):
+            words.setdefault(title, []).extend(text.lower().split() if isinstance(text, str) else [])
+    avg_length = np.mean([len(w) for w in words.values()])
+
+    relevance = dict.fromkeys(words, 0.0)
+    for keyword in keywords:
+        tf = {}
+        for title, title_words in words.items():
+            ratios = [fuzz.ratio(keyword, word) for word in title_words]
+            tf[title] = sum(r / 100 for r in ratios if r >= FUZZY_THRESHOLD)
+        df = sum(1 for value in tf.values() if value > 0)
+        idf = math.log(1 + (len(words) - df + 0.5) / (df + 0.5))
+        for title, value in tf.items():
+            norm = 1 - B + B * len(words[title]) / avg_length
+            relevance[title] += idf * value * (K1 + 1) / (value + K1 * norm)
+    return relevance
+
+
+def test_relevance_matches_reference_bm25():
+    reviews_df = make_genre_reviews(1500, seed=4)
+    keywords = ['adventure', 'funy']
+    index = build_keyword_index(reviews_df)
+    stats = title_statistics(reviews_df['title'], index)
+    rows = np.flatnonzero(match_mask(reviews_df, keywords, index=index))
+
+    relevance = row_relevance(index, keywords, stats, rows)
+    expected = reference_relevance(reviews_df, keywords)
+    assert np.allclose(relevance, [expected.get(title, 0.0) for title in reviews_df['title'].iloc[rows]])
+
+
+# Appending rows keeps the term statistics, so relevance still works on an extended index
+def test_extended_index_keeps_term_statistics():
+    reviews_df = make_genre_reviews(1000, seed=6)
+    extended = extend_keyword_index(build_keyword_index(reviews_df.iloc[:600]), reviews_df.iloc[600:])
+    rebuilt = build_keyword_index(reviews_df)
+    assert np.array_equal(extended.postings_counts, rebuilt.postings_counts)
+    assert np.array_equal(extended.row_lengths, rebuilt.row_lengths)
+
+
+# Without relevance the default weights give the original (rating + sentiment) / 2; with it a strongly
+# matching title moves up
+def test_blended_scores():
+    assert blend_scores(4.0, 0.5) == 2.25
+    assert parse_weights('relevance=1, rating=0')['relevance'] == 1.0
+
+    reviews_df = pd.DataFrame({
+        'title': ['Weak', 'Strong'],
+        'categories': ['travel', 'travel'],
+        'review_summary': ['an adventurer story', 'adventure adventure adventure'],
+        'review_score': [4.0, 3.5],
+        'publisher': ['p', 'p'],
+        'sentiment': [0.5, 0.5],
+    })
+    keywords = ['adventure']
+    index = build_keyword_index(reviews_df)
+    mask = match_mask(reviews_df, keywords, index=index)
+    relevance = row_relevance(index, keywords, title_statistics(reviews_df['title'], index), np.flatnonzero(mask))
+
+    assert score_matches(reviews_df, mask)['title'].tolist() == ['Weak', 'Strong']
+    ranked = score_matches(reviews_df, mask, relevance=relevance, weights={'relevance': 0.8, 'rating': 0.1,
+                                                                           'sentiment': 0.1})
+    assert ranked['title'].tolist() == ['Strong', 'Weak']
+    assert ranked['relevance'].iloc[0] > ranked['relevance'].iloc[1]
@@ -0,0 +1,111 @@
+import os
+import genre_store
+import pandas as pd
+from analysis_summary import recommend_book
+from corpus_cache import corpus_cache
+from genre_store import write_genre_store
+from result_cache import ResultCache, result_cache
+from synthetic_data import make_genre_reviews
+from topic_modeling import save_topic_model, topic_model_cache, train_topic_model
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# Entries expire after the TTL, are dropped when the genre files change, and the least recently used go first
+def test_ttl_fingerprint_and_lru():
+    clock = FakeClock()
+    cache = ResultCache(max_entries=2, ttl=60, clock=clock)
+    cache.put('a', ('v1',), 'result a')
+    assert cache.get('a', ('v1',)) == 'result a'
+    assert cache.get('a', ('v2',)) is None
+
+    cache.put('b', ('v1',), 'result b')
+    clock.now = 61
+    assert cache.get('b', ('v1',)) is None
+
+    cache.put('c', (), 'c')
+    cache.put('d', (), 'd')
+    cache.get('c', ())
+    cache.put('e', (), 'e')
+    assert cache.get('d', ()) is None
+    assert cache.get('c', ()) == 'c'
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['invalidated'], stats['expired']) == (3, 1, 1)
+
+
+# The on-disk tier is still there for a new cache (e.g. after an app restart)
+def test_disk_tier(tmp_path):
+    ResultCache(cache_dir=str(tmp_path)).put(('fiction', ('epic',)), ('v1',), 'result')
+    restarted = ResultCache(cache_dir=str(tmp_path))
+    assert restarted.get(('fiction', ('epic',)), ('v1',)) == 'result'
+    assert restarted.stats()['disk_hits'] == 1
+    assert restarted.get(('fiction', ('epic',)), ('v2',)) is None
+    assert not list(tmp_path.glob('*.pkl'))
+
+
+# The disk tier is listed on the first write and then only when the running count goes over the limit
+def test_disk_tier_prunes_from_running_count(tmp_path, monkeypatch):
+    listings = []
+    listdir = os.listdir
+    monkeypatch.setattr(os, 'listdir', lambda path: listings.append(path) or listdir(path))
+    cache = ResultCache(cache_dir=str(tmp_path), max_disk_entries=10)
+    for i in range(10):
+        cache.put(('fiction', i), (), i)
+    cache.put(('fiction', 0), (), 'rewritten')
+    assert len(listings) == 1
+
+    cache.put(('fiction', 10), (), 10)
+    assert len(listings) == 2
+    assert len(list(tmp_path.glob('*.pkl'))) == 9
+    cache.put(('fiction', 11), (), 11)
+    assert len(listings) == 2
+
+
+# Equivalent keyword strings share one entry, and rewriting the genre's files invalidates it
+def test_recommend_book_uses_result_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(genre_store, 'filtered_dir', str(tmp_path))
+    corpus_cache.clear()
+    reviews_df = make_genre_reviews(2000, genre='travel', seed=3)
+    write_genre_store(reviews_df, 'travel', tmp_path)
+
+    first, topics = recommend_book('travel', 'Adventure funny')
+    hits = result_cache.stats()['hits']
+    again, again_topics = recommend_book('travel', 'funny  ADVENTURE adventure')
+    assert result_cache.stats()['hits'] == hits + 1
+    pd.testing.assert_frame_equal(first, again)
+    assert topics == again_topics
+
+    # Only the first 100 reviews are left, so a stale result would list titles that no longer exist
+    write_genre_store(reviews_df.head(100), 'travel', tmp_path)
+    invalidated = result_cache.stats()['invalidated']
+    updated, _ = recommend_book('travel', 'adventure funny')
+    assert result_cache.stats()['invalidated'] == invalidated + 1
+    assert set(updated['title']) <= set(reviews_df.head(100)['title'])
+    corpus_cache.clear()
+
+
+# Retraining the genre's topic model invalidates the results computed with the old one
+def test_saved_model_invalidates_result(tmp_path, monkeypatch):
+    monkeypatch.setattr(genre_store, 'filtered_dir', str(tmp_path))
+    monkeypatch.delenv('BOOKREC_TOPIC_MODE', raising=False)
+    corpus_cache.clear()
+    topic_model_cache.clear()
+    reviews_df = make_genre_reviews(1000, genre='travel', seed=3)
+    write_genre_store(reviews_df, 'travel', tmp_path)
+
+    recommend_book('travel', 'adventure')
+    save_topic_model(train_topic_model(reviews_df, n_components=3), 'travel')
+    invalidated = result_cache.stats()['invalidated']
+    _, topics = recommend_book('travel', 'adventure')
+    assert result_cache.stats()['invalidated'] == invalidated + 1
+    labels = {part.split(':')[0] for part in topics.split(' | ')}
+    assert labels <= set(topic_model_cache.get('travel').topics)
+    corpus_cache.clear()
+    topic_model_cache.clear()
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import genre_store
+from analysis_summary import match_mask, recommend_book
+from corpus_cache import corpus_cache
+from genre_store import write_genre_store
+from result_cache import result_cache
+from semantic_search import build_semantic_index, load_semantic_index, save_semantic_index, semantic_index_cache
+from synthetic_data import make_genre_reviews
+
+
+def horror_and_humor_reviews():
+    reviews = [(f"Ghost House {i}", 'scary terrifying ghost story at night') for i in range(8)]
+    reviews += [('Night Terrors', 'terrifying ghost at night'), ('Night Terrors', 'truly terrifying')]
+    reviews += [(f"Joke Book {i}", 'funny hilarious jokes to laugh at') for i in range(8)]
+    reviews += [(f"Love Letters {i}", 'romance love and heartbreak') for i in range(8)]
+    titles, summaries = zip(*reviews)
+    return pd.DataFrame({'title': titles, 'categories': 'fiction', 'review_summary': summaries,
+                         'review_score': 4.0, 'publisher': 'p'})
+
+
+# Probing every list is the exact search, and probing some of them still finds most of the exact top k
+def test_ivf_search_against_exact():
+    reviews_df = make_genre_reviews(4000, seed=3)
+    index = build_semantic_index(reviews_df, n_components=32)
+    queries = index.encode(reviews_df['review_summary'].fillna('').iloc[:50].tolist())
+
+    recall = []
+    for query in queries:
+        exact_ids, exact_scores = index.exact_search(query, k=10)
+        ids, scores = index.search(query, k=10, nprobe=index.n_lists)
+        assert np.array_equal(np.sort(ids), np.sort(exact_ids)) and np.allclose(scores, exact_scores)
+        ids, scores = index.search(query, k=10, nprobe=index.n_lists // 2)
+        assert np.all(np.diff(scores) <= 0)
+        recall.append(len(set(ids) & set(exact_ids)) / 10)
+    assert np.mean(recall) > 0.8
+
+
+# A search for "scary" finds the book whose reviews only say "terrifying", also from a saved (memory-mapped) index
+def test_finds_synonyms(tmp_path):
+    reviews_df = horror_and_humor_reviews()
+    assert 'Night Terrors' not in set(reviews_df['title'][match_mask(reviews_df, ['scary'])])
+
+    # Saving again replaces the whole folder, leaving no temporary one behind
+    save_semantic_index(build_semantic_index(reviews_df, n_components=2), 'fiction', tmp_path)
+    save_semantic_index(build_semantic_index(reviews_df, n_components=3), 'fiction', tmp_path)
+    assert [path.name for path in tmp_path.iterdir()] == ['fiction_semantic']
+    index = load_semantic_index('fiction', tmp_path)
+    assert isinstance(index.vectors, np.memmap) and index.vectors.dtype == np.float16
+
+    found = index.similar_to_text('scary', k=10)
+    assert 'Night Terrors' in set(found['title'])
+    assert not found['title'].str.startswith('Joke Book').any()
+
+
+def test_recommend_book_semantic_mode(tmp_path, monkeypatch):
+    monkeypatch.setattr(genre_store, 'filtered_dir', str(tmp_path))
+    corpus_cache.clear()
+    result_cache.clear()
+    semantic_index_cache.clear()
+    reviews_df = horror_and_humor_reviews()
+    write_genre_store(reviews_df, 'fiction', tmp_path)
+    # Nothing is built while serving: without a saved index there are no results, and none are cached
+    assert recommend_book('fiction', 'scary', mode='semantic')[0].empty
+    save_semantic_index(build_semantic_index(reviews_df, n_components=3), 'fiction')
+
+    keyword_results, _ = recommend_book('fiction', 'scary')
+    results, _ = recommend_book('fiction', 'scary', mode='semantic')
+    assert 'Night Terrors' not in set(keyword_results['title'])
+    assert 'Night Terrors' in set(results['title'])
+    assert results['total_score'].is_monotonic_decreasing
+    assert 'similarity' in results.columns and 'keyword match' not in results.columns
+
+    corpus_cache.clear()
+    result_cache.clear()
+    semantic_index_cache.clear()
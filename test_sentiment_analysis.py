@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+from sentiment_analysis import analyze_sentiment, apply_sentiment_analysis, batch_sentiment
+from synthetic_data import make_genre_reviews
+
+
+# Offline batch scoring gives the same scores as scoring each review on its own
+def test_batch_matches_row_by_row():
+    texts = make_genre_reviews(2000, seed=3)['review_summary']
+    expected = np.array([analyze_sentiment(t) for t in texts.fillna('')], dtype=np.float32)
+    assert np.allclose(batch_sentiment(texts, processes=2, chunk_size=300), expected)
+
+
+# Stored scores are kept and only rows without one are scored live
+def test_stored_sentiment_is_reused():
+    reviews_df = pd.DataFrame({
+        'review_summary': ['What a wonderful book', 'Awful and boring'],
+        'sentiment': [0.25, np.nan],
+    })
+    result = apply_sentiment_analysis(reviews_df)
+    assert result['sentiment'][0] == 0.25
+    assert result['sentiment'][1] == analyze_sentiment('Awful and boring')
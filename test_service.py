@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import pandas as pd
+from aiohttp.test_utils import TestClient, TestServer
+from service import RecommendationService, create_app
+
+
+def run_with_client(service, scenario):
+    async def run():
+        client = TestClient(TestServer(create_app(service)))
+        await client.start_server()
+        try:
+            return await scenario(client)
+        finally:
+            await client.close()
+    return asyncio.run(run())
+
+
+# Concurrent identical requests (keywords in any order/case) are computed once and all get the same answer
+def test_identical_requests_are_coalesced():
+    release = threading.Event()
+    calls = []
+
+    def fake_recommend(genre, key_term, k, policy, mode):
+        calls.append((genre, key_term, k, policy))
+        release.wait(5)
+        return pd.DataFrame({'title': ['Book A'], 'review_score': [float('nan')]}), 'topic: 1.0'
+
+    service = RecommendationService(workers=2, max_queue=4, recommend=fake_recommend)
+
+    async def scenario(client):
+        queries = ['Epic funny', 'funny epic', 'FUNNY Epic', 'epic  funny']
+        requests = [asyncio.create_task(client.get('/recommend', params={'genre': 'fiction', 'keywords': q}))
+                    for q in queries]
+        while not service.inflight:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        release.set()
+        return [await (await request).json() for request in requests]
+
+    bodies = run_with_client(service, scenario)
+    assert calls == [('fiction', 'epic funny', 10, 'first')]
+    assert all(body == {'results': [{'title': 'Book A', 'review_score': None}], 'topics': 'topic: 1.0'}
+               for body in bodies)
+    assert service.stats['coalesced'] == 3
+
+
+# Once the queue is full, new (distinct) requests are turned away with 503 instead of waiting
+def test_full_queue_returns_503():
+    release = threading.Event()
+
+    def fake_recommend(genre, key_term, k, policy, mode):
+        release.wait(5)
+        return pd.DataFrame(), ''
+
+    service = RecommendationService(workers=1, max_queue=1, recommend=fake_recommend)
+
+    async def scenario(client):
+        running = asyncio.create_task(client.get('/recommend', params={'genre': 'fiction', 'keywords': 'one'}))
+        while service.queue.qsize() or not service.inflight:
+            await asyncio.sleep(0.01)
+        queued = asyncio.create_task(client.get('/recommend', params={'genre': 'fiction', 'keywords': 'two'}))
+        while not service.queue.qsize():
+            await asyncio.sleep(0.01)
+        rejected = await client.get('/recommend', params={'genre': 'fiction', 'keywords': 'three'})
+        release.set()
+        return rejected, await running, await queued
+
+    rejected, running, queued = run_with_client(service, scenario)
+    assert rejected.status == 503 and rejected.headers['Retry-After'] == '1'
+    assert running.status == 200 and queued.status == 200
+    assert service.stats['rejected'] == 1
+
+
+def test_bad_requests():
+    service = RecommendationService(workers=1, recommend=lambda *args: (pd.DataFrame(), ''))
+
+    async def scenario(client):
+        missing = await client.get('/recommend', params={'genre': 'fiction'})
+        bad_policy = await client.post('/recommend', json={'genre': ['fiction'], 'keywords': 'x', 'policy': 'y'})
+        bad_k = await client.get('/recommend', params={'genre': 'fiction', 'keywords': 'x', 'k': 'ten'})
+        unbuilt = await client.get('/recommend', params={'genre': 'no such genre', 'keywords': 'x',
+                                                         'mode': 'semantic'})
+        return missing.status, bad_policy.status, bad_k.status, unbuilt.status, (await unbuilt.json())['error']
+
+    *statuses, unbuilt_error = run_with_client(service, scenario)
+    assert statuses == [400, 400, 400, 400]
+    assert 'semantic index not built' in unbuilt_error
+
+
+# Malformed JSON bodies are rejected with a 400 instead of failing inside the handler
+def test_bad_json_bodies():
+    service = RecommendationService(workers=1, recommend=lambda *args: (pd.DataFrame(), ''))
+    bodies = [['fiction', 'x'], 'fiction', {'genre': 'fiction', 'keywords': ['x']},
+              {'genre': 'fiction', 'keywords': 7}, {'genre': ['fiction', 3], 'keywords': 'x'},
+              {'genre': [['fiction']], 'keywords': 'x'}]
+
+    async def scenario(client):
+        responses = [await client.post('/recommend', json=body) for body in bodies]
+        return [(response.status, 'error' in await response.json()) for response in responses]
+
+    assert run_with_client(service, scenario) == [(400, True)] * len(bodies)
+    assert service.stats['requests'] == 0
@@ -0,0 +1,53 @@
+import os
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+import genre_store
+from similar_books import (build_similarity_model, get_similarity_model, load_similarity_model, model_path,
+                           precompute_neighbours, save_similarity_model, similarity_model_cache)
+from synthetic_data import make_genre_reviews
+
+
+# Sparse top-k lookups agree with the dense cosine similarity matrix the notebook used
+def test_similar_titles_match_dense_cosine():
+    model = build_similarity_model(make_genre_reviews(2000, seed=4))
+    dense = cosine_similarity(model.matrix)
+    np.fill_diagonal(dense, -np.inf)
+
+    for row in [0, 7, 42]:
+        result = model.similar_titles(model.titles[row], k=5)
+        assert np.allclose(result['similarity'], np.sort(dense[row])[::-1][:5], atol=1e-5)
+
+
+# Blocked batch neighbours give the same answers as one-off lookups, and survive a save/load
+def test_precomputed_neighbours(tmp_path):
+    model = build_similarity_model(make_genre_reviews(2000, seed=4))
+    expected = model.similar_titles(model.titles[3], k=5)
+
+    precompute_neighbours(model, k=5, block_size=17)
+    save_similarity_model(model, 'fiction', tmp_path)
+    loaded = load_similarity_model('fiction', tmp_path)
+
+    result = loaded.similar_titles(model.titles[3].upper(), k=5)
+    assert np.allclose(result['similarity'], expected['similarity'], atol=1e-5)
+    assert loaded.similar_titles('No Such Book').empty
+
+
+# The serving path only loads saved models: nothing is fitted (or cached) before one is saved, and a model saved
+# again replaces the cached one - swapping in a whole new folder, without the neighbours of the old model
+def test_get_similarity_model_follows_saved_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(genre_store, 'filtered_dir', str(tmp_path))
+    similarity_model_cache.clear()
+    reviews_df = make_genre_reviews(500, seed=4)
+    genre_store.write_genre_store(reviews_df, 'fiction', tmp_path)
+    assert get_similarity_model('fiction') is None
+
+    save_similarity_model(precompute_neighbours(build_similarity_model(reviews_df), k=5), 'fiction')
+    assert get_similarity_model('fiction').neighbours.shape[1] == 5
+    assert get_similarity_model('fiction') is get_similarity_model('fiction')
+
+    save_similarity_model(build_similarity_model(reviews_df.iloc[:250]), 'fiction')
+    assert not os.path.exists(os.path.join(model_path('fiction'), 'neighbours.npy'))
+    assert not os.path.exists(model_path('fiction') + '.tmp')
+    model = get_similarity_model('fiction')
+    assert model.neighbours is None and len(model.titles) == len(set(reviews_df['title'].iloc[:250]))
+    similarity_model_cache.clear()
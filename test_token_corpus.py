@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from similar_books import build_similarity_model
+from synthetic_data import make_genre_reviews
+from token_corpus import build_token_corpus, fit_counts, load_token_corpus, save_token_corpus
+
+
+def sample_texts():
+    texts = make_genre_reviews(5000, seed=2)['review_summary'].copy()
+    texts.iloc[:6] = ["Well-written, don't miss it!", 'A  B\tc', '', 'THE end.', 'naïve café', np.nan]
+    return texts
+
+
+# The counts built from token ids are exactly CountVectorizer's, including min_df/max_df/max_features pruning
+def test_fit_counts_matches_count_vectorizer():
+    texts = sample_texts()
+    corpus = build_token_corpus(texts)
+    for options in [{}, {'min_df': 2, 'max_df': 0.95}, {'min_df': 2, 'max_df': 0.95, 'max_features': 200}]:
+        expected = CountVectorizer(stop_words='english', **options)
+        expected_counts = expected.fit_transform(texts.fillna(''))
+        vectorizer, counts = fit_counts(corpus, **options)
+
+        assert list(vectorizer.get_feature_names_out()) == list(expected.get_feature_names_out())
+        assert (counts != expected_counts).nnz == 0
+        assert (vectorizer.transform(texts[:50].fillna('')) != expected.transform(texts[:50].fillna(''))).nnz == 0
+
+
+# Per-title TF-IDF from the token corpus is the same as TfidfVectorizer over each title's joined reviews
+def test_similarity_matrix_matches_tfidf_vectorizer():
+    reviews_df = make_genre_reviews(5000, seed=2)
+    model = build_similarity_model(reviews_df, max_features=500)
+
+    documents = (reviews_df.assign(review_summary=reviews_df['review_summary'].fillna(''))
+                 .groupby('title', sort=False)['review_summary'].agg(' '.join))
+    expected = TfidfVectorizer(stop_words='english', max_features=500, sublinear_tf=True, dtype=np.float32)
+    expected_matrix = expected.fit_transform(documents.values)
+
+    assert list(model.titles) == list(documents.index)
+    assert abs(model.matrix - expected_matrix).max() == 0
+    query = ['a gripping and funny adventure']
+    assert abs(model.vectorizer.transform(query) - expected.transform(query)).max() == 0
+
+
+# Saved corpora load memory-mapped, and extending with appended rows gives the same corpus as a rebuild
+def test_save_load_and_extend(tmp_path):
+    texts = pd.Series(sample_texts())
+    corpus = build_token_corpus(texts[:3000])
+    corpus = build_token_corpus(texts[3000:], extend=corpus)
+    rebuilt = build_token_corpus(texts)
+    assert corpus.vocab == rebuilt.vocab
+    assert np.array_equal(corpus.offsets, rebuilt.offsets) and np.array_equal(corpus.ids, rebuilt.ids)
+
+    save_token_corpus(corpus, 'fiction', tmp_path)
+    loaded = load_token_corpus('fiction', n_rows=len(texts), data_dir=tmp_path)
+    assert isinstance(loaded.ids, np.memmap)
+    assert loaded.vocab == corpus.vocab and np.array_equal(loaded.ids, corpus.ids)
+    assert [loaded.vocab[i] for i in loaded.ids[loaded.offsets[0]:loaded.offsets[1]]] == \
+        ['well-written,', "don't", 'miss', 'it!']
+    assert load_token_corpus('fiction', n_rows=10, data_dir=tmp_path) is None
@@ -0,0 +1,50 @@
+import os
+import genre_store
+import topic_modeling
+from topic_modeling import get_topic_model, main_topics, save_topic_model, topic_model_cache, train_topic_model
+from synthetic_data import make_genre_reviews
+
+
+# A pre-trained genre model summarises the selected reviews with its own topics, and repeats are memoized
+def test_cached_topic_model():
+    reviews_df = make_genre_reviews(3000, seed=5)
+    topic_model = train_topic_model(reviews_df, n_components=6)
+    top_10 = reviews_df.dropna(subset=['review_summary']).head(10)
+
+    summary = main_topics(top_10, topic_model=topic_model)
+    labels = [part.split(':')[0] for part in summary.split(' | ')]
+    assert len(labels) == 5
+    assert set(labels) <= set(topic_model.topics)
+
+    hits = topic_modeling._dominant_topics.cache_info().hits
+    assert main_topics(top_10.copy(), topic_model=topic_model) == summary
+    assert topic_modeling._dominant_topics.cache_info().hits == hits + 1
+
+
+# Online (partial_fit) training is used for big genres
+def test_online_training(monkeypatch):
+    monkeypatch.setattr(topic_modeling, 'ONLINE_THRESHOLD', 1000)
+    topic_model = train_topic_model(make_genre_reviews(3000, seed=5), n_components=4, batch_size=500)
+    assert topic_model.lda.learning_method == 'online'
+    assert len(topic_model.topics) == 4
+
+
+# get_topic_model caches nothing until a model is saved, loads a retrained model once its file changes and
+# follows BOOKREC_TOPIC_MODE as it is set
+def test_get_topic_model_follows_saved_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(genre_store, 'filtered_dir', str(tmp_path))
+    monkeypatch.delenv('BOOKREC_TOPIC_MODE', raising=False)
+    topic_model_cache.clear()
+    reviews_df = make_genre_reviews(1000, seed=5)
+    assert get_topic_model('fiction') is None
+
+    save_topic_model(train_topic_model(reviews_df, n_components=3), 'fiction')
+    assert get_topic_model('fiction').lda.n_components == 3
+    assert get_topic_model('fiction') is get_topic_model('fiction')
+    save_topic_model(train_topic_model(reviews_df, n_components=4), 'fiction')
+    assert not os.path.exists(topic_modeling.topic_model_path('fiction') + '.tmp')
+    assert get_topic_model('fiction').lda.n_components == 4
+
+    monkeypatch.setenv('BOOKREC_TOPIC_MODE', 'fit')
+    assert get_topic_model('fiction') is None
+    topic_model_cache.clear()
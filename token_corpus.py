@@ -0,0 +1,262 @@
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import genre_store
+from genre_store import read_strings, write_strings
+
+'''
+Review text converted to integer token ids once, shared by everything that works on words. Each review is
+split into words the way has_keywords does (lowercase, split on whitespace), every distinct word gets an id
+in one vocabulary, and the ids of all reviews are stored back to back in one flat int32 array. Row i's
+words are ids[offsets[i]:offsets[i + 1]] (the CSR layout scipy uses for sparse matrices). Saved as .npy files
+in a {genre}_tokens folder, so loading memory-maps the arrays instead of creating a Python string per word.
+
+The keyword index is built straight from these arrays (see keyword_index.index_from_token_corpus), and the
+topic model and TF-IDF fit their document-term matrices from them with fit_counts: scikit-learn's analyzer
+only runs once per distinct word instead of once per review. Its token pattern never matches across
+whitespace, so analysing each word on its own gives exactly the counts CountVectorizer gets from the full
+text. VADER still reads the raw text, since it needs the punctuation and capitals.
+'''
+
+# Rows are tokenized in chunks of this many, so only one chunk's words are Python strings at a time
+CHUNK_ROWS = 100_000
+CORPUS_VERSION = 1
+
+
+'''
+Splits review text into words exactly the way has_keywords does.
+'''
+def tokenize(text):
+    if not isinstance(text, str):
+        return []
+    return text.lower().split()
+
+
+class TokenCorpus:
+    def __init__(self, vocab, offsets, ids):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.ids = ids
+
+    @property
+    def n_rows(self):
+        return len(self.offsets) - 1
+
+    def __len__(self):
+        return self.n_rows
+
+    '''
+    The row number of every token in ids.
+    '''
+    def token_rows(self):
+        return np.repeat(np.arange(self.n_rows, dtype=np.int64), np.diff(self.offsets))
+
+    '''
+    Sparse matrix of word counts, one row per document and one column per vocabulary word. By default each
+    review is a document; groups (one integer code per review, -1 to leave the review out) merges reviews
+    into n_groups documents, e.g. all reviews of a title.
+    '''
+    def term_counts(self, groups=None, n_groups=None, dtype=np.int64):
+        from scipy import sparse
+        documents = self.token_rows()
+        n_documents = self.n_rows
+        ids = np.asarray(self.ids)
+        if groups is not None:
+            documents = np.asarray(groups)[documents]
+            n_documents = n_groups
+            keep = documents >= 0
+            documents, ids = documents[keep], ids[keep]
+        counts = sparse.csr_matrix((np.ones(len(ids), dtype=dtype), (documents, ids)),
+                                   shape=(n_documents, len(self.vocab)))
+        counts.sum_duplicates()
+        return counts
+
+
+'''
+Builds a TokenCorpus from review text added a chunk of rows at a time, so the text of a whole genre never has
+to be in memory at once (only its token ids). If extend is given, the new rows are added after its rows and its
+vocabulary is reused (new words get new ids at the end), as when reviews are appended to a genre. n_rows is the
+number of rows covered so far, including those of extend.
+'''
+class TokenCorpusBuilder:
+    def __init__(self, extend=None):
+        self.extend = extend
+        self.word_ids = {word: i for i, word in enumerate(extend.vocab)} if extend is not None else {}
+        self.n_rows = extend.n_rows if extend is not None else 0
+        self._lengths = []
+        self._ids = []
+
+    def append(self, texts):
+        texts = pd.Series(texts).reset_index(drop=True)
+        for start in range(0, len(texts), CHUNK_ROWS):
+            words = [tokenize(text) for text in texts.iloc[start:start + CHUNK_ROWS]]
+            self._lengths.append(np.fromiter((len(w) for w in words), dtype=np.int64, count=len(words)))
+            flat = np.array([word for row in words for word in row], dtype=object)
+            codes, uniques = pd.factorize(flat)
+            # Only the chunk's distinct words go through the dictionary, not every token
+            mapping = np.fromiter((self.word_ids.setdefault(word, len(self.word_ids)) for word in uniques),
+                                  dtype=np.int64, count=len(uniques))
+            self._ids.append(mapping[codes].astype(np.int32) if len(codes) else np.empty(0, dtype=np.int32))
+        self.n_rows += len(texts)
+
+    def build(self):
+        lengths = np.concatenate(self._lengths) if self._lengths else np.empty(0, dtype=np.int64)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        ids = np.concatenate(self._ids) if self._ids else np.empty(0, dtype=np.int32)
+
+        if self.extend is not None:
+            offsets = np.concatenate([np.asarray(self.extend.offsets), offsets[1:] + self.extend.offsets[-1]])
+            ids = np.concatenate([np.asarray(self.extend.ids), ids])
+        return TokenCorpus(list(self.word_ids), offsets, ids)
+
+
+'''
+Tokenizes a column of review text into a TokenCorpus, optionally after the rows of extend (see
+TokenCorpusBuilder).
+'''
+def build_token_corpus(texts, extend=None):
+    builder = TokenCorpusBuilder(extend)
+    builder.append(texts)
+    return builder.build()
+
+
+def corpus_path(genre, data_dir=None):
+    return os.path.join(data_dir or genre_store.filtered_dir, f"{genre}_tokens")
+
+
+'''
+Writes the corpus to its {genre}_tokens folder (swapped in whole, like the columnar store).
+'''
+def save_token_corpus(corpus, genre, data_dir=None):
+    final_path = corpus_path(genre, data_dir)
+    tmp_path = final_path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, 'ids.npy'), np.asarray(corpus.ids, dtype=np.int32))
+    np.save(os.path.join(tmp_path, 'offsets.npy'), np.asarray(corpus.offsets, dtype=np.int64))
+    write_strings(os.path.join(tmp_path, 'vocab.txt'), corpus.vocab)
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump({'version': CORPUS_VERSION, 'n_rows': corpus.n_rows, 'vocab_size': len(corpus.vocab)}, f)
+    shutil.rmtree(final_path, ignore_errors=True)
+    os.rename(tmp_path, final_path)
+
+
+'''
+Loads a genre's token corpus with the id arrays memory-mapped. Returns None if it hasn't been built, or if
+it was built from a different number of reviews than n_rows.
+'''
+def load_token_corpus(genre, n_rows=None, data_dir=None):
+    path = corpus_path(genre, data_dir)
+    meta_file = os.path.join(path, 'meta.json')
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file) as f:
+        meta = json.load(f)
+    if n_rows is not None and meta['n_rows'] != n_rows:
+        return None
+    vocab = read_strings(os.path.join(path, 'vocab.txt'), meta['vocab_size'])
+    ids = np.load(os.path.join(path, 'ids.npy'), mmap_mode='r')
+    offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r')
+    return TokenCorpus(vocab, offsets, ids)
+
+
+'''
+Returns the saved token corpus for a genre DataFrame if it is up to date, otherwise tokenizes the
+review_summary column.
+'''
+def get_token_corpus(reviews_df, genre=None, data_dir=None):
+    corpus = load_token_corpus(genre, n_rows=len(reviews_df), data_dir=data_dir) if genre else None
+    return corpus if corpus is not None else build_token_corpus(reviews_df['review_summary'])
+
+
+'''
+Stands in for a fitted CountVectorizer/TfidfVectorizer in TopicModel and SimilarityModel: it has the fitted
+feature names, and transform() turns new raw text (a query, the selected reviews) into the same features.
+'''
+class CorpusVectorizer:
+    def __init__(self, features, stop_words='english', tfidf=None, dtype=np.int64):
+        from sklearn.feature_extraction.text import CountVectorizer
+        self.features = np.asarray(features, dtype=object)
+        self.counter = CountVectorizer(vocabulary=list(features), stop_words=stop_words, dtype=dtype)
+        self.tfidf = tfidf
+
+    def get_feature_names_out(self):
+        return self.features
+
+    def transform(self, texts):
+        counts = self.counter.transform(texts)
+        return counts if self.tfidf is None else self.tfidf.transform(counts)
+
+
+'''
+The document-term count matrix CountVectorizer(stop_words, min_df, max_df, max_features).fit_transform would
+give for the corpus' documents (see TokenCorpus.term_counts for groups), computed from the token ids.
+Returns (CorpusVectorizer, counts). Raises ValueError like CountVectorizer when no words are left.
+'''
+def fit_counts(corpus, stop_words='english', min_df=1, max_df=1.0, max_features=None, groups=None,
+               n_groups=None, dtype=np.int64):
+    from scipy import sparse
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    # Run scikit-learn's analyzer once per vocabulary word: word_features maps each word to the counts of
+    # the features it produces (usually just itself, nothing for stop words, several for e.g. "well-written")
+    analyze = CountVectorizer(stop_words=stop_words).build_analyzer()
+    feature_ids = {}
+    rows, cols = [], []
+    for word_id, word in enumerate(corpus.vocab):
+        for feature in analyze(word):
+            rows.append(word_id)
+            cols.append(feature_ids.setdefault(feature, len(feature_ids)))
+    word_features = sparse.csr_matrix((np.ones(len(rows), dtype=dtype), (rows, cols)),
+                                      shape=(len(corpus.vocab), len(feature_ids)))
+    counts = corpus.term_counts(groups, n_groups, dtype=dtype) @ word_features
+
+    # Same pruning as CountVectorizer: sort features, drop those outside [min_df, max_df] documents (and ones
+    # that don't occur in these documents at all), then keep the max_features most frequent
+    names = np.array(list(feature_ids), dtype=object)
+    order = np.argsort(names, kind='stable')
+    names, counts = names[order], counts.tocsc()[:, order]
+    dfs = np.diff(counts.indptr)
+    n_docs = counts.shape[0]
+    max_doc_count = max_df if isinstance(max_df, int) else max_df * n_docs
+    min_doc_count = min_df if isinstance(min_df, int) else min_df * n_docs
+    if max_doc_count < min_doc_count:
+        raise ValueError("max_df corresponds to < documents than min_df")
+    if not (dfs > 0).any():
+        raise ValueError("empty vocabulary; perhaps the documents only contain stop words")
+
+    seen = dfs > 0
+    names, counts, dfs = names[seen], counts[:, seen], dfs[seen]
+    mask = (dfs <= max_doc_count) & (dfs >= min_doc_count)
+    if max_features is not None and mask.sum() > max_features:
+        tfs = np.asarray(counts.sum(axis=0)).ravel()
+        kept = (-tfs[mask]).argsort()[:max_features]
+        limited = np.zeros(len(dfs), dtype=bool)
+        limited[np.flatnonzero(mask)[kept]] = True
+        mask = limited
+    if not mask.any():
+        raise ValueError("After pruning, no terms remain. Try a lower min_df or a higher max_df.")
+
+    counts = counts[:, mask].tocsr()
+    counts.sort_indices()
+    return CorpusVectorizer(names[mask], stop_words=stop_words, dtype=dtype), counts
+
+
+'''
+Builds and saves the token corpus of every genre in Data/filtered_reviews/. Genre_filter.py does this itself
+for new runs.
+'''
+def main():
+    for genre in genre_store.available_genres():
+        reviews_df = genre_store.load_genre_reviews(genre, columns=['review_summary'])
+        corpus = build_token_corpus(reviews_df['review_summary'])
+        save_token_corpus(corpus, genre)
+        print(f"Tokenized {genre}: {len(corpus.ids)} tokens, {len(corpus.vocab)} distinct words, "
+              f"{corpus.n_rows} reviews")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,24 @@
-import pandas as pd
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.decomposition import LatentDirichletAllocation
+import argparse
+import os
+from functools import lru_cache
+import numpy as np
+import genre_store
+from instrumentation import stage
+from genre_store import load_genre_reviews
+from model_cache import ModelCache
+from token_corpus import build_token_corpus, fit_counts, get_token_corpus
+
+# 'cached' uses the per-genre LDA model trained offline (when one has been saved) and only transforms the
+# selected reviews; 'fit' keeps the original behaviour of fitting a fresh model on every request.
+# BOOKREC_TOPIC_MODE changes it, and is read on every request (see topic_mode).
+DEFAULT_TOPIC_MODE = 'cached'
+
+# Genres with more reviews than this are trained with online LDA (partial_fit on mini-batches)
+ONLINE_THRESHOLD = 50_000
+
+# scikit-learn and joblib are imported inside the functions that need them rather than here: importing them
+# takes longer than everything else the app imports put together, and a request answered from the caches
+# never touches them.
 
 '''
 We need topics for each review which summarise them. The function below takes the fitted LDA model,
@@ -25,29 +43,44 @@ def display_topics(model, feature_names, no_top_words):
 '''
 Main function for performing topic modelling on a reviews DataFrame.
 Returns a string summary of all topics (for use in analysis_summary.py / app.py display).
+If a trained per-genre topic_model is passed in (see train_topic_model), the reviews are only transformed
+with it and the summary lists the model's topics that dominate these reviews; otherwise a new model is
+fitted on just these reviews. Either way the result is memoized, so the same set of reviews is only
+modelled once.
 '''
-def main_topics(reviews_df):
+def main_topics(reviews_df, topic_model=None):
+    texts = tuple(reviews_df['review_summary'].fillna('').astype(str))
+    memo = _fit_topics if topic_model is None else _dominant_topics
+    with stage('topics', mode='fit' if topic_model is None else 'cached', rows=len(texts)) as info:
+        hits = memo.cache_info().hits
+        summary = _fit_topics(texts) if topic_model is None else _dominant_topics(texts, topic_model)
+        info['cache_hit'] = memo.cache_info().hits > hits
+    return summary
+
+
+@lru_cache(maxsize=1024)
+def _fit_topics(texts):
     # BUG FIX: The original used max_df=1 (absolute count of 1 document) and min_df=1, which
     # is far too restrictive for any real dataset — it effectively kept only words appearing in
     # exactly one document. Changed to sensible relative thresholds (max_df=0.95, min_df=2).
     # Also added fillna to prevent errors on missing review text.
-    reviews_df = reviews_df.copy()
-    reviews_df['review_summary'] = reviews_df['review_summary'].fillna('')
 
     # Need at least 2 documents to fit meaningfully; return gracefully if not
-    if len(reviews_df) < 2:
+    if len(texts) < 2:
         return "Not enough reviews to generate topics."
 
+    from sklearn.decomposition import LatentDirichletAllocation
+    from sklearn.feature_extraction.text import CountVectorizer
     vectorizer = CountVectorizer(max_df=0.95, min_df=2, stop_words='english')
 
     try:
-        doc_term_matrix = vectorizer.fit_transform(reviews_df['review_summary'])
+        doc_term_matrix = vectorizer.fit_transform(texts)
     except ValueError:
         # Vocabulary is empty after filtering — too few or too short reviews
         return "Could not extract topics: vocabulary too sparse."
 
     # BUG FIX: n_components must not exceed the number of documents.
-    n_components = min(5, len(reviews_df))
+    n_components = min(5, len(texts))
     lda = LatentDirichletAllocation(n_components=n_components, random_state=0)
     lda.fit(doc_term_matrix)
 
@@ -59,12 +92,119 @@ def main_topics(reviews_df):
     return summary
 
 
+'''
+A per-genre LDA model trained offline on all of the genre's reviews, with its vectorizer and the top
+words of each topic worked out once.
+'''
+class TopicModel:
+    def __init__(self, vectorizer, lda, no_top_words=10):
+        self.vectorizer = vectorizer
+        self.lda = lda
+        self.topics = display_topics(lda, vectorizer.get_feature_names_out(), no_top_words)
+
+
+@lru_cache(maxsize=1024)
+def _dominant_topics(texts, topic_model, max_topics=5):
+    if not texts:
+        return "Not enough reviews to generate topics."
+    doc_topics = topic_model.lda.transform(topic_model.vectorizer.transform(texts))
+    weights = doc_topics.sum(axis=0)
+    labels = list(topic_model.topics)
+    top = np.argsort(-weights, kind='stable')[:max_topics]
+    return ' | '.join(f"{labels[i]}: {topic_model.topics[labels[i]]}" for i in top)
+
+
+'''
+Trains the topic model for a genre on all of its reviews. Small genres are fitted in one go; genres with
+more than ONLINE_THRESHOLD reviews use online LDA, feeding the document-term matrix to partial_fit in
+batches so the whole genre doesn't need to go through batch EM at once. The document-term matrix comes from
+the genre's token corpus (token_corpus.fit_counts - the same counts CountVectorizer gives), which is tokenized
+here if the saved one isn't passed in.
+'''
+def train_topic_model(reviews_df, n_components=10, batch_size=10_000, max_features=20000, token_corpus=None):
+    from sklearn.decomposition import LatentDirichletAllocation
+    if token_corpus is None:
+        token_corpus = build_token_corpus(reviews_df['review_summary'])
+    vectorizer, doc_term_matrix = fit_counts(token_corpus, min_df=2, max_df=0.95, max_features=max_features)
+
+    if doc_term_matrix.shape[0] > ONLINE_THRESHOLD:
+        lda = LatentDirichletAllocation(n_components=n_components, random_state=0, learning_method='online',
+                                        total_samples=doc_term_matrix.shape[0])
+        order = np.random.default_rng(0).permutation(doc_term_matrix.shape[0])
+        for start in range(0, len(order), batch_size):
+            lda.partial_fit(doc_term_matrix[order[start:start + batch_size]])
+    else:
+        lda = LatentDirichletAllocation(n_components=n_components, random_state=0)
+        lda.fit(doc_term_matrix)
+    return TopicModel(vectorizer, lda)
+
+
+def topic_model_path(genre, data_dir=None):
+    return os.path.join(data_dir or genre_store.filtered_dir, f"{genre}_lda.joblib")
+
+
+'''
+Dumps the model to a temporary file that then replaces the saved one, so a request never loads a half-written
+model.
+'''
+def save_topic_model(topic_model, genre, data_dir=None):
+    import joblib
+    path = topic_model_path(genre, data_dir)
+    tmp_path = path + '.tmp'
+    joblib.dump(topic_model, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_topic_model(genre, data_dir=None):
+    path = topic_model_path(genre, data_dir)
+    if not os.path.exists(path):
+        return None
+    import joblib
+    return joblib.load(path)
+
+
+def topic_mode():
+    return os.environ.get('BOOKREC_TOPIC_MODE', DEFAULT_TOPIC_MODE)
+
+
+topic_model_cache = ModelCache(load_topic_model, lambda genre: [topic_model_path(genre)], maxsize=64)
+
+'''
+Returns the saved topic model for a genre, kept in memory after the first load and loaded again when the
+saved file changes (see model_cache.py). Returns None if the genre has no trained model or the topic mode
+is 'fit'.
+'''
+def get_topic_model(genre):
+    if topic_mode() != 'cached':
+        return None
+    return topic_model_cache.get(genre)
+
+
+'''
+Trains and saves the topic model for the given genres (every genre in Data/filtered_reviews/ if none are
+given).  e.g.  python topic_modeling.py fiction humor --components 10
+'''
 def main():
-    reviews_df = pd.read_csv('Data/filtered_reviews/juvenile fiction_df.csv',
-                              usecols=['title', 'review_summary'])
-    test = reviews_df.head(1000)
-    review_main_topics = main_topics(test)
-    print(review_main_topics)
+    parser = argparse.ArgumentParser(description='Train the per-genre LDA topic models.')
+    parser.add_argument('genres', nargs='*')
+    parser.add_argument('--components', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    args = parser.parse_args()
+
+    genres = args.genres
+    if not genres:
+        genres = sorted(f[:-len('_df.csv')] for f in os.listdir(genre_store.filtered_dir) if f.endswith('_df.csv'))
+
+    for genre in genres:
+        reviews_df = load_genre_reviews(genre, columns=['title', 'review_summary'])
+        if reviews_df is None:
+            print(f"No data found for genre: '{genre}' — skipping.")
+            continue
+        topic_model = train_topic_model(reviews_df, args.components, args.batch_size,
+                                        token_corpus=get_token_corpus(reviews_df, genre))
+        save_topic_model(topic_model, genre)
+        print(f"Saved {topic_model_path(genre)}")
+        print(main_topics(reviews_df.head(1000), topic_model))
 
 if __name__ == "__main__":
     main()